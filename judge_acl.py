@@ -1,75 +1,147 @@
-import json
+import re
+import fnmatch
 from astrbot.api.event import AstrMessageEvent
 
 
+ACL_LIST_KEYS = (
+    "whitelist",
+    "blacklist",
+    "router_whitelist",
+    "router_blacklist",
+    "command_whitelist",
+    "command_blacklist",
+    "fast_only_list",
+    "high_only_list",
+)
+_GLOB_CHARS = ("*", "?", "[")
+_EMPTY_MATCHER = (frozenset(), tuple(), None)
+
+
+def _compile_id_matcher(items) -> tuple:
+    """把名单编译为 (精确集合, 前缀元组, 通配正则)；支持 `xxx*` 前缀与 fnmatch 通配。"""
+    if not isinstance(items, (list, tuple, set, frozenset)):
+        return _EMPTY_MATCHER
+    exact = set()
+    prefixes = []
+    globs = []
+    for item in items:
+        s = str(item).strip() if item is not None else ""
+        if not s:
+            continue
+        if not any(ch in s for ch in _GLOB_CHARS):
+            exact.add(s)
+        elif s.endswith("*") and not any(ch in s[:-1] for ch in _GLOB_CHARS):
+            prefixes.append(s[:-1])
+        else:
+            globs.append(fnmatch.translate(s))
+    regex = re.compile("|".join(globs)) if globs else None
+    return (frozenset(exact), tuple(prefixes), regex)
+
+
+def _matcher_is_empty(matcher: tuple) -> bool:
+    return not matcher[0] and not matcher[1] and matcher[2] is None
+
+
+def _matcher_hits(matcher: tuple, keys: tuple) -> bool:
+    exact, prefixes, regex = matcher
+    for k in keys:
+        if k in exact:
+            return True
+        if prefixes and k.startswith(prefixes):
+            return True
+        if regex is not None and regex.match(k):
+            return True
+    return False
+
+
 class JudgeAclMixin:
-    def _get_event_keys(self, event: AstrMessageEvent) -> set:
+    def _get_event_keys(self, event: AstrMessageEvent) -> tuple:
         session_id = str(getattr(event, "unified_msg_origin", "") or "")
         group_id = str(event.get_group_id() if hasattr(event, "get_group_id") else "")
         sender_id = str(event.get_sender_id() if hasattr(event, "get_sender_id") else "")
-        keys = set()
-        if session_id:
-            keys.add(session_id)
-        if group_id:
-            keys.add(group_id)
-        if sender_id:
-            keys.add(sender_id)
-        return keys
-
-    def _acl_allows(self, keys: set, whitelist, blacklist) -> bool:
-        if isinstance(whitelist, list) and whitelist:
-            if not any(k in whitelist for k in keys):
-                return False
-        if isinstance(blacklist, list) and blacklist:
-            if any(k in blacklist for k in keys):
-                return False
+        return tuple(k for k in (session_id, group_id, sender_id) if k)
+
+    def _acl_allows(self, keys, whitelist, blacklist) -> bool:
+        wl = whitelist if isinstance(whitelist, tuple) else _compile_id_matcher(whitelist)
+        bl = blacklist if isinstance(blacklist, tuple) else _compile_id_matcher(blacklist)
+        if not _matcher_is_empty(wl) and not _matcher_hits(wl, tuple(keys)):
+            return False
+        if not _matcher_is_empty(bl) and _matcher_hits(bl, tuple(keys)):
+            return False
         return True
 
+    def _get_acl_index(self) -> dict:
+        version = getattr(self, "_config_version", 0)
+        index = self._acl_index
+        if index is None or index.get("_version") != version:
+            index = {"_version": version}
+            for key in ACL_LIST_KEYS:
+                index[key] = _compile_id_matcher(self.config.get(key, []))
+            self._acl_index = index
+            self._acl_resolution_cache.clear()
+        return index
+
+    def _resolve_event_acl(self, event: AstrMessageEvent) -> dict:
+        """按 (会话, 群, 用户) 缓存 ACL/策略/预算模式的解析结果，配置版本变化时整体失效。"""
+        index = self._get_acl_index()
+        self._refresh_compiled_config()
+        keys = self._get_event_keys(event)
+        cache = self._acl_resolution_cache
+        entry = cache.get(keys)
+        if entry is not None:
+            cache.move_to_end(keys)
+            return entry
+
+        base_allowed = self._acl_allows(keys, index["whitelist"], index["blacklist"])
+        policy = ""
+        if _matcher_hits(index["fast_only_list"], keys):
+            policy = "FAST_ONLY"
+        elif _matcher_hits(index["high_only_list"], keys):
+            policy = "HIGH_ONLY"
+        entry = {
+            "keys": keys,
+            "base": base_allowed,
+            "router": base_allowed and self._acl_allows(keys, index["router_whitelist"], index["router_blacklist"]),
+            "command": base_allowed and self._acl_allows(keys, index["command_whitelist"], index["command_blacklist"]),
+            "policy": policy,
+            "cmd": {},
+        }
+        cache[keys] = entry
+        while len(cache) > 4096:
+            cache.popitem(last=False)
+        return entry
+
+    def _compile_command_acl(self, data: dict) -> tuple:
+        compiled = {}
+        errors = []
+        for name, item in data.items():
+            if not isinstance(item, dict):
+                errors.append(f"command_acl_json 中 {name} 应为对象（已忽略）")
+                continue
+            wl = item.get("whitelist", [])
+            bl = item.get("blacklist", [])
+            if not isinstance(wl, list) or not isinstance(bl, list):
+                errors.append(f"command_acl_json 中 {name} 的 whitelist/blacklist 应为列表")
+            compiled[str(name)] = (_compile_id_matcher(wl), _compile_id_matcher(bl))
+        return compiled, errors
+
     def _get_command_acl(self, command_name: str) -> tuple:
-        raw = self.config.get("command_acl_json", "")
-        if not raw:
-            return ([], [])
-        cached_raw = getattr(self, "_command_acl_raw", None)
-        cached_data = getattr(self, "_command_acl_data", None)
-        if cached_raw == raw and isinstance(cached_data, dict):
-            data = cached_data
-        else:
-            try:
-                data = json.loads(raw)
-            except Exception:
-                data = {}
-            setattr(self, "_command_acl_raw", raw)
-            setattr(self, "_command_acl_data", data)
-        if not isinstance(data, dict):
-            return ([], [])
-        item = data.get(command_name) or data.get("*")
-        if not isinstance(item, dict):
-            return ([], [])
-        wl = item.get("whitelist", [])
-        bl = item.get("blacklist", [])
-        return (wl if isinstance(wl, list) else [], bl if isinstance(bl, list) else [])
+        compiled = self._get_compiled("command_acl_json")
+        return compiled.get(command_name) or compiled.get("*") or (_EMPTY_MATCHER, _EMPTY_MATCHER)
 
     def _is_router_allowed(self, event: AstrMessageEvent) -> bool:
-        keys = self._get_event_keys(event)
-        if not self._acl_allows(keys, self.config.get("whitelist", []), self.config.get("blacklist", [])):
-            return False
-        return self._acl_allows(keys, self.config.get("router_whitelist", []), self.config.get("router_blacklist", []))
+        return self._resolve_event_acl(event)["router"]
 
     def _is_command_allowed(self, event: AstrMessageEvent, command_name: str) -> bool:
-        keys = self._get_event_keys(event)
-        if not self._acl_allows(keys, self.config.get("whitelist", []), self.config.get("blacklist", [])):
+        entry = self._resolve_event_acl(event)
+        if not entry["command"]:
             return False
-        if not self._acl_allows(keys, self.config.get("command_whitelist", []), self.config.get("command_blacklist", [])):
-            return False
-        wl, bl = self._get_command_acl(command_name)
-        return self._acl_allows(keys, wl, bl)
+        allowed = entry["cmd"].get(command_name)
+        if allowed is None:
+            wl, bl = self._get_command_acl(command_name)
+            allowed = self._acl_allows(entry["keys"], wl, bl)
+            entry["cmd"][command_name] = allowed
+        return allowed
 
     def _get_pool_policy(self, event: AstrMessageEvent) -> str:
-        keys = self._get_event_keys(event)
-        fast_only = self.config.get("fast_only_list", [])
-        high_only = self.config.get("high_only_list", [])
-        if isinstance(fast_only, list) and any(k in fast_only for k in keys):
-            return "FAST_ONLY"
-        if isinstance(high_only, list) and any(k in high_only for k in keys):
-            return "HIGH_ONLY"
-        return ""
+        return self._resolve_event_acl(event)["policy"]
@@ -1,24 +1,45 @@
-import json
-import random
 from astrbot.api.event import AstrMessageEvent
 
 
+# 群/会话范围最多累积的 credit（百分点）：被其他范围暂时拦下时最多"欠"3 次 HIGH，限制突发
+_RATIO_CREDIT_CAP = 400
+# 保留 credit 的范围数上限（LRU），被淘汰的范围下次按新范围起步
+_RATIO_MAX_SCOPES = 2000
+
+
+def _initial_credit(ratio: int) -> int:
+    # credit 以百分点计：每次 HIGH 判定累加 ratio，满 100 放行一次；
+    # 新范围从 100 - ratio 起步，首次 HIGH 判定即按配置比例放行（ratio 为 0 时永不放行）
+    return 100 - ratio if ratio > 0 else 0
+
+
 class JudgeBudgetMixin:
     def _get_budget_mode(self, event: AstrMessageEvent) -> str:
+        entry = self._resolve_event_acl(event)
+        mode = entry.get("budget_mode")
+        if mode is None:
+            mode = self._resolve_budget_mode(event)
+            entry["budget_mode"] = mode
+        return mode
+
+    def _compile_budget_overrides(self, data: dict) -> tuple:
+        compiled = {}
+        errors = []
+        for key, mode in data.items():
+            mode_str = str(mode or "").upper()
+            if mode_str not in ("ECONOMY", "BALANCED", "FLAGSHIP"):
+                errors.append(f"budget_overrides_json 中 {key} 的模式 {mode} 无效（应为 ECONOMY/BALANCED/FLAGSHIP）")
+                continue
+            compiled[str(key)] = mode_str
+        return compiled, errors
+
+    def _resolve_budget_mode(self, event: AstrMessageEvent) -> str:
         default_mode = str(self.config.get("budget_mode", "BALANCED") or "BALANCED").upper()
         if default_mode not in ("ECONOMY", "BALANCED", "FLAGSHIP"):
             default_mode = "BALANCED"
 
-        overrides_raw = self.config.get("budget_overrides_json", "")
-        if not overrides_raw:
-            return default_mode
-
-        try:
-            overrides = json.loads(overrides_raw)
-        except Exception:
-            return default_mode
-
-        if not isinstance(overrides, dict):
+        overrides = self._get_compiled("budget_overrides_json")
+        if not overrides:
             return default_mode
 
         session_id = getattr(event, "unified_msg_origin", "") or ""
@@ -26,14 +47,8 @@ class JudgeBudgetMixin:
         sender_id = event.get_sender_id() if hasattr(event, "get_sender_id") else ""
 
         for key in (session_id, group_id, sender_id):
-            if not key:
-                continue
-            mode = overrides.get(key)
-            if not mode:
-                continue
-            mode_str = str(mode).upper()
-            if mode_str in ("ECONOMY", "BALANCED", "FLAGSHIP"):
-                return mode_str
+            if key and key in overrides:
+                return overrides[key]
 
         return default_mode
 
@@ -56,14 +71,71 @@ class JudgeBudgetMixin:
             ratio = 100
         return ratio
 
-    def _budget_allows_high_iq(self, event: AstrMessageEvent) -> bool:
+    def _budget_ratio_scopes(self, event: AstrMessageEvent) -> list:
+        scopes = [("global", "全局")]
+        group_id = event.get_group_id() if hasattr(event, "get_group_id") else ""
+        if group_id:
+            scopes.append((f"group:{group_id}", "群"))
+        session_id = getattr(event, "unified_msg_origin", "") or ""
+        if session_id:
+            scopes.append((f"session:{session_id}", "会话"))
+        return scopes
+
+    def _budget_ratio_entry(self, scope: str, ratio: int) -> dict:
+        state = self._budget_ratio_state.get(scope)
+        if state is None:
+            state = {"credit": _initial_credit(ratio), "total": 0, "allowed": 0}
+            self._budget_ratio_state[scope] = state
+            while len(self._budget_ratio_state) > _RATIO_MAX_SCOPES:
+                oldest = next(iter(self._budget_ratio_state))
+                if oldest == "global":
+                    self._budget_ratio_state.move_to_end(oldest)
+                    continue
+                self._budget_ratio_state.pop(oldest, None)
+        else:
+            self._budget_ratio_state.move_to_end(scope)
+        return state
+
+    def _budget_allows_high_iq(self, event: AstrMessageEvent, dry_run: bool = False) -> bool:
         if not self.config.get("enable_budget_control", False):
             return True
+        usage_block = self._usage_blocks_high(event)
+        if usage_block:
+            if not dry_run:
+                self._stats_inc("budget_usage_blocked")
+            return False
         budget_mode = self._get_budget_mode(event)
         ratio = self._get_high_iq_ratio(budget_mode)
-        if ratio >= 100:
-            return True
-        if ratio <= 0:
-            return False
-        return random.randint(1, 100) <= ratio
+        scopes = self._budget_ratio_scopes(event)
+        if dry_run:
+            # 只预估下一次 HIGH 判定是否会被放行，不累加 credit
+            credits = [
+                (self._budget_ratio_state.get(scope) or {"credit": _initial_credit(ratio)})["credit"] + ratio
+                for scope, _ in scopes
+            ]
+            return credits[0] >= 100 and all(c >= 0 for c in credits[1:])
+        # 误差扩散：各范围各自维护 credit。最外层（全局）攒够 100 才放行，决定总体占比；
+        # 群/会话只拦突发：credit 最多透支一次请求，短会话不会因额度未攒满而永远拿不到 HIGH。
+        # 全局 credit 不设上限：被内层拦下的额度留给其他会话，总体占比不因截断而偏低
+        states = [self._budget_ratio_entry(scope, ratio) for scope, _ in scopes]
+        states[0]["credit"] += ratio
+        for state in states[1:]:
+            state["credit"] = min(state["credit"] + ratio, _RATIO_CREDIT_CAP)
+        for state in states:
+            state["total"] += 1
+        allowed = states[0]["credit"] >= 100 and all(state["credit"] >= 0 for state in states[1:])
+        if allowed:
+            for state in states:
+                state["credit"] -= 100
+                state["allowed"] += 1
+        return allowed
+
+    def _budget_achieved_ratios(self, event: AstrMessageEvent) -> list:
+        out = []
+        for scope, label in self._budget_ratio_scopes(event):
+            state = self._budget_ratio_state.get(scope)
+            if not state or not state.get("total"):
+                continue
+            out.append((label, int(state.get("allowed", 0)), int(state.get("total", 0))))
+        return out
 
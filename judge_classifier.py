@@ -0,0 +1,114 @@
+import math
+
+
+def _char_bigrams(text: str) -> frozenset:
+    if len(text) < 2:
+        return frozenset((text,)) if text else frozenset()
+    return frozenset(text[i : i + 2] for i in range(len(text) - 1))
+
+
+class JudgeClassifierMixin:
+    """判定流水线中的两个本地阶段：近似缓存与在线朴素贝叶斯，均只从 judge 模型的结果中学习。"""
+
+    def _classifier_float(self, key: str, default: float) -> float:
+        try:
+            return float(self.config.get(key, default))
+        except Exception:
+            return default
+
+    def _classifier_observe(self, ctx: dict, decision: str):
+        normalized = ctx.get("normalized", "")
+        if not normalized or decision not in ("HIGH", "FAST"):
+            return
+        grams = _char_bigrams(normalized)
+
+        index = self._fuzzy_decision_index
+        index[normalized] = (grams, decision)
+        index.move_to_end(normalized)
+        try:
+            max_entries = max(int(self.config.get("fuzzy_cache_max_entries", 200)), 1)
+        except Exception:
+            max_entries = 200
+        while len(index) > max_entries:
+            index.popitem(last=False)
+
+        model = self._classifier_model
+        model["docs"][decision] += 1
+        counts = model["counts"][decision]
+        for gram in grams:
+            counts[gram] = counts.get(gram, 0) + 1
+            model["vocab"].add(gram)
+        model["totals"][decision] += len(grams)
+        try:
+            max_vocab = max(int(self.config.get("classifier_max_vocab", 20000)), 1)
+        except Exception:
+            max_vocab = 20000
+        if len(model["vocab"]) > max_vocab:
+            self._classifier_prune(max_vocab)
+
+    def _classifier_prune(self, max_vocab: int):
+        """词表超过上限时把所有计数减半（兼作衰减，近期样本权重更高），丢弃减到 0 的 bigram，直到降到上限的 80% 以下。"""
+        model = self._classifier_model
+        target = int(max_vocab * 0.8)
+        while len(model["vocab"]) > target:
+            vocab = set()
+            for label in ("HIGH", "FAST"):
+                counts = {gram: c // 2 for gram, c in model["counts"][label].items() if c >= 2}
+                model["counts"][label] = counts
+                model["totals"][label] = sum(counts.values())
+                vocab.update(counts)
+            model["vocab"] = vocab
+        self._stats_inc("classifier_vocab_pruned")
+
+    async def _decider_stage_fuzzy_cache(self, ctx: dict):
+        normalized = ctx["normalized"]
+        if not normalized or not self._fuzzy_decision_index:
+            return None
+        threshold = self._classifier_float("fuzzy_cache_threshold", 0.85)
+        grams = _char_bigrams(normalized)
+        size = len(grams)
+        best_score, best_decision = 0.0, ""
+        for other, decision in self._fuzzy_decision_index.values():
+            other_size = len(other)
+            # Jaccard 上界 min/max 不够阈值时跳过求交集
+            if not other_size or min(size, other_size) < threshold * max(size, other_size):
+                continue
+            inter = len(grams & other)
+            score = inter / (size + other_size - inter)
+            if score > best_score:
+                best_score, best_decision = score, decision
+        if best_decision and best_score >= threshold:
+            self._decider_stats_inc(ctx, "judge_fuzzy_cache_hit")
+            return (best_decision, f"jaccard={best_score:.2f}")
+        return None
+
+    async def _decider_stage_classifier(self, ctx: dict):
+        model = self._classifier_model
+        try:
+            min_samples = int(self.config.get("classifier_min_samples", 50))
+        except Exception:
+            min_samples = 50
+        docs = model["docs"]
+        if docs["HIGH"] + docs["FAST"] < max(min_samples, 1) or not docs["HIGH"] or not docs["FAST"]:
+            return None
+        grams = _char_bigrams(ctx["normalized"])
+        if not grams:
+            return None
+
+        vocab_size = len(model["vocab"]) + 1
+        total_docs = docs["HIGH"] + docs["FAST"]
+        scores = {}
+        for label in ("HIGH", "FAST"):
+            counts = model["counts"][label]
+            denom = model["totals"][label] + vocab_size
+            score = math.log(docs[label] / total_docs)
+            for gram in grams:
+                score += math.log((counts.get(gram, 0) + 1) / denom)
+            scores[label] = score
+        diff = scores["HIGH"] - scores["FAST"]
+        p_high = 1 / (1 + math.exp(-max(min(diff, 50.0), -50.0)))
+        decision, confidence = ("HIGH", p_high) if p_high >= 0.5 else ("FAST", 1 - p_high)
+        if confidence < self._classifier_float("classifier_min_confidence", 0.9):
+            return None
+        self._decider_stats_inc(ctx, "judge_classifier_hit")
+        return (decision, f"p={confidence:.2f}")
@@ -8,6 +8,10 @@ import time
 
 INTERNAL_JUDGE_MARKER = "__astrbot_plugin_judge_internal__"
 
+# /judge_dryrun 批量模拟的条数上限与明细展示条数
+_DRYRUN_BATCH_MAX = 500
+_DRYRUN_BATCH_DETAIL = 20
+
 
 class JudgeCommandsMixin:
     def _command_model_type_and_prompt(self, pool: str) -> tuple:
@@ -27,6 +31,7 @@ class JudgeCommandsMixin:
         provider_id: str = "",
         model_name: str = "",
         pool: str = "",
+        desc: dict = None,
     ):
         if not self._is_command_allowed(event, command_name):
             yield event.plain_result("❌ 当前会话无权限使用该指令")
@@ -41,7 +46,15 @@ class JudgeCommandsMixin:
             pool, policy, lock, provider_id, model_name, _ = self._select_pool_and_provider(event, "cmd", desired_pool)
         model_type, system_prompt = self._command_model_type_and_prompt(pool or desired_pool)
         async for result in self._call_model_with_question(
-            event, question, provider_id, model_name, model_type, system_prompt, notice=notice
+            event,
+            question,
+            provider_id,
+            model_name,
+            model_type,
+            system_prompt,
+            notice=notice,
+            pool=pool or desired_pool,
+            desc=desc,
         ):
             yield result
 
@@ -60,6 +73,23 @@ class JudgeCommandsMixin:
 
         budget_mode = c.get("budget_mode", "BALANCED")
         high_iq_ratio = self._get_high_iq_ratio(budget_mode)
+        achieved = self._budget_achieved_ratios(event)
+        achieved_text = " | ".join(
+            f"{label} `{int(allowed/total*100)}%` ({allowed}/{total})" for label, allowed, total in achieved
+        ) or "暂无数据"
+        high_day = self._usage_get("pool:HIGH", "day")
+        high_month = self._usage_get("pool:HIGH", "month")
+        cost_day = self._usage_get("scope:global", "day")
+        cost_month = self._usage_get("scope:global", "month")
+        usage_block = self._usage_blocks_high(event)
+        usage_block_text = f" (🚫 接近上限 {usage_block}, HIGH 降级)" if usage_block else ""
+        judge_pairs = self._get_judge_pairs()
+        if len(judge_pairs) > 1:
+            judge_text = f"{len(judge_pairs)} 个提供商"
+        elif judge_pairs:
+            judge_text = f"`{judge_pairs[0][0]}`"
+        else:
+            judge_text = "`未配置`"
 
         errors = []
         warnings = []
@@ -86,10 +116,13 @@ class JudgeCommandsMixin:
             "💰 **预算控制**",
             f"├─ 状态: {_bool_icon(c.get('enable_budget_control', False))}",
             f"├─ 模式: `{budget_mode}`",
-            f"└─ 触发率: `{high_iq_ratio}%`",
+            f"├─ 触发率: `{high_iq_ratio}%`",
+            f"├─ 实际: {achieved_text}",
+            f"├─ HIGH 今日/本月: `{high_day['tokens']}` / `{high_month['tokens']}` tokens",
+            f"└─ 费用 今日/本月: `{cost_day['cost']:.2f}` / `{cost_month['cost']:.2f}`{usage_block_text}",
             "",
             "🤖 **模型池配置**",
-            f"├─ Judge: `{c.get('judge_provider_id', '未配置')}`",
+            f"├─ Judge: {judge_text}",
             f"├─ High: {len(c.get('high_iq_provider_ids', []))} 个提供商",
             f"└─ Fast: {len(c.get('fast_provider_ids', []))} 个提供商",
             "",
@@ -161,6 +194,14 @@ class JudgeCommandsMixin:
         if llm_total > 0:
             lines.append("")
             lines.append(f"⚡ **LLM 成功率**: `{int(llm_ok/llm_total*100)}%` ({llm_err} 失败)")
+            err_kinds = [
+                ("限流", cnt.get("llm_err_rate_limited", 0)),
+                ("瞬时", cnt.get("llm_err_transient", 0)),
+                ("致命", cnt.get("llm_err_fatal", 0)),
+                ("请求", cnt.get("llm_err_request", 0)),
+            ]
+            if any(v for _, v in err_kinds):
+                lines.append("   └─ " + " | ".join(f"{k} `{v}`" for k, v in err_kinds))
             records = self._stats_records
             latencies = [r.get("elapsed_ms", 0) for r in records if r.get("elapsed_ms", 0) > 0]
             if latencies:
@@ -178,6 +219,109 @@ class JudgeCommandsMixin:
                 for k, v in top:
                     lines.append(f"  • `{k}`: {v} 次")
 
+        sticky_total = cnt.get("router_sticky", 0)
+        if sticky_total > 0:
+            sticky_warm = cnt.get("router_sticky_warm", 0)
+            lines.append("")
+            lines.append(f"🧲 **粘性路由**: `{sticky_total}` 次 | 同上游续用 `{int(sticky_warm/sticky_total*100)}%`")
+            per_provider = {}
+            for r in records:
+                if r.get("kind") != "llm" or not r.get("ok") or not r.get("sticky"):
+                    continue
+                lat = r.get("elapsed_ms", 0) or 0
+                if lat <= 0:
+                    continue
+                key = f"{r.get('provider_id')}:{r.get('model') or '默认'}"
+                bucket = per_provider.setdefault(key, {"warm": [], "cold": []})
+                bucket["warm" if r.get("warm_route") else "cold"].append(lat)
+            for key, bucket in sorted(per_provider.items(), key=lambda kv: -(len(kv[1]["warm"]) + len(kv[1]["cold"])))[:5]:
+                warm = bucket["warm"]
+                cold = bucket["cold"]
+                warm_text = f"{int(sum(warm)/len(warm))}ms" if warm else "-"
+                cold_text = f"{int(sum(cold)/len(cold))}ms" if cold else "-"
+                lines.append(f"  • `{key}`: 续用 {warm_text} ({len(warm)}) | 切换 {cold_text} ({len(cold)})")
+
+        judge_route_stats = getattr(self, "_judge_route_stats", {}) or {}
+        if judge_route_stats:
+            lines.append("")
+            lines.append(f"⚖️ **Judge 提供商**: 故障转移 `{cnt.get('judge_failover', 0)}` 次")
+            judge_err_kinds = [
+                ("限流", cnt.get("judge_err_rate_limited", 0)),
+                ("瞬时", cnt.get("judge_err_transient", 0)),
+                ("致命", cnt.get("judge_err_fatal", 0)),
+                ("请求", cnt.get("judge_err_request", 0)),
+            ]
+            if any(v for _, v in judge_err_kinds):
+                lines.append("  ⚠️ 错误: " + " | ".join(f"{k} `{v}`" for k, v in judge_err_kinds))
+            race_fired = cnt.get("judge_race_fired", 0)
+            if race_fired > 0:
+                baseline_p99, effective_p99 = self._judge_latency_summary()
+                p99_text = ""
+                if baseline_p99 and effective_p99:
+                    p99_text = f" | p99 {int(baseline_p99)}ms → {int(effective_p99)}ms (改善 {int((1 - effective_p99 / baseline_p99) * 100)}%)"
+                lines.append(
+                    f"  🏁 竞速 `{race_fired}` 次 | 主 judge 胜 `{cnt.get('judge_race_won_primary', 0)}` | 备用胜 `{cnt.get('judge_race_won_secondary', 0)}`{p99_text}"
+                )
+            stream_calls = cnt.get("judge_stream_calls", 0)
+            if stream_calls > 0 or cnt.get("judge_stream_fallback", 0) > 0:
+                lines.append(f"  🌊 流式判定 `{stream_calls}` 次 | 不支持流式回退 `{cnt.get('judge_stream_fallback', 0)}` 个提供商")
+            for key, st in sorted(judge_route_stats.items(), key=lambda kv: -kv[1]["calls"])[:5]:
+                pid, _, model = key.partition(":")
+                p50 = self._provider_latency_percentile(pid, model, 50)
+                p99 = self._provider_latency_percentile(pid, model, 99)
+                lat_text = f"p50 {int(p50)}ms / p99 {int(p99)}ms" if p50 is not None else "暂无延迟"
+                lines.append(
+                    f"  • `{pid}:{model or '默认'}`: 调用 {st['calls']} | 失败 {st['err']} | 无法解析 {st['unparseable']} | {lat_text}"
+                )
+
+        compacted = cnt.get("judge_input_compacted", 0)
+        if compacted > 0:
+            lines.append("")
+            lines.append(
+                f"✂️ **Judge 输入压缩**: `{compacted}` 次 | 节省约 `{cnt.get('judge_input_tokens_saved', 0)}` tokens"
+            )
+
+        parsed = cnt.get("command_history_parsed", 0)
+        history_hit = cnt.get("command_history_cache_hit", 0)
+        if parsed or history_hit:
+            lines.append("")
+            lines.append(
+                f"🧵 **命令上下文**: 解析 `{parsed}` 次 | 缓存命中 `{history_hit}` 次 | "
+                f"写回 `{cnt.get('command_history_flush', 0)}` 次 (合并 `{cnt.get('command_history_coalesced', 0)}`) | "
+                f"待写回 `{sum(1 for st in self._command_history_sessions.values() if st['pending'])}`"
+            )
+
+        stage_stats = getattr(self, "_decider_stage_stats", {}) or {}
+        if stage_stats:
+            lines.append("")
+            lines.append("🧱 **判定流水线**:")
+            for name in self._get_decider_stages():
+                st = stage_stats.get(name)
+                if not st or not st["calls"]:
+                    continue
+                lines.append(
+                    f"  • `{name}`: 调用 {st['calls']} | 命中 {st['hits']} ({int(st['hits']/st['calls']*100)}%) | 平均 {st['total_ms']/st['calls']:.2f}ms"
+                )
+
+        inertia_hit = cnt.get("judge_inertia_hit", 0)
+        if inertia_hit > 0:
+            lines.append("")
+            lines.append(
+                f"🧭 **会话惯性**: 沿用 `{inertia_hit}` 次 | 省下 judge 调用 `{cnt.get('judge_inertia_saved_llm', 0)}` 次"
+            )
+
+        prejudge_started = cnt.get("judge_prejudge_started", 0)
+        if prejudge_started > 0:
+            lines.append("")
+            lines.append(
+                f"⏩ **提前判定**: 启动 `{prejudge_started}` | 复用 `{cnt.get('judge_prejudge_used', 0)}` | 过期丢弃 `{cnt.get('judge_prejudge_dropped', 0)}`"
+            )
+
+        hedge_fired = cnt.get("cmd_hedge_fired", 0)
+        if hedge_fired > 0:
+            lines.append("")
+            lines.append(f"🪁 **指令对冲**: 触发 `{hedge_fired}` 次 | 备用胜出 `{cnt.get('cmd_hedge_won', 0)}` 次")
+
         blocked = cnt.get("router_budget_blocked", 0)
         if blocked > 0:
             lines.append("")
@@ -330,7 +474,10 @@ class JudgeCommandsMixin:
             return
 
         try:
-            decision, judge_source, judge_reason = await self._judge_message_complexity_with_meta(question)
+            desc = self._describe_message(question)
+            decision, judge_source, judge_reason = await self._judge_message_complexity_with_meta(
+                question, session_key=self._session_key(event), desc=desc
+            )
             desired_pool = "HIGH" if decision == "HIGH" else "FAST"
             budget_blocked = False
             if desired_pool == "HIGH" and not self._budget_allows_high_iq(event):
@@ -376,6 +523,7 @@ class JudgeCommandsMixin:
                 provider_id=provider_id,
                 model_name=model_name,
                 pool=pool,
+                desc=desc,
             ):
                 yield item
 
@@ -391,9 +539,8 @@ class JudgeCommandsMixin:
         yield event.plain_result("🏥 正在进行全量健康检查...")
 
         targets = []
-        judge_pid = self.config.get("judge_provider_id", "")
-        if judge_pid:
-            targets.append(("JUDGE", judge_pid, self.config.get("judge_model", "")))
+        for pid, m in self._get_judge_pairs():
+            targets.append(("JUDGE", pid, m))
 
         high_pids = self.config.get("high_iq_provider_ids", [])
         high_models = self.config.get("high_iq_models", [])
@@ -455,6 +602,11 @@ class JudgeCommandsMixin:
                 status_icon = "🟢"
                 status_text = "正常"
                 latency_text = "-"
+                cooldown = self._get_provider_cooldown(pid, model)
+                cooldown_text = ""
+                if cooldown:
+                    remaining = max(0, int(cooldown.get("until", 0) - self._now_ts()))
+                    cooldown_text = f" | ⏳ {cooldown.get('kind')} 冷却 {remaining}s"
 
                 try:
                     t0 = time.perf_counter()
@@ -502,7 +654,7 @@ class JudgeCommandsMixin:
 
                 return [
                     f"{status_icon} **{pid}** ({model_disp})",
-                    f"   └─ 🏷️ {tags_disp} | ⏱️ {latency_text} | 📊 {status_text}",
+                    f"   └─ 🏷️ {tags_disp} | ⏱️ {latency_text} | 📊 {status_text}{cooldown_text}",
                 ]
 
         tasks = [_probe(pid, model, tags) for (pid, model), tags in unique_targets.items()]
@@ -617,10 +769,12 @@ class JudgeCommandsMixin:
                 return
             current_list.append(keyword)
             self.config[target_list_key] = current_list
+            self._bump_config_version()
             try:
                 save_config = getattr(self.config, "save_config", None)
                 if callable(save_config):
-                    save_config()
+                    with self._perf_span("save_config"):
+                        save_config()
             except Exception:
                 logger.exception("[JudgePlugin] 保存配置失败")
             yield event.plain_result(f"✅ 已添加 {kind.upper()} 规则: `{keyword}`")
@@ -632,10 +786,12 @@ class JudgeCommandsMixin:
                 return
             current_list.remove(keyword)
             self.config[target_list_key] = current_list
+            self._bump_config_version()
             try:
                 save_config = getattr(self.config, "save_config", None)
                 if callable(save_config):
-                    save_config()
+                    with self._perf_span("save_config"):
+                        save_config()
             except Exception:
                 logger.exception("[JudgePlugin] 保存配置失败")
             yield event.plain_result(f"✅ 已删除 {kind.upper()} 规则: `{keyword}`")
@@ -643,6 +799,58 @@ class JudgeCommandsMixin:
 
         yield event.plain_result("❌ 未知操作, 仅支持 add/del/list")
 
+    async def _simulate_route(self, event: AstrMessageEvent, message: str) -> dict:
+        """只读地模拟一条消息的路由（判定流水线 + 预算 + 池/提供商选择），不调用 judge，不改动锁定/缓存/统计/预算。"""
+        decision, source, reason = await self._judge_message_complexity_with_meta(
+            message, session_key=self._session_key(event), dry_run=True
+        )
+        desired_pool = "HIGH" if decision == "HIGH" else "FAST"
+        budget_blocked = False
+        if desired_pool == "HIGH" and not self._budget_allows_high_iq(event, dry_run=True):
+            desired_pool = "FAST"
+            budget_blocked = True
+        pool, policy, lock, provider_id, model_name, route_meta = self._select_pool_and_provider(
+            event, "router", desired_pool, dry_run=True
+        )
+        return {
+            "message": message,
+            "decision": decision,
+            "source": source,
+            "reason": reason,
+            "judge_skipped": reason == "dry_run_judge_skipped",
+            "budget_blocked": budget_blocked,
+            "pool": pool,
+            "policy": policy,
+            "lock": lock,
+            "provider_id": provider_id,
+            "model": model_name,
+            "cb_skipped": bool(route_meta and route_meta.get("cb_skipped")),
+        }
+
+    def _format_dryrun_batch(self, results: list) -> str:
+        decisions = Counter(r["decision"] for r in results)
+        sources = Counter(r["source"] for r in results)
+        pools = Counter(r["pool"] for r in results)
+        judge_needed = sum(1 for r in results if r["judge_skipped"])
+        budget_blocked = sum(1 for r in results if r["budget_blocked"])
+        lines = [
+            f"🧪 **批量路由模拟** ({len(results)} 条)",
+            "━━━━━━━━━━━━━━━━━━━━━━━━",
+            f"🧠 **判定**: HIGH {decisions.get('HIGH', 0)} | FAST {decisions.get('FAST', 0)}",
+            "   └─ 来源: " + " | ".join(f"{k} {v}" for k, v in sources.most_common()),
+            f"🎯 **最终池**: HIGH {pools.get('HIGH', 0)} | FAST {pools.get('FAST', 0)}",
+        ]
+        if judge_needed:
+            lines.append(f"🤖 **需调用 judge**: {judge_needed} 条 (模拟未调用, 按兜底规则预估)")
+        if budget_blocked:
+            lines.append(f"💰 **预算拦截**: {budget_blocked} 条 (按当前额度逐条预估)")
+        lines.append("")
+        lines.append(f"📋 **明细** (前 {min(len(results), _DRYRUN_BATCH_DETAIL)} 条):")
+        for i, r in enumerate(results[:_DRYRUN_BATCH_DETAIL], 1):
+            mark = "*" if r["judge_skipped"] else ""
+            lines.append(f"{i}. `{r['decision']}{mark}`→`{r['pool']}` {r['source']} | {r['message'][:20]}")
+        return "\n".join(lines)
+
     async def judge_dryrun(self, event: AstrMessageEvent):
         if not self._is_command_allowed(event, "judge_dryrun"):
             yield event.plain_result("❌ 当前会话无权限使用该指令")
@@ -650,44 +858,56 @@ class JudgeCommandsMixin:
 
         msg = self._extract_command_args(event.message_str, ["judge_dryrun", "模拟", "dryrun", "模拟路由"])
         if not msg:
-            yield event.plain_result("请提供要模拟的消息, 例如: /模拟 帮我写个代码")
+            yield event.plain_result("请提供要模拟的消息, 例如: /模拟 帮我写个代码\n批量模拟: /模拟 批量 后每行一条消息")
             return
 
         if not self._is_router_allowed(event):
             yield event.plain_result("🚫 **模拟结果**: 被 ACL (黑名单/白名单) 拦截, 不会触发路由")
             return
 
-        decision, source, reason = await self._judge_message_complexity_with_meta(msg)
-
-        base_pool = "HIGH" if decision == "HIGH" else "FAST"
-        desired_pool = base_pool
-        budget_blocked = False
-        if desired_pool == "HIGH" and not self._budget_allows_high_iq(event):
-            desired_pool = "FAST"
-            budget_blocked = True
-
-        pool, policy, lock, provider_id, model_name, route_meta = self._select_pool_and_provider(event, "router", desired_pool)
+        head, _, rest = msg.partition("\n")
+        if head.strip().lower() in ("batch", "批量"):
+            batch = [line.strip() for line in rest.splitlines() if line.strip()]
+            if not batch:
+                yield event.plain_result("请在 `批量` 之后每行提供一条消息")
+                return
+            truncated = len(batch) > _DRYRUN_BATCH_MAX
+            batch = batch[:_DRYRUN_BATCH_MAX]
+            # 模拟只读运行时状态，所有消息都基于同一份快照并发评估
+            results = await asyncio.gather(*(self._simulate_route(event, line) for line in batch))
+            text = self._format_dryrun_batch(list(results))
+            if truncated:
+                text += f"\n⚠️ 超过 {_DRYRUN_BATCH_MAX} 条, 其余未模拟"
+            yield event.plain_result(text)
+            return
 
+        r = await self._simulate_route(event, msg)
         lines = [
             "🧪 **路由模拟报告**",
             "━━━━━━━━━━━━━━━━━━━━━━━━",
             f"📝 **消息**: {msg[:50]}...",
             "",
-            f"🧠 **判定**: `{decision}`",
-            f"   └─ 来源: {source} ({reason})",
-            "",
-            f"🎯 **最终池**: `{pool}`",
-            f"   └─ Provider: `{provider_id}`",
-            f"   └─ Model: `{model_name}`",
+            f"🧠 **判定**: `{r['decision']}`",
+            f"   └─ 来源: {r['source']} ({r['reason']})",
         ]
+        if r["judge_skipped"]:
+            lines.append("   └─ 需调用 judge 模型, 模拟未调用, 以上为兜底规则预估")
+        lines.extend(
+            [
+                "",
+                f"🎯 **最终池**: `{r['pool']}`",
+                f"   └─ Provider: `{r['provider_id']}`",
+                f"   └─ Model: `{r['model']}`",
+            ]
+        )
 
-        if budget_blocked:
+        if r["budget_blocked"]:
             lines.append("💰 **预算**: 拦截 (降级为FAST)")
-        if policy:
-            lines.append(f"🛡️ **策略**: `{policy}` 限制生效")
-        if lock:
-            lines.append(f"🔒 **锁定**: `{lock.get('pool')}` 锁定生效")
-        if route_meta and route_meta.get("cb_skipped"):
+        if r["policy"]:
+            lines.append(f"🛡️ **策略**: `{r['policy']}` 限制生效")
+        if r["lock"]:
+            lines.append(f"🔒 **锁定**: `{r['lock'].get('pool')}` 锁定生效")
+        if r["cb_skipped"]:
             lines.append("🔌 **断路器**: 原 Provider 熔断, 已自动切换")
 
         yield event.plain_result("\n".join(lines))
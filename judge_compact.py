@@ -0,0 +1,86 @@
+import re
+
+
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿＀-￯]")
+_CODE_BLOCK_RE = re.compile(r"```([^\n`]*)\n?(.*?)(?:```|\Z)", re.S)
+_INLINE_SPACE_RE = re.compile(r"[ \t　]{2,}")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n(\s*\n)+")
+
+
+def _estimate_tokens(text: str) -> int:
+    """粗略 token 估算：CJK 字符约 1 token/字，其余非空白字符约 4 字符/token。"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    other = len(text) - cjk - text.count(" ") - text.count("\n")
+    return cjk + max(other, 0) // 4 + (1 if other % 4 else 0)
+
+
+def _collapse_code_blocks(text: str) -> str:
+    def _sub(match):
+        lang = match.group(1).strip()
+        lines = match.group(2).rstrip("\n").count("\n") + 1
+        return f"[代码块{(' ' + lang) if lang else ''}, {lines} 行]"
+
+    return _CODE_BLOCK_RE.sub(_sub, text)
+
+
+def _dedupe_lines(text: str) -> str:
+    seen = set()
+    out = []
+    skipped = 0
+    for line in text.split("\n"):
+        key = line.strip()
+        if key and key in seen:
+            skipped += 1
+            continue
+        if skipped:
+            out.append(f"[重复 {skipped} 行已省略]")
+            skipped = 0
+        seen.add(key)
+        out.append(line)
+    if skipped:
+        out.append(f"[重复 {skipped} 行已省略]")
+    return "\n".join(out)
+
+
+def _head_tail_window(text: str, max_tokens: int, total_tokens: int) -> str:
+    # 按本段文本的平均字符/token 比例换算字符预算，头部保留 2/3、尾部保留 1/3
+    chars_per_token = len(text) / max(total_tokens, 1)
+    budget_chars = max(int(max_tokens * chars_per_token), 2)
+    head = text[: budget_chars * 2 // 3]
+    tail = text[len(text) - budget_chars // 3 :]
+    omitted = max(total_tokens - max_tokens, 0)
+    return f"{head}\n[…中间省略约 {omitted} tokens…]\n{tail}"
+
+
+class JudgeCompactMixin:
+    def _judge_input_max_tokens(self) -> int:
+        try:
+            return max(int(self.config.get("judge_input_max_tokens", 400)), 0)
+        except Exception:
+            return 400
+
+    def _compact_judge_input(self, message: str, tokens: int = None) -> str:
+        """送入 judge 前压缩超长消息：代码块/空白/重复行折叠为占位符，仍超出上限时保留首尾窗口。"""
+        max_tokens = self._judge_input_max_tokens()
+        if not max_tokens or not message:
+            return message
+        original_tokens = tokens if tokens is not None else _estimate_tokens(message)
+        if original_tokens <= max_tokens:
+            return message
+
+        text = _collapse_code_blocks(message)
+        text = _INLINE_SPACE_RE.sub(" ", text)
+        text = _BLANK_LINES_RE.sub("\n\n", text)
+        text = _dedupe_lines(text).strip()
+        tokens = _estimate_tokens(text)
+        if tokens > max_tokens:
+            text = _head_tail_window(text, max_tokens, tokens)
+            tokens = _estimate_tokens(text)
+
+        saved = original_tokens - tokens
+        if saved > 0:
+            self._stats_inc("judge_input_compacted")
+            self._stats_inc("judge_input_tokens_saved", saved)
+        return text
@@ -0,0 +1,52 @@
+import json
+
+
+# 配置中以 JSON 文本填写的字段 -> 编译函数名；编译函数接收已解析的 JSON，返回 (编译结果, 错误列表)
+JSON_CONFIG_FIELDS = {
+    "budget_overrides_json": "_compile_budget_overrides",
+    "command_acl_json": "_compile_command_acl",
+}
+
+
+class JudgeCompiledConfigMixin:
+    def _compile_json_field(self, key: str, raw) -> tuple:
+        compiler = getattr(self, JSON_CONFIG_FIELDS[key])
+        if raw is None or raw == "":
+            return compiler({})
+        if not isinstance(raw, str):
+            value, _ = compiler({})
+            return value, [f"{key} 不是字符串（将视为未配置）"]
+        try:
+            data = json.loads(raw)
+        except Exception:
+            value, _ = compiler({})
+            return value, [f"{key} 不是合法 JSON（将按未配置处理）"]
+        if not isinstance(data, dict):
+            value, _ = compiler({})
+            return value, [f"{key} 应为 JSON 对象（将按未配置处理）"]
+        return compiler(data)
+
+    def _get_compiled(self, key: str):
+        """返回 JSON 配置字段的编译结果；每个配置版本/原始文本只解析一次。"""
+        raw = self.config.get(key, "")
+        version = getattr(self, "_config_version", 0)
+        entry = self._compiled_config.get(key)
+        if entry is not None and entry["version"] == version and entry["raw"] == raw:
+            return entry["value"]
+        value, errors = self._compile_json_field(key, raw)
+        if entry is not None and entry["raw"] != raw:
+            # 未经 _bump_config_version 的直接修改：依赖该字段的会话解析缓存同样需要失效
+            self._acl_resolution_cache.clear()
+        self._compiled_config[key] = {"version": version, "raw": raw, "value": value, "errors": errors}
+        return value
+
+    def _refresh_compiled_config(self):
+        for key in JSON_CONFIG_FIELDS:
+            self._get_compiled(key)
+
+    def _compiled_config_errors(self) -> list:
+        self._refresh_compiled_config()
+        errors = []
+        for key in JSON_CONFIG_FIELDS:
+            errors.extend(self._compiled_config[key]["errors"])
+        return errors
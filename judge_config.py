@@ -1,6 +1,3 @@
-import json
-
-
 class JudgeConfigMixin:
     def _normalize_list(self, value, keep_empty: bool = False) -> list:
         if not isinstance(value, list):
@@ -60,6 +57,15 @@ class JudgeConfigMixin:
             self.config["fast_provider_ids"] = self._normalize_list(self.config.get("fast_provider_ids", []))
             self.config["fast_models"] = self._normalize_list(self.config.get("fast_models", []), keep_empty=True)
 
+        judge_routes = self.config.get("judge_routes", None)
+        if isinstance(judge_routes, list) and judge_routes:
+            judge_provider_ids, judge_models = self._normalize_provider_routes(judge_routes)
+            self.config["judge_provider_ids"] = judge_provider_ids
+            self.config["judge_models"] = judge_models
+        else:
+            self.config["judge_provider_ids"] = []
+            self.config["judge_models"] = []
+
         self.config["whitelist"] = self._normalize_list(self.config.get("whitelist", []))
         self.config["blacklist"] = self._normalize_list(self.config.get("blacklist", []))
         self.config["router_whitelist"] = self._normalize_list(self.config.get("router_whitelist", []))
@@ -70,6 +76,11 @@ class JudgeConfigMixin:
         self.config["high_only_list"] = self._normalize_list(self.config.get("high_only_list", []))
         self.config["custom_high_keywords"] = self._normalize_list(self.config.get("custom_high_keywords", []))
         self.config["custom_fast_keywords"] = self._normalize_list(self.config.get("custom_fast_keywords", []))
+        self._bump_config_version()
+
+    def _bump_config_version(self):
+        """配置变更后调用：依赖配置的编译结果（名单索引、解析缓存等）按版本号惰性重建。"""
+        self._config_version = getattr(self, "_config_version", 0) + 1
 
     def _validate_config(self) -> tuple:
         errors = []
@@ -77,8 +88,8 @@ class JudgeConfigMixin:
         c = self.config
 
         judge_provider_id = str(c.get("judge_provider_id", "") or "").strip()
-        if not judge_provider_id:
-            errors.append("缺少必填项 judge_provider_id（用于复杂度判定）")
+        if not judge_provider_id and not c.get("judge_provider_ids"):
+            errors.append("缺少必填项 judge_provider_id 或 judge_routes（用于复杂度判定）")
 
         def _as_list(value):
             return value if isinstance(value, list) else None
@@ -132,21 +143,24 @@ class JudgeConfigMixin:
 
         _check_routes("high_iq_routes", "high_iq_provider_ids", "high_iq_models", "高智商模型池")
         _check_routes("fast_routes", "fast_provider_ids", "fast_models", "快速模型池")
+        if _as_list(c.get("judge_routes", None)):
+            _check_routes("judge_routes", "judge_provider_ids", "judge_models", "判断模型池")
 
-        def _check_json_text(key: str):
-            raw = c.get(key, "")
-            if raw is None or raw == "":
-                return
-            if not isinstance(raw, str):
-                warnings.append(f"{key} 不是字符串（将视为未配置）")
-                return
-            try:
-                json.loads(raw)
-            except Exception:
-                warnings.append(f"{key} 不是合法 JSON（将按未配置处理）")
+        compiled_errors = getattr(self, "_compiled_config_errors", None)
+        if callable(compiled_errors):
+            warnings.extend(compiled_errors())
+
+        profile = str(c.get("judge_prompt_profile", "full") or "full").strip().lower()
+        if profile not in ("full", "compact", "minimal"):
+            warnings.append(f"judge_prompt_profile 无效: {profile}（将使用 full）")
 
-        _check_json_text("command_acl_json")
-        _check_json_text("budget_overrides_json")
+        stages = c.get("decider_stages", None)
+        if stages is not None and not isinstance(stages, list):
+            warnings.append("decider_stages 不是列表（将使用默认顺序）")
+        elif stages:
+            unknown = [str(s) for s in stages if not callable(getattr(self, f"_decider_stage_{str(s).strip().lower()}", None))]
+            if unknown:
+                warnings.append(f"decider_stages 含未知阶段（已忽略）: {', '.join(unknown)}")
 
         def _check_int_range(key: str, min_v=None, max_v=None):
             if key not in c:
@@ -175,12 +189,42 @@ class JudgeConfigMixin:
         _check_int_range("economy_high_iq_ratio", 0, 100)
         _check_int_range("balanced_high_iq_ratio", 0, 100)
         _check_int_range("flagship_high_iq_ratio", 0, 100)
+        _check_int_range("high_daily_token_limit", 0, None)
+        _check_int_range("high_monthly_token_limit", 0, None)
+        _check_int_range("scope_daily_token_limit", 0, None)
+        _check_int_range("budget_soft_limit_percent", 1, 100)
+        _check_int_range("usage_persist_interval_seconds", 0, None)
+        _check_int_range("early_prejudge_ttl_seconds", 1, None)
+        _check_int_range("inertia_max_chars", 1, None)
+        _check_int_range("inertia_max_turns", 0, None)
+        _check_int_range("inertia_ttl_seconds", 0, None)
         _check_int_range("decision_cache_ttl_seconds", 0, None)
+        _check_int_range("decision_cache_fallback_ttl_seconds", 0, None)
+        _check_int_range("judge_max_attempts", 1, None)
+        _check_int_range("judge_race_delay_ms", 0, None)
+        _check_int_range("judge_input_max_tokens", 0, None)
+        _check_int_range("fuzzy_cache_max_entries", 1, None)
+        _check_int_range("classifier_min_samples", 1, None)
+        _check_int_range("classifier_max_vocab", 1, None)
         _check_int_range("decision_cache_max_entries", 0, None)
         _check_int_range("answer_cache_ttl_seconds", 0, None)
         _check_int_range("answer_cache_max_entries", 0, None)
+        _check_int_range("command_context_cache_max_entries", 0, None)
+        _check_int_range("command_context_flush_delay_ms", 0, 60000)
         _check_int_range("llm_pending_ttl_seconds", 0, None)
         _check_int_range("llm_pending_cleanup_interval_seconds", 0, None)
+        _check_int_range("hedge_latency_percentile", 1, 100)
+        _check_int_range("hedge_min_samples", 1, None)
+        _check_int_range("hedge_budget_percent", 0, 100)
+        _check_int_range("perf_probe_interval_ms", 10, 60000)
+        _check_int_range("perf_block_threshold_ms", 5, 60000)
+        _check_int_range("executor_max_workers", 1, 64)
+        _check_int_range("executor_max_pending", 1, None)
+        _check_int_range("executor_offload_min_chars", 0, None)
+        _check_int_range("executor_process_min_chars", 0, None)
+        _check_int_range("rate_limit_cooldown_seconds", 0, None)
+        _check_int_range("transient_error_cooldown_seconds", 0, None)
+        _check_int_range("fatal_error_cooldown_seconds", 0, None)
         _check_float_positive("health_check_timeout_seconds")
 
         return errors, warnings
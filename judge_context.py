@@ -1,59 +1,164 @@
 import json
 import asyncio
+import contextlib
+from astrbot.api import logger
 from astrbot.api.event import AstrMessageEvent
+from .judge_utils import _fingerprint64
+
+
+def _history_version(history_str: str) -> tuple:
+    # 不解析就能判断历史是否变化：长度 + 尾部指纹；只取决于存储的文本，写回后可由写入内容直接算出
+    return (len(history_str), _fingerprint64(history_str[-256:]))
+
+
+_JSON_DECODER = json.JSONDecoder()
+_JSON_WS = " \t\n\r"
+
+
+def _last_non_ws(text: str, i: int) -> int:
+    while i >= 0 and text[i] in _JSON_WS:
+        i -= 1
+    return i
+
+
+def _loads_history_tail(text: str, keep: int):
+    """从末尾反向解析 JSON 数组形式的对话历史，只解码到凑够 keep 条 user/assistant 文本消息为止。
+
+    返回按原顺序排列的尾部元素（含其间的其他角色）；结构不符合预期时返回 None，由调用方回退到完整解析。
+    """
+    start = 0
+    while start < len(text) and text[start] in _JSON_WS:
+        start += 1
+    close = _last_non_ws(text, len(text) - 1)
+    if start >= len(text) or text[start] != "[" or text[close] != "]":
+        return None
+    items = []
+    matched = 0
+    # close 依次指向各元素之后的分隔符（"," 或结尾的 "]"），从后往前逐个解码
+    close = _last_non_ws(text, close - 1)
+    if close == start:
+        return []
+    while matched < keep:
+        if text[close] != "}":
+            return None
+        pos = close
+        while True:
+            # 元素起点是某个 "{"：从近到远尝试，解码结果恰好止于该元素末尾的即为起点
+            pos = text.rfind("{", start + 1, pos)
+            if pos < 0:
+                return None
+            # 字符串内的 "{" 后面不会紧跟未转义的引号；先排除，避免失败解码（异常会扫描整个前缀算行号）
+            nxt = pos + 1
+            while text[nxt] in _JSON_WS:
+                nxt += 1
+            if text[nxt] not in "\"}":
+                continue
+            try:
+                obj, obj_end = _JSON_DECODER.raw_decode(text, pos)
+            except ValueError:
+                continue
+            if obj_end == close + 1 and isinstance(obj, dict):
+                break
+        items.append(obj)
+        if obj.get("role") in ("user", "assistant") and isinstance(obj.get("content"), str):
+            matched += 1
+        prev = _last_non_ws(text, pos - 1)
+        if prev == start:
+            break
+        if text[prev] != ",":
+            return None
+        close = _last_non_ws(text, prev - 1)
+    items.reverse()
+    return items
 
 
 class JudgeContextMixin:
     async def _loads_json_maybe_in_executor(self, text: str):
         try:
-            if isinstance(text, str) and len(text) > 20000:
-                loop = asyncio.get_event_loop()
-                return await loop.run_in_executor(None, json.loads, text)
-        except Exception:
-            return None
-        try:
-            return json.loads(text)
+            return await self._run_blocking("history_json_loads", json.loads, text, size=len(text), cpu=True)
         except Exception:
             return None
 
-    async def _get_command_llm_context(self, event: AstrMessageEvent) -> list:
+    def _command_context_max_turns(self) -> int:
         if not self.config.get("enable_command_context", False):
-            return []
+            return 0
+        try:
+            return max(int(self.config.get("command_context_max_turns", 10)), 0)
+        except Exception:
+            return 10
 
-        max_turns = self.config.get("command_context_max_turns", 10)
+    def _command_history_cache_put(self, entry: dict):
         try:
-            max_turns = int(max_turns)
+            max_entries = int(self.config.get("command_context_cache_max_entries", 200))
         except Exception:
-            max_turns = 10
+            max_entries = 200
+        cache = self._command_history_cache
+        if max_entries <= 0:
+            cache.pop(entry["uid"], None)
+            return
+        cache[entry["uid"]] = entry
+        cache.move_to_end(entry["uid"])
+        while len(cache) > max_entries:
+            cache.popitem(last=False)
 
-        if max_turns <= 0:
-            return []
+    def _command_history_state(self, uid: str) -> dict:
+        """会话级状态：读写锁与待写回队列，独立于 LRU 缓存，空闲时回收。"""
+        state = self._command_history_sessions.get(uid)
+        if state is None:
+            state = {"lock": asyncio.Lock(), "users": 0, "pending": [], "task": None}
+            self._command_history_sessions[uid] = state
+        return state
 
-        uid = event.unified_msg_origin
+    @contextlib.asynccontextmanager
+    async def _command_history_guard(self, uid: str):
+        # 同一会话的历史读取与写回串行执行
+        state = self._command_history_state(uid)
+        state["users"] += 1
         try:
-            conv_mgr = self.context.conversation_manager
-            curr_cid = await conv_mgr.get_curr_conversation_id(uid)
-            if not curr_cid:
-                return []
-            conversation = await conv_mgr.get_conversation(uid, curr_cid)
-        except Exception:
-            return []
+            async with state["lock"]:
+                yield state
+        finally:
+            state["users"] -= 1
+            task = state["task"]
+            idle = state["users"] == 0 and not state["pending"] and (task is None or task.done())
+            if idle and self._command_history_sessions.get(uid) is state:
+                self._command_history_sessions.pop(uid, None)
+
+    async def _read_command_history(self, uid: str, cid: str) -> dict:
+        """读取存储中的历史并与缓存核对（调用方须持有该会话的锁）。
 
+        版本未变时直接复用缓存的解析结果，否则只解码尾部。返回 {uid, cid, version, history}。
+        """
+        conversation = await self.context.conversation_manager.get_conversation(uid, cid)
         history_str = getattr(conversation, "history", "") or ""
-        if not history_str:
-            return []
+        version = _history_version(history_str)
+        entry = self._command_history_cache.get(uid)
+        if entry is not None and entry["cid"] == cid and entry["version"] == version:
+            self._command_history_cache.move_to_end(uid)
+            self._stats_inc("command_history_cache_hit")
+            return entry
 
-        history = await self._loads_json_maybe_in_executor(history_str)
-        if history is None:
-            return []
+        history = []
+        if history_str:
+            # 追加时整段历史本就会被截到 max_turns*2 条，只需解码尾部
+            with self._perf_span("history_tail_parse"):
+                loaded = _loads_history_tail(history_str, self._command_context_max_turns() * 2)
+            if loaded is None:
+                self._stats_inc("command_history_tail_fallback")
+                loaded = await self._loads_json_maybe_in_executor(history_str)
+            if isinstance(loaded, list):
+                history = [h for h in loaded if isinstance(h, dict)]
+            self._stats_inc("command_history_parsed")
+        entry = {"uid": uid, "cid": cid, "version": version, "history": history}
+        self._command_history_cache_put(entry)
+        return entry
 
-        if not isinstance(history, list):
+    def _command_context_messages(self, history: list) -> list:
+        max_turns = self._command_context_max_turns()
+        if max_turns <= 0:
             return []
-
         messages = []
         for item in history:
-            if not isinstance(item, dict):
-                continue
             role = item.get("role")
             content = item.get("content")
             if role not in ("user", "assistant"):
@@ -61,56 +166,106 @@ class JudgeContextMixin:
             if not isinstance(content, str):
                 continue
             messages.append({"role": role, "content": content})
+        return messages[-max_turns * 2 :]
 
-        limit = max_turns * 2
-        if limit > 0:
-            messages = messages[-limit:]
-
-        return messages
-
-    async def _append_command_llm_context(self, event: AstrMessageEvent, user_text: str, assistant_text: str):
-        if not self.config.get("enable_command_context", False):
-            return
-
-        max_turns = self.config.get("command_context_max_turns", 10)
+    async def _get_command_llm_context(self, event: AstrMessageEvent) -> list:
+        if self._command_context_max_turns() <= 0:
+            return []
+        uid = event.unified_msg_origin
         try:
-            max_turns = int(max_turns)
+            async with self._command_history_guard(uid) as state:
+                cid = await self.context.conversation_manager.get_curr_conversation_id(uid)
+                if not cid:
+                    return []
+                entry = await self._read_command_history(uid, cid)
+                # 尚未写回的追加同样属于上下文
+                history = entry["history"] + [m for c, m in state["pending"] if c == cid]
         except Exception:
-            max_turns = 10
+            return []
+        return self._command_context_messages(history)
 
-        if max_turns <= 0:
+    async def _append_command_llm_context(self, event: AstrMessageEvent, user_text: str, assistant_text: str):
+        if self._command_context_max_turns() <= 0:
+            return
+        messages = []
+        if user_text:
+            messages.append({"role": "user", "content": user_text})
+        if assistant_text:
+            messages.append({"role": "assistant", "content": assistant_text})
+        if not messages:
             return
-
         uid = event.unified_msg_origin
         try:
+            # 模型调用期间会话可能被切换：按追加时的当前会话记录
             conv_mgr = self.context.conversation_manager
-            curr_cid = await conv_mgr.get_curr_conversation_id(uid)
-            if not curr_cid:
-                curr_cid = await conv_mgr.new_conversation(uid, content=[])
-            conversation = await conv_mgr.get_conversation(uid, curr_cid)
+            cid = await conv_mgr.get_curr_conversation_id(uid)
+            if not cid:
+                cid = await conv_mgr.new_conversation(uid, content=[])
         except Exception:
             return
 
-        history_str = getattr(conversation, "history", "") or ""
-        history = []
-        if history_str:
-            loaded = await self._loads_json_maybe_in_executor(history_str)
-            history = loaded if loaded is not None else []
-
-        if not isinstance(history, list):
-            history = []
+        state = self._command_history_state(uid)
+        state["pending"].extend((cid, m) for m in messages)
+        task = state["task"]
+        if task is not None and not task.done():
+            # 已有写回在排队：本次追加合并进去
+            self._stats_inc("command_history_coalesced")
+            return
+        # 后写：不等待存储，回复可以立即发出；terminate 时统一落盘
+        task = asyncio.ensure_future(self._flush_command_history(uid))
+        state["task"] = task
+        self._command_history_writes.add(task)
+        task.add_done_callback(self._command_history_writes.discard)
 
-        if user_text:
-            history.append({"role": "user", "content": user_text})
-        if assistant_text:
-            history.append({"role": "assistant", "content": assistant_text})
+    async def _flush_command_history(self, uid: str, delay: bool = True):
+        """后台合并写回：等待 command_context_flush_delay_ms 后，把该会话排队的追加一次性写回。
 
-        history = [h for h in history if isinstance(h, dict)]
-        limit = max_turns * 2
-        if limit > 0 and len(history) > limit:
-            history = history[-limit:]
+        写回前在会话锁内重新读取存储并核对版本，期间框架追加的对话不会被覆盖。
+        """
+        if delay:
+            try:
+                delay_ms = int(self.config.get("command_context_flush_delay_ms", 0))
+            except Exception:
+                delay_ms = 0
+            await asyncio.sleep(max(delay_ms, 0) / 1000)
+        async with self._command_history_guard(uid) as state:
+            state["task"] = None
+            pending, state["pending"] = state["pending"], []
+            # 按会话 ID 分段并保持追加顺序（期间可能切换过会话）
+            groups = []
+            for cid, message in pending:
+                if groups and groups[-1][0] == cid:
+                    groups[-1][1].append(message)
+                else:
+                    groups.append((cid, [message]))
+            limit = self._command_context_max_turns() * 2
+            for cid, messages in groups:
+                try:
+                    entry = await self._read_command_history(uid, cid)
+                    history = entry["history"] + messages
+                    if limit > 0 and len(history) > limit:
+                        history = history[-limit:]
+                    await self.context.conversation_manager.update_conversation(uid, cid, history=history)
+                except Exception:
+                    logger.warning(f"[JudgePlugin] 命令上下文写回失败: {uid}")
+                    self._command_history_cache.pop(uid, None)
+                    continue
+                self._stats_inc("command_history_flush")
+                # 框架按 json.dumps 默认参数序列化历史；按写入内容记录版本，若存储格式不同只会导致下次多解析一次
+                self._command_history_cache_put(
+                    {"uid": uid, "cid": cid, "version": _history_version(json.dumps(history)), "history": history}
+                )
 
-        try:
-            await conv_mgr.update_conversation(uid, curr_cid, history=history)
-        except Exception:
-            return
+    async def _flush_all_command_history(self):
+        """terminate 时调用：跳过合并等待，把所有排队的追加按会话顺序写完。"""
+        for uid, state in list(self._command_history_sessions.items()):
+            if not state["pending"]:
+                continue
+            task = state["task"]
+            if task is not None and not task.done():
+                # 仍在合并等待或排队等锁，尚未取走队列：取消后由下面直接写回
+                task.cancel()
+            await self._flush_command_history(uid, delay=False)
+        pending = [t for t in self._command_history_writes if not t.done()]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
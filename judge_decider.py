@@ -1,120 +1,191 @@
-from string import Template
-from astrbot.api import logger
+import time
 
 
 INTERNAL_JUDGE_MARKER = "__astrbot_plugin_judge_internal__"
 DEFAULT_JUDGE_SYSTEM_PROMPT = "你是一个消息复杂度判断助手。只输出 HIGH 或 FAST，不要输出任何解释、标点、空格或换行。"
 
+# 判定流水线：按顺序执行，第一个给出 HIGH/FAST 的阶段即为结果。
+# 每个阶段对应方法 _decider_stage_<name>(ctx)，返回 (decision, reason) 或 None；
+# 新增阶段只需在任一 Mixin 中实现该方法并把名字加入 decider_stages 配置。
+DEFAULT_DECIDER_STAGES = ("inertia", "rules", "cache", "llm", "fallback")
+
 
 class JudgeDeciderMixin:
-    async def _judge_message_complexity_with_meta(self, message: str) -> tuple:
-        normalized = self._normalize_text(message)
-
-        if self.config.get("enable_rule_prejudge", True):
-            pre, reason = self._rule_prejudge_detail(message)
-            if pre in ("HIGH", "FAST"):
-                self._stats_inc("judge_rule_hit")
-                return (pre, "rule", reason)
-
-        if self.config.get("enable_decision_cache", True) and normalized:
-            cached = self._cache_get(self._decision_cache, f"decision:{normalized}")
-            if cached in ("HIGH", "FAST"):
-                self._stats_inc("judge_cache_hit")
-                return (cached, "cache", "")
-
-        judge_provider_id = self.config.get("judge_provider_id", "")
-        if not judge_provider_id:
-            decision = self._simple_rule_judge(message)
-            return (decision, "fallback", "no_judge_provider")
-
-        provider = self.context.get_provider_by_id(judge_provider_id)
-        if not provider:
-            decision = self._simple_rule_judge(message)
-            if self.config.get("enable_decision_cache", True) and normalized:
-                self._cache_set(
-                    self._decision_cache,
-                    f"decision:{normalized}",
-                    decision,
-                    self.config.get("decision_cache_ttl_seconds", 600),
-                    self.config.get("decision_cache_max_entries", 500),
-                )
-            return (decision, "fallback", "judge_provider_missing")
-
-        custom_prompt = self.config.get("custom_judge_prompt", "")
-        if custom_prompt and "$message" in custom_prompt:
-            prompt = Template(custom_prompt).safe_substitute(message=message)
+    def _get_decider_stages(self) -> list:
+        stages = self.config.get("decider_stages", None)
+        if not isinstance(stages, list) or not stages:
+            stages = list(DEFAULT_DECIDER_STAGES)
+        out = []
+        for name in stages:
+            name = str(name or "").strip().lower()
+            if name and name not in out and callable(getattr(self, f"_decider_stage_{name}", None)):
+                out.append(name)
+        # fallback 总是兜底，保证流水线一定产出结果
+        if "fallback" not in out:
+            out.append("fallback")
+        return out
+
+    def _decider_stage_stat(self, name: str) -> dict:
+        stat = self._decider_stage_stats.get(name)
+        if stat is None:
+            stat = {"calls": 0, "hits": 0, "total_ms": 0.0}
+            self._decider_stage_stats[name] = stat
+        return stat
+
+    def _decider_stats_inc(self, ctx: dict, key: str):
+        if ctx.get("dry_run"):
+            return
+        if ctx.get("deferred"):
+            ctx["pending_stats"].append(key)
+            return
+        self._stats_inc(key)
+
+    def _decider_note_stage(self, ctx: dict, name: str, elapsed_ms: float, hit: bool):
+        if ctx.get("deferred"):
+            ctx["pending_stages"].append((name, elapsed_ms, hit))
+            return
+        stat = self._decider_stage_stat(name)
+        stat["calls"] += 1
+        stat["total_ms"] += elapsed_ms
+        if hit:
+            stat["hits"] += 1
+
+    async def _decider_run(
+        self, message: str, session_key: str = "", desc: dict = None, dry_run: bool = False, deferred: bool = False
+    ) -> tuple:
+        """执行判定流水线，返回 (decision, source, reason, ctx)；调用方须再调用 _decider_commit 写入缓存/惯性/分类器。
+
+        deferred=True 时统计与惯性扣减也暂存在 ctx 中，由 _decider_commit 补记（供提前判定使用：消息未必会进入 LLM 请求）。
+        """
+        if desc is None or desc.get("text") != message:
+            desc = self._describe_message(message)
+        ctx = {
+            "message": message,
+            "desc": desc,
+            "normalized": desc["normalized"],
+            "session_key": session_key,
+            "fallback_reason": "",
+            "dry_run": dry_run,
+            "deferred": deferred,
+            "pending_stats": [],
+            "pending_stages": [],
+        }
+        decision, source, reason = ("", "", "")
+        for name in self._get_decider_stages():
+            stage = getattr(self, f"_decider_stage_{name}")
+            t0 = time.perf_counter()
+            result = await stage(ctx)
+            hit = bool(result) and result[0] in ("HIGH", "FAST")
+            if not dry_run:
+                self._decider_note_stage(ctx, name, (time.perf_counter() - t0) * 1000, hit)
+            if hit:
+                decision, reason = result
+                source = name
+                break
+        return (decision, source, reason, ctx)
+
+    def _decider_commit(self, ctx: dict, decision: str, source: str):
+        if ctx.get("dry_run"):
+            return
+        if ctx.get("deferred"):
+            ctx["deferred"] = False
+            for name, elapsed_ms, hit in ctx["pending_stages"]:
+                self._decider_note_stage(ctx, name, elapsed_ms, hit)
+            for key in ctx["pending_stats"]:
+                self._stats_inc(key)
+            if source == "inertia":
+                # 提前判定时只查看了惯性记录，此时才扣减剩余轮数
+                self._inertia_carry(ctx["session_key"], ctx["message"], ctx["desc"])
+        self._decider_after_decision(ctx, decision, source)
+        if source != "inertia":
+            self._inertia_remember(ctx["session_key"], decision)
+
+    async def _judge_message_complexity_with_meta(
+        self, message: str, session_key: str = "", desc: dict = None, dry_run: bool = False
+    ) -> tuple:
+        """dry_run=True 时只读当前状态：不调用 judge、不写缓存/惯性/分类器、不计统计（供 /judge_dryrun 使用）。"""
+        decision, source, reason, ctx = await self._decider_run(message, session_key, desc, dry_run=dry_run)
+        self._decider_commit(ctx, decision, source)
+        return (decision, "rule" if source == "rules" else source, reason)
+
+    def _decider_after_decision(self, ctx: dict, decision: str, source: str):
+        # 只缓存"较贵"阶段的结果：llm 正常 TTL，fallback（judge 缺失/失败/无法解析）统一用较短 TTL，
+        # 避免上游短暂故障把降级结果长期固化
+        if source == "llm":
+            ttl = self.config.get("decision_cache_ttl_seconds", 600)
+        elif source == "fallback":
+            ttl = self.config.get("decision_cache_fallback_ttl_seconds", 60)
         else:
-            prompt = self.judge_prompt_template.safe_substitute(message=message)
-
-        judge_model = self.config.get("judge_model", "")
-
+            return
+        if self.config.get("enable_decision_cache", True) and ctx["normalized"]:
+            self._cache_set(
+                self._decision_cache,
+                f"decision:{ctx['desc']['fp']:016x}",
+                decision,
+                ttl,
+                self.config.get("decision_cache_max_entries", 500),
+            )
+        if source == "llm":
+            self._classifier_observe(ctx, decision)
+
+    async def _decider_stage_inertia(self, ctx: dict):
+        peek = ctx.get("dry_run", False) or ctx.get("deferred", False)
+        carried = self._inertia_carry(ctx["session_key"], ctx["message"], ctx["desc"], peek=peek)
+        return (carried[0], carried[2]) if carried else None
+
+    async def _decider_stage_rules(self, ctx: dict):
+        if not self.config.get("enable_rule_prejudge", True):
+            return None
+        pre, reason = self._rule_prejudge_detail(ctx["message"], ctx["desc"])
+        if pre in ("HIGH", "FAST"):
+            self._decider_stats_inc(ctx, "judge_rule_hit")
+            return (pre, reason)
+        return None
+
+    async def _decider_stage_cache(self, ctx: dict):
+        if not self.config.get("enable_decision_cache", True) or not ctx["normalized"]:
+            return None
+        key = f"decision:{ctx['desc']['fp']:016x}"
+        if ctx.get("dry_run") or ctx.get("deferred"):
+            cached = self._cache_peek(self._decision_cache, key)
+        else:
+            cached = self._cache_get(self._decision_cache, key)
+        if cached in ("HIGH", "FAST"):
+            self._decider_stats_inc(ctx, "judge_cache_hit")
+            return (cached, "")
+        return None
+
+    async def _decider_stage_fallback(self, ctx: dict):
+        return (self._simple_rule_judge(ctx["message"], ctx["desc"]), ctx["fallback_reason"] or "no_stage_decided")
+
+    async def _decider_stage_llm(self, ctx: dict):
+        if ctx.get("dry_run"):
+            # 模拟不发起 judge 调用，交给后续阶段（通常是 fallback）给出预估
+            ctx["judge_skipped"] = True
+            ctx["fallback_reason"] = "dry_run_judge_skipped"
+            return None
+        prompt = self._build_judge_prompt(self._compact_judge_input(ctx["message"], ctx["desc"]["tokens"]))
+
+        base_system_prompt = str(self.config.get("judge_system_prompt", "") or "").strip() or DEFAULT_JUDGE_SYSTEM_PROMPT
+        system_prompt = f"{INTERNAL_JUDGE_MARKER} {base_system_prompt}"
+        task_id = 0
         try:
-            base_system_prompt = str(self.config.get("judge_system_prompt", "") or "").strip() or DEFAULT_JUDGE_SYSTEM_PROMPT
-            system_prompt = f"{INTERNAL_JUDGE_MARKER} {base_system_prompt}"
+            task_id = int(self._current_task_id() or 0)
+        except Exception:
             task_id = 0
-            try:
-                task_id = int(self._current_task_id() or 0)
-            except Exception:
-                task_id = 0
-            if task_id:
-                try:
-                    self._internal_llm_tasks.add(task_id)
-                except Exception:
-                    pass
-            response = await self._provider_text_chat(
-                provider,
-                prompt=prompt,
-                context_messages=[],
-                system_prompt=system_prompt,
-                model_name=judge_model,
-            )
-            if task_id:
-                try:
-                    self._internal_llm_tasks.discard(task_id)
-                except Exception:
-                    pass
-
-            result_text = response.completion_text.strip().upper()
-            if "HIGH" in result_text:
-                decision = "HIGH"
-            elif "FAST" in result_text:
-                decision = "FAST"
-            else:
-                decision = self._simple_rule_judge(message)
-                return (decision, "fallback", "judge_unparseable")
-
-            if self.config.get("enable_decision_cache", True) and normalized:
-                self._cache_set(
-                    self._decision_cache,
-                    f"decision:{normalized}",
-                    decision,
-                    self.config.get("decision_cache_ttl_seconds", 600),
-                    self.config.get("decision_cache_max_entries", 500),
-                )
-
-            return (decision, "llm", "")
-
-        except Exception as e:
-            try:
-                task_id = int(self._current_task_id() or 0)
-            except Exception:
-                task_id = 0
+        if task_id:
+            self._internal_llm_tasks.add(task_id)
+        try:
+            decision, judge_route, fallback_reason = await self._judge_call(prompt, system_prompt)
+        finally:
+            # 提前判定的任务可能被取消（CancelledError 不会被吞掉），在此统一清理
             if task_id:
-                try:
-                    self._internal_llm_tasks.discard(task_id)
-                except Exception:
-                    pass
-            logger.warning(f"[JudgePlugin] judge 模型调用失败, fallback: {e}")
-            decision = self._simple_rule_judge(message)
-            if self.config.get("enable_decision_cache", True) and normalized:
-                self._cache_set(
-                    self._decision_cache,
-                    f"decision:{normalized}",
-                    decision,
-                    self.config.get("decision_cache_ttl_seconds", 600),
-                    self.config.get("decision_cache_max_entries", 500),
-                )
-            return (decision, "fallback", "judge_error")
+                self._internal_llm_tasks.discard(task_id)
+        if not decision:
+            ctx["fallback_reason"] = fallback_reason
+            return None
+        ctx["judge_route"] = judge_route
+        return (decision, "")
 
     async def _judge_message_complexity(self, message: str) -> str:
         decision, _, _ = await self._judge_message_complexity_with_meta(message)
@@ -0,0 +1,132 @@
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from astrbot.api import logger
+
+
+def _timed_call(fn, args):
+    # 在工作线程/进程中执行，返回开始与结束时刻，用于区分排队与执行耗时
+    started = time.monotonic()
+    result = fn(*args)
+    return result, started, time.monotonic()
+
+
+class JudgeExecutorMixin:
+    """插件自有的有界执行器：JSON 编解码、文件写入等阻塞工作按数据量选择就地执行、线程池或进程池。"""
+
+    def _executor_int(self, key: str, default: int) -> int:
+        try:
+            return max(int(self.config.get(key, default)), 0)
+        except Exception:
+            return default
+
+    def _executor_start(self):
+        if self._executor["threads"] is not None:
+            return
+        workers = max(self._executor_int("executor_max_workers", 2), 1)
+        self._executor["threads"] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="judge-worker")
+        self._executor["slots"] = asyncio.Semaphore(max(self._executor_int("executor_max_pending", 32), 1))
+        if self._executor_int("executor_process_min_chars", 0) > 0:
+            try:
+                # AstrBot 进程是多线程的，fork 出的子进程可能继承被其他线程持有的锁，改用 spawn
+                self._executor["processes"] = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            except Exception:
+                logger.exception("[JudgePlugin] 进程池创建失败，CPU 密集任务改用线程池")
+        logger.info(
+            f"[JudgePlugin] 后台执行器已启动 (线程 {workers}"
+            f"{', 含进程池' if self._executor['processes'] is not None else ''})"
+        )
+
+    def _executor_stop(self):
+        for kind in ("threads", "processes"):
+            pool = self._executor[kind]
+            self._executor[kind] = None
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._executor["slots"] = None
+
+    def _executor_note(self, name: str, where: str, wait_ms: float, run_ms: float):
+        stats = self._executor["tasks"]
+        stat = stats.get(name)
+        if stat is None:
+            stat = {"inline": 0, "thread": 0, "process": 0, "wait_ms": 0.0, "run_ms": 0.0, "max_ms": 0.0}
+            stats[name] = stat
+        stat[where] += 1
+        stat["wait_ms"] += wait_ms
+        stat["run_ms"] += run_ms
+        if wait_ms + run_ms > stat["max_ms"]:
+            stat["max_ms"] = wait_ms + run_ms
+
+    async def _run_blocking(self, name: str, fn, *args, size: int = None, cpu: bool = False):
+        """执行阻塞函数 fn(*args)。
+
+        size 为数据量（字符数）：小于 executor_offload_min_chars 时就地执行；size 为 None 表示总是放到线程池（如文件 IO）。
+        cpu=True 且 size 达到 executor_process_min_chars 时使用进程池（fn 与参数须可 pickle）。
+        执行器未启动时沿用事件循环的默认执行器。
+        """
+        if size is not None and size < self._executor_int("executor_offload_min_chars", 20000):
+            t0 = time.monotonic()
+            with self._perf_span(name):
+                result = fn(*args)
+            self._executor_note(name, "inline", 0.0, (time.monotonic() - t0) * 1000)
+            return result
+
+        loop = asyncio.get_running_loop()
+        threads = self._executor["threads"]
+        if threads is None:
+            return await loop.run_in_executor(None, fn, *args)
+
+        pool, where = threads, "thread"
+        executor = self._executor
+        process_min = self._executor_int("executor_process_min_chars", 0)
+        if cpu and executor["processes"] is not None and size is not None and 0 < process_min <= size:
+            pool, where = executor["processes"], "process"
+
+        slots = executor["slots"]
+        if slots.locked():
+            executor["saturated"] += 1
+        async with slots:
+            executor["pending"] += 1
+            if executor["pending"] > executor["max_pending"]:
+                executor["max_pending"] = executor["pending"]
+            submitted = time.monotonic()
+            try:
+                result, started, finished = await loop.run_in_executor(pool, _timed_call, fn, args)
+            except BrokenProcessPool as e:
+                # 子进程异常退出：弃用进程池，改用线程池
+                logger.warning(f"[JudgePlugin] 进程池不可用，改用线程池: {e}")
+                broken = executor["processes"]
+                executor["processes"] = None
+                if broken is not None:
+                    # 释放进程池的管理线程与管道，避免遗留
+                    broken.shutdown(wait=False, cancel_futures=True)
+                where = "thread"
+                submitted = time.monotonic()
+                result, started, finished = await loop.run_in_executor(threads, _timed_call, fn, args)
+            finally:
+                executor["pending"] -= 1
+        self._executor_note(name, where, (started - submitted) * 1000, (finished - started) * 1000)
+        return result
+
+    def _executor_summary_lines(self) -> list:
+        executor = self._executor
+        if executor["threads"] is None and not executor["tasks"]:
+            return []
+        lines = [
+            f"🧵 **后台执行器**: {'运行中' if executor['threads'] is not None else '未启动'}"
+            f" | 排队 {executor['pending']} (峰值 {executor['max_pending']}) | 满载等待 {executor['saturated']} 次"
+        ]
+        for name, stat in sorted(executor["tasks"].items(), key=lambda kv: kv[1]["run_ms"], reverse=True):
+            offloaded = stat["thread"] + stat["process"]
+            calls = offloaded + stat["inline"]
+            avg_wait = stat["wait_ms"] / offloaded if offloaded else 0.0
+            avg_run = stat["run_ms"] / calls if calls else 0.0
+            lines.append(
+                f"• {name}: 就地 {stat['inline']} | 线程 {stat['thread']} | 进程 {stat['process']}"
+                f" | 平均排队 {avg_wait:.1f}ms | 平均执行 {avg_run:.1f}ms | 最长 {stat['max_ms']:.0f}ms"
+            )
+        return lines
@@ -1,6 +1,7 @@
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api.provider import ProviderRequest
 from astrbot.api import logger
+import asyncio
 import time
 
 
@@ -8,6 +9,71 @@ INTERNAL_JUDGE_MARKER = "__astrbot_plugin_judge_internal__"
 
 
 class JudgeHooksMixin:
+    def _cleanup_prejudge_futures(self, now: float, force_all: bool = False):
+        try:
+            ttl = float(self.config.get("early_prejudge_ttl_seconds", 60))
+        except Exception:
+            ttl = 60.0
+        futures = self._prejudge_futures
+        # OrderedDict 按创建时间有序：只需从头部弹出过期/超量项
+        while futures:
+            mid, entry = next(iter(futures.items()))
+            if not force_all and len(futures) <= 500 and now - entry["ts"] <= ttl:
+                break
+            futures.pop(mid, None)
+            if not entry["future"].done():
+                entry["future"].cancel()
+                self._stats_inc("judge_prejudge_dropped")
+
+    async def on_message_prejudge(self, event: AstrMessageEvent):
+        if not self.config.get("enable", True) or not self.config.get("enable_early_prejudge", False):
+            return
+        if getattr(event, "is_at_or_wake_command", True) is False:
+            return
+        msg_obj = getattr(event, "message_obj", None)
+        msg_id = getattr(msg_obj, "message_id", "") if msg_obj else ""
+        message = event.message_str
+        if not msg_id or not message or not message.strip():
+            return
+        # 指令消息不会进入 on_llm_request，提前判定只会浪费一次 judge 调用
+        if message.lstrip().startswith("/"):
+            return
+        if msg_id in self._prejudge_futures or not self._is_router_allowed(event):
+            return
+
+        now = time.monotonic()
+        with self._perf_span("prejudge_sweep"):
+            self._cleanup_prejudge_futures(now)
+        desc = self._describe_message(message)
+        # 只判定不落地：缓存/惯性/分类器与统计在 LLM 请求钩子取用结果时才写入
+        future = asyncio.ensure_future(
+            self._decider_run(message, session_key=self._session_key(event), desc=desc, deferred=True)
+        )
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._prejudge_futures[msg_id] = {"ts": now, "text": desc["text"], "future": future}
+        self._stats_inc("judge_prejudge_started")
+
+    async def _take_prejudge_or_judge(self, event: AstrMessageEvent, message: str, desc: dict) -> tuple:
+        msg_obj = getattr(event, "message_obj", None)
+        msg_id = getattr(msg_obj, "message_id", "") if msg_obj else ""
+        entry = self._prejudge_futures.pop(msg_id, None) if msg_id else None
+        if entry is not None:
+            future = entry["future"]
+            # 原文逐字比较：两个钩子之间 message_str 可能被改写，归一化指纹会把大小写/标点不同的文本视为相同
+            if entry["text"] == desc["text"] and not future.cancelled():
+                # 条目已出表，清理逻辑不会再取消它：此处的 CancelledError 只可能来自本任务，照常向上抛出
+                try:
+                    decision, source, reason, ctx = await asyncio.shield(future)
+                except Exception:
+                    pass
+                else:
+                    self._decider_commit(ctx, decision, source)
+                    self._stats_inc("judge_prejudge_used")
+                    return (decision, "rule" if source == "rules" else source, reason)
+            elif not future.done():
+                future.cancel()
+        return await self._judge_message_complexity_with_meta(message, session_key=self._session_key(event), desc=desc)
+
     async def on_llm_request(self, event: AstrMessageEvent, req: ProviderRequest):
         if not self.config.get("enable", True):
             return
@@ -47,16 +113,21 @@ class JudgeHooksMixin:
                 should_cleanup = True
             if should_cleanup:
                 setattr(self, "_llm_pending_last_cleanup_ts", now)
-                expired = []
-                for mid, data in self._llm_pending.items():
-                    try:
-                        ts_start = int(data.get("ts_start", now) or now)
-                    except Exception:
-                        ts_start = now
-                    if now - ts_start > pending_ttl_seconds:
-                        expired.append(mid)
-                for mid in expired:
-                    self._llm_pending.pop(mid, None)
+                with self._perf_span("llm_pending_sweep"):
+                    expired = []
+                    for mid, data in self._llm_pending.items():
+                        try:
+                            ts_start = int(data.get("ts_start", now) or now)
+                        except Exception:
+                            ts_start = now
+                        if now - ts_start > pending_ttl_seconds:
+                            expired.append(mid)
+                    for mid in expired:
+                        self._llm_pending.pop(mid, None)
+        if self._prejudge_futures:
+            # 未进入 LLM 请求的提前判定（被后续流程拦下等）不必等到下一次提前判定才清理
+            with self._perf_span("prejudge_sweep"):
+                self._cleanup_prejudge_futures(time.monotonic())
 
         if self.config.get("enable_session_lock", True):
             lock_cleanup_interval = self.config.get("session_lock_cleanup_interval_seconds", 60)
@@ -76,7 +147,8 @@ class JudgeHooksMixin:
                 except Exception:
                     ttl = 3600
                 try:
-                    self._cleanup_session_locks(now, ttl, max_scan=1000)
+                    with self._perf_span("session_lock_sweep"):
+                        self._cleanup_session_locks(now, ttl, max_scan=1000)
                 except Exception:
                     pass
 
@@ -88,7 +160,8 @@ class JudgeHooksMixin:
             return
 
         try:
-            decision, judge_source, judge_reason = await self._judge_message_complexity_with_meta(user_message)
+            desc = self._describe_message(user_message)
+            decision, judge_source, judge_reason = await self._take_prejudge_or_judge(event, user_message, desc)
 
             base_pool = "HIGH" if decision == "HIGH" else "FAST"
             desired_pool = base_pool
@@ -106,6 +179,13 @@ class JudgeHooksMixin:
                 if model_name:
                     req.model = model_name
 
+            # 与上一轮命中同一 provider:model 时，上游前缀缓存更可能命中（warm）
+            sticky = True if (route_meta and route_meta.get("sticky")) else False
+            warm_route = False
+            prev_route = self._last_route.get(self._session_key(event))
+            if isinstance(prev_route, dict) and provider_id:
+                warm_route = prev_route.get("provider_id") == provider_id and prev_route.get("model") == model_name
+
             self._stats_inc("router_total")
             if decision == "HIGH":
                 self._stats_inc("router_decision_high")
@@ -125,6 +205,10 @@ class JudgeHooksMixin:
                 self._stats_inc("router_cb_pool_fallback")
             if pool != desired_pool:
                 self._stats_inc("router_pool_changed")
+            if sticky:
+                self._stats_inc("router_sticky")
+                if warm_route:
+                    self._stats_inc("router_sticky_warm")
 
             try:
                 sk = self._session_key(event)
@@ -133,6 +217,8 @@ class JudgeHooksMixin:
                         "ts": self._now_ts(),
                         "scope": "router",
                         "message": user_message[:200],
+                        "message_fp": desc["fp"],
+                        "message_tokens": desc["tokens"],
                         "decision": decision,
                         "judge_source": judge_source,
                         "judge_reason": judge_reason,
@@ -144,6 +230,8 @@ class JudgeHooksMixin:
                         "lock": True if lock else False,
                         "provider_id": provider_id,
                         "model": model_name,
+                        "sticky": sticky,
+                        "warm_route": warm_route,
                         "cb_skipped": True if (route_meta and route_meta.get("cb_skipped")) else False,
                         "cb_pool_fallback": True if (route_meta and route_meta.get("cb_pool_fallback")) else False,
                         "original_provider_id": (route_meta or {}).get("original_provider_id", ""),
@@ -159,6 +247,9 @@ class JudgeHooksMixin:
                     self._llm_pending[msg_id] = {
                         "t0": time.perf_counter(),
                         "ts_start": self._now_ts(),  # 用于 TTL 清理
+                        "message_fp": desc["fp"],
+                        "message_tokens": desc["tokens"],
+                        "has_code": desc["has_code"],
                         "decision": decision,
                         "judge_source": judge_source,
                         "judge_reason": judge_reason,
@@ -168,6 +259,8 @@ class JudgeHooksMixin:
                         "policy": policy,
                         "budget_blocked": budget_blocked,
                         "lock": True if lock else False,
+                        "sticky": sticky,
+                        "warm_route": warm_route,
                         "cb_skipped": True if (route_meta and route_meta.get("cb_skipped")) else False,
                         "cb_pool_fallback": True if (route_meta and route_meta.get("cb_pool_fallback")) else False,
                     }
@@ -199,10 +292,29 @@ class JudgeHooksMixin:
             elapsed_ms = 0
         role = str(getattr(resp, "role", "") or "")
         ok = role != "err"
+        err_kind = ""
         try:
-            self._update_circuit_breaker(str(pending.get("provider_id") or ""), str(pending.get("model") or ""), ok)
+            if ok:
+                self._note_provider_success(str(pending.get("provider_id") or ""), str(pending.get("model") or ""))
+            else:
+                err_kind = self._note_provider_failure(
+                    str(pending.get("provider_id") or ""),
+                    str(pending.get("model") or ""),
+                    str(getattr(resp, "completion_text", "") or ""),
+                )
         except Exception:
             pass
+        try:
+            self._usage_record(
+                event,
+                str(pending.get("pool") or ""),
+                str(pending.get("provider_id") or ""),
+                str(pending.get("model") or ""),
+                resp,
+            )
+            await self._usage_maybe_persist()
+        except Exception:
+            logger.exception("[JudgePlugin] 用量统计失败")
         if not self.config.get("enable_stats", True):
             return
         if ok:
@@ -215,7 +327,11 @@ class JudgeHooksMixin:
                 "kind": "llm",
                 "ok": ok,
                 "role": role,
+                "err_kind": err_kind,
                 "elapsed_ms": int(elapsed_ms),
+                "message_fp": pending.get("message_fp"),
+                "message_tokens": pending.get("message_tokens"),
+                "has_code": pending.get("has_code"),
                 "decision": pending.get("decision"),
                 "judge_source": pending.get("judge_source"),
                 "judge_reason": pending.get("judge_reason"),
@@ -225,6 +341,8 @@ class JudgeHooksMixin:
                 "policy": pending.get("policy"),
                 "budget_blocked": pending.get("budget_blocked"),
                 "lock": pending.get("lock"),
+                "sticky": pending.get("sticky"),
+                "warm_route": pending.get("warm_route"),
                 "cb_skipped": pending.get("cb_skipped"),
                 "cb_pool_fallback": pending.get("cb_pool_fallback"),
             }
@@ -0,0 +1,67 @@
+import time
+
+
+def _is_weak_rule_reason(reason: str) -> bool:
+    # 短问句与弱关键词只是"看起来简单"，在连续追问里不足以推翻上一轮的判定
+    return reason == "short_question" or reason.endswith(":weak")
+
+
+class JudgeInertiaMixin:
+    def _inertia_settings(self) -> tuple:
+        def _int(key: str, default: int) -> int:
+            try:
+                return int(self.config.get(key, default))
+            except Exception:
+                return default
+
+        return (
+            _int("inertia_max_chars", 15),
+            _int("inertia_max_turns", 3),
+            _int("inertia_ttl_seconds", 300),
+        )
+
+    def _inertia_remember(self, session_key: str, decision: str):
+        if not session_key or decision not in ("HIGH", "FAST"):
+            return
+        if not self.config.get("enable_route_inertia", False):
+            return
+        _, max_turns, _ = self._inertia_settings()
+        memory = self._route_inertia
+        memory[session_key] = {"decision": decision, "ts": time.monotonic(), "turns": max(max_turns, 0)}
+        memory.move_to_end(session_key)
+        while len(memory) > 2000:
+            memory.popitem(last=False)
+
+    def _inertia_carry(self, session_key: str, message: str, desc: dict = None, peek: bool = False):
+        """短追问沿用本会话最近一次判定；强规则命中时以规则为准。返回 (decision, source, reason) 或 None。
+
+        peek=True 时只读：不扣减剩余轮数、不清理过期记录、不计统计。
+        """
+        if not session_key or not self.config.get("enable_route_inertia", False):
+            return None
+        max_chars, _, ttl_seconds = self._inertia_settings()
+        text = (message or "").strip()
+        if not text or len(text) > max_chars:
+            return None
+        memory = self._route_inertia.get(session_key)
+        if not memory:
+            return None
+        if memory["turns"] <= 0 or time.monotonic() - memory["ts"] > ttl_seconds:
+            if not peek:
+                self._route_inertia.pop(session_key, None)
+            return None
+
+        pre, reason = ("UNKNOWN", "")
+        if self.config.get("enable_rule_prejudge", True):
+            pre, reason = self._rule_prejudge_detail(message, desc)
+            if pre in ("HIGH", "FAST") and not _is_weak_rule_reason(reason):
+                return None
+
+        if peek:
+            return (memory["decision"], "inertia", f"{memory['decision']}:left={memory['turns'] - 1}")
+        memory["turns"] -= 1
+        self._stats_inc("judge_inertia_hit")
+        if pre not in ("HIGH", "FAST"):
+            # 规则无法判定的短追问本会走 judge 模型：这是惯性真正省下的一次调用
+            self._stats_inc("judge_inertia_saved_llm")
+        return (memory["decision"], "inertia", f"{memory['decision']}:left={memory['turns']}")
@@ -0,0 +1,258 @@
+import math
+import time
+import random
+import asyncio
+from astrbot.api import logger
+
+
+def _parse_judge_decision(text: str) -> str:
+    """取最先出现的 HIGH/FAST。后续输出不会改变结果，流式判定可在首个标签出现时结束。"""
+    text = (text or "").strip().upper()
+    high = text.find("HIGH")
+    fast = text.find("FAST")
+    if high < 0 and fast < 0:
+        return ""
+    if fast < 0 or 0 <= high < fast:
+        return "HIGH"
+    return "FAST"
+
+
+# 每 N 次触发的竞速保留一次主 judge 跑完（结果丢弃），得到未被取消截断的主 judge 延迟样本
+_RACE_SHADOW_EVERY = 10
+
+
+def _percentile(samples, percentile: int):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+
+def _weighted_percentile(groups: list, percentile: int):
+    """groups 为 [(样本序列, 该组总权重)]，组内样本等权。"""
+    items = []
+    for samples, weight in groups:
+        if samples and weight > 0:
+            items.extend((v, weight / len(samples)) for v in samples)
+    if not items:
+        return None
+    items.sort()
+    target = sum(w for _, w in items) * percentile / 100
+    acc = 0.0
+    for value, w in items:
+        acc += w
+        if acc >= target:
+            return value
+    return items[-1][0]
+
+
+class JudgeJudgePoolMixin:
+    def _get_judge_pairs(self) -> list:
+        # judge_routes 非空时由 _normalize_config 展开为 judge_provider_ids/judge_models；否则退回单个 judge_provider_id
+        provider_ids = self.config.get("judge_provider_ids", None)
+        if isinstance(provider_ids, list) and provider_ids:
+            models = self.config.get("judge_models", [])
+            if not isinstance(models, list):
+                models = []
+            return [
+                (str(pid), str(models[i] or "") if i < len(models) else "")
+                for i, pid in enumerate(provider_ids)
+                if pid
+            ]
+        judge_provider_id = str(self.config.get("judge_provider_id", "") or "").strip()
+        if not judge_provider_id:
+            return []
+        return [(judge_provider_id, str(self.config.get("judge_model", "") or ""))]
+
+    def _rank_judge_pairs(self, pairs: list) -> list:
+        """健康的 judge 按延迟加权随机排序（越快越靠前）；熔断/冷却中的排在最后，仅在无健康 judge 时尝试。"""
+        if len(pairs) <= 1:
+            return list(pairs)
+        healthy = []
+        disabled = []
+        for pid, model in pairs:
+            if self.config.get("enable_circuit_breaker", True) and self._is_provider_temporarily_disabled(pid, model, scope="judge"):
+                disabled.append((pid, model))
+            else:
+                healthy.append((pid, model))
+
+        latencies = {pair: self._provider_latency_percentile(pair[0], pair[1], 50, min_samples=3) for pair in healthy}
+        known = [lat for lat in latencies.values() if lat]
+        # 无样本的 judge 视为与当前最快者一样快，保证新加入的 judge 能获得流量
+        default_latency = min(known) if known else 1.0
+        weighted = []
+        for pair, latency in latencies.items():
+            # Efraimidis-Spirakis 加权抽样：权重 1/latency，key = u^latency，取对数避免下溢
+            key = math.log(random.random() or 1e-300) * max(latency or default_latency, 1.0)
+            weighted.append((key, pair))
+        weighted.sort(key=lambda item: item[0], reverse=True)
+        return [pair for _, pair in weighted] + disabled
+
+    def _judge_route_stat(self, provider_id: str, model_name: str) -> dict:
+        key = f"{provider_id}:{model_name}"
+        stat = self._judge_route_stats.get(key)
+        if stat is None:
+            stat = {"calls": 0, "ok": 0, "err": 0, "unparseable": 0}
+            self._judge_route_stats[key] = stat
+        return stat
+
+    async def _judge_call_one(self, provider_id: str, model_name: str, prompt: str, system_prompt: str) -> tuple:
+        """调用单个 judge，返回 (decision, fallback_reason)；decision 为空表示该 judge 未给出结果。"""
+        provider = self.context.get_provider_by_id(provider_id)
+        if not provider:
+            return ("", "judge_provider_missing")
+        stat = self._judge_route_stat(provider_id, model_name)
+        stat["calls"] += 1
+        if self.config.get("enable_judge_streaming", False) and provider_id not in self._judge_stream_unsupported:
+            try:
+                decision, text = await self._provider_stream_until(
+                    provider,
+                    prompt=prompt,
+                    system_prompt=system_prompt,
+                    until=_parse_judge_decision,
+                    model_name=model_name,
+                    provider_id=provider_id,
+                )
+            except NotImplementedError:
+                # 不支持流式的提供商记住后直接走普通调用
+                self._judge_stream_unsupported.add(provider_id)
+                self._stats_inc("judge_stream_fallback")
+            except Exception as e:
+                stat["err"] += 1
+                logger.warning(f"[JudgePlugin] judge 模型流式调用失败({provider_id}): {e}")
+                return ("", "judge_error")
+            else:
+                self._stats_inc("judge_stream_calls")
+                decision = decision or _parse_judge_decision(text)
+                if not decision:
+                    stat["unparseable"] += 1
+                    return ("", "judge_unparseable")
+                stat["ok"] += 1
+                return (decision, "")
+
+        try:
+            response = await self._provider_text_chat(
+                provider,
+                prompt=prompt,
+                context_messages=[],
+                system_prompt=system_prompt,
+                model_name=model_name,
+                provider_id=provider_id,
+            )
+        except Exception as e:
+            stat["err"] += 1
+            logger.warning(f"[JudgePlugin] judge 模型调用失败({provider_id}): {e}")
+            return ("", "judge_error")
+        if str(getattr(response, "role", "") or "") == "err":
+            stat["err"] += 1
+            return ("", "judge_error")
+        decision = _parse_judge_decision(getattr(response, "completion_text", ""))
+        if not decision:
+            stat["unparseable"] += 1
+            return ("", "judge_unparseable")
+        stat["ok"] += 1
+        return (decision, "")
+
+    def _judge_race_delay_ms(self):
+        if not self.config.get("enable_judge_race", False):
+            return None
+        try:
+            return max(float(self.config.get("judge_race_delay_ms", 200)), 0.0)
+        except Exception:
+            return 200.0
+
+    async def _judge_race(self, routes: list, delay_ms: float, prompt: str, system_prompt: str) -> tuple:
+        """主 judge 先发，delay_ms 后仍无结果则向第二个 judge 发同一请求，取先解析出 HIGH/FAST 者并取消另一个。"""
+        latency = self._judge_latency
+        tasks = {}
+
+        def _launch(pid: str, model: str):
+            task = asyncio.ensure_future(self._judge_call_one(pid, model, prompt, system_prompt))
+            tasks[task] = (pid, model)
+            return task
+
+        t0 = time.perf_counter()
+        primary = _launch(*routes[0])
+        shadow = False
+        reason = "judge_error"
+        try:
+            if delay_ms > 0:
+                done, _ = await asyncio.wait({primary}, timeout=delay_ms / 1000)
+                if done:
+                    decision, reason = primary.result()
+                    if decision:
+                        latency["race_calls"] += 1
+                        latency["primary_direct"].append((time.perf_counter() - t0) * 1000)
+                        return (decision, "{}:{}".format(*routes[0]), "")
+                    # 主 judge 在等待窗口内就失败了：这是普通的故障转移，不计入竞速样本与触发率
+                    self._stats_inc("judge_failover")
+                    decision, reason = await self._judge_call_one(*routes[1], prompt, system_prompt)
+                    return (decision, "{}:{}".format(*routes[1]) if decision else "", reason)
+            latency["race_calls"] += 1
+            latency["race_fired"] += 1
+            self._stats_inc("judge_race_fired")
+            if not primary.done() and latency["race_fired"] % _RACE_SHADOW_EVERY == 0:
+                shadow = True
+                primary.add_done_callback(
+                    lambda t: None if t.cancelled() else latency["primary_shadow"].append((time.perf_counter() - t0) * 1000)
+                )
+            _launch(*routes[1])
+            pending = {t for t in tasks if not t.done()}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    decision, reason = task.result()
+                    if decision:
+                        self._stats_inc("judge_race_won_primary" if task is primary else "judge_race_won_secondary")
+                        return (decision, "{}:{}".format(*tasks[task]), "")
+            return ("", "", reason)
+        finally:
+            for task in tasks:
+                if not task.done() and not (shadow and task is primary):
+                    task.cancel()
+
+    async def _judge_call(self, prompt: str, system_prompt: str) -> tuple:
+        """依次尝试 judge 池中的提供商直到拿到 HIGH/FAST，返回 (decision, judge_route, fallback_reason)。"""
+        pairs = self._get_judge_pairs()
+        if not pairs:
+            return ("", "", "no_judge_provider")
+        try:
+            max_attempts = max(int(self.config.get("judge_max_attempts", 2)), 1)
+        except Exception:
+            max_attempts = 2
+
+        t0 = time.perf_counter()
+        ranked = self._rank_judge_pairs(pairs)[:max_attempts]
+        decision, route, reason = ("", "", "judge_provider_missing")
+        raced = False
+        delay_ms = self._judge_race_delay_ms()
+        if delay_ms is not None and len(ranked) >= 2:
+            decision, route, reason = await self._judge_race(ranked[:2], delay_ms, prompt, system_prompt)
+            ranked = ranked[2:]
+            raced = True
+        for attempt, (pid, model) in enumerate(ranked):
+            if decision:
+                break
+            if attempt or raced:
+                self._stats_inc("judge_failover")
+            decision, reason = await self._judge_call_one(pid, model, prompt, system_prompt)
+            route = f"{pid}:{model}" if decision else ""
+        if decision:
+            self._judge_latency["effective"].append((time.perf_counter() - t0) * 1000)
+            return (decision, route, "")
+        return ("", "", reason)
+
+    def _judge_latency_summary(self) -> tuple:
+        """返回 (不竞速时主 judge 的估计 p99, 实际判定 p99)。
+
+        未触发竞速的调用直接取主 judge 耗时；触发竞速的调用用抽样跑完的主 judge 耗时代表，按各自占比加权。
+        """
+        latency = self._judge_latency
+        fired = latency["race_fired"]
+        direct = latency["race_calls"] - fired
+        baseline = _weighted_percentile(
+            [(latency["primary_direct"], direct), (latency["primary_shadow"], fired)], 99
+        )
+        if fired and not latency["primary_shadow"]:
+            baseline = None
+        return (baseline, _percentile(latency["effective"], 99))
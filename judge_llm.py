@@ -1,17 +1,214 @@
+import asyncio
+import time
+from collections import deque
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api import logger
 
 
 class JudgeLlmMixin:
-    async def _provider_text_chat(self, provider, prompt: str, system_prompt: str, model_name: str = "", context_messages: list = None):
-        response = await provider.text_chat(
-            prompt=prompt,
-            context=context_messages or [],
-            system_prompt=system_prompt,
-            model=model_name if model_name else None,
-        )
+    async def _provider_text_chat(
+        self,
+        provider,
+        prompt: str,
+        system_prompt: str,
+        model_name: str = "",
+        context_messages: list = None,
+        provider_id: str = "",
+        latency_kind: str = "judge",
+        breaker_scope: str = "judge",
+    ):
+        t0 = time.perf_counter()
+        try:
+            response = await provider.text_chat(
+                prompt=prompt,
+                context=context_messages or [],
+                system_prompt=system_prompt,
+                model=model_name if model_name else None,
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if provider_id:
+                self._note_provider_failure(provider_id, model_name, e, scope=breaker_scope)
+            raise
+        if not provider_id:
+            return response
+        if str(getattr(response, "role", "") or "") == "err":
+            self._note_provider_failure(
+                provider_id, model_name, str(getattr(response, "completion_text", "") or ""), scope=breaker_scope
+            )
+        else:
+            self._note_provider_success(provider_id, model_name, scope=breaker_scope)
+            self._record_provider_latency(provider_id, model_name, (time.perf_counter() - t0) * 1000, latency_kind)
         return response
 
+    async def _provider_stream_until(
+        self,
+        provider,
+        prompt: str,
+        system_prompt: str,
+        until,
+        model_name: str = "",
+        provider_id: str = "",
+        breaker_scope: str = "judge",
+    ) -> tuple:
+        """流式调用提供商，累计文本使 until(text) 返回真值时立即关闭流。
+
+        返回 (until 的结果或 None, 累计文本)；提供商不支持流式时抛出 NotImplementedError（此时尚未发出请求）。
+        """
+        stream_fn = getattr(provider, "text_chat_stream", None)
+        if not callable(stream_fn):
+            raise NotImplementedError("provider does not support streaming")
+        t0 = time.perf_counter()
+        text = ""
+        result = None
+        stream = None
+        try:
+            stream = stream_fn(prompt=prompt, system_prompt=system_prompt, model=model_name if model_name else None)
+            async for chunk in stream:
+                piece = str(getattr(chunk, "completion_text", "") or "")
+                if str(getattr(chunk, "role", "") or "") == "err":
+                    raise RuntimeError(piece or "stream error")
+                # 增量块累加；非增量块（流结束时的完整响应）直接替换
+                text = text + piece if getattr(chunk, "is_chunk", True) else piece
+                result = until(text)
+                if result:
+                    break
+        except (asyncio.CancelledError, NotImplementedError):
+            raise
+        except Exception as e:
+            if provider_id:
+                self._note_provider_failure(provider_id, model_name, e, scope=breaker_scope)
+            raise
+        finally:
+            aclose = getattr(stream, "aclose", None)
+            if callable(aclose):
+                try:
+                    await aclose()
+                except Exception:
+                    pass
+        if provider_id:
+            self._note_provider_success(provider_id, model_name, scope=breaker_scope)
+            self._record_provider_latency(provider_id, model_name, (time.perf_counter() - t0) * 1000)
+        return (result, text)
+
+    def _record_provider_latency(self, provider_id: str, model_name: str, elapsed_ms: float, kind: str = "judge"):
+        # judge 判定与指令调用的耗时量级不同，分开记录：前者用于 judge 排序，后者用于对冲阈值
+        if not provider_id or elapsed_ms <= 0:
+            return
+        key = f"{kind}|{provider_id}:{model_name}"
+        samples = self._provider_latency.get(key)
+        if samples is None:
+            samples = deque(maxlen=200)
+            self._provider_latency[key] = samples
+        samples.append(float(elapsed_ms))
+
+    def _provider_latency_percentile(
+        self, provider_id: str, model_name: str, percentile: int, min_samples: int = 1, kind: str = "judge"
+    ):
+        samples = self._provider_latency.get(f"{kind}|{provider_id}:{model_name}")
+        if not samples or len(samples) < max(1, min_samples):
+            return None
+        ordered = sorted(samples)
+        percentile = min(max(int(percentile), 0), 100)
+        idx = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[idx]
+
+    def _hedge_delay_ms(self, provider_id: str, model_name: str):
+        if not self.config.get("enable_command_hedging", False):
+            return None
+        try:
+            percentile = int(self.config.get("hedge_latency_percentile", 90))
+        except Exception:
+            percentile = 90
+        try:
+            min_samples = int(self.config.get("hedge_min_samples", 20))
+        except Exception:
+            min_samples = 20
+        return self._provider_latency_percentile(provider_id, model_name, percentile, min_samples=min_samples, kind="command")
+
+    def _hedge_budget_allows(self) -> bool:
+        try:
+            budget_percent = float(self.config.get("hedge_budget_percent", 10))
+        except Exception:
+            budget_percent = 10.0
+        if budget_percent <= 0:
+            return False
+        calls = self._hedge_state.get("calls", 0)
+        hedged = self._hedge_state.get("hedged", 0)
+        return (hedged + 1) * 100 <= calls * budget_percent
+
+    async def _hedged_text_chat(
+        self,
+        pool: str,
+        provider,
+        provider_id: str,
+        model_name: str,
+        prompt: str,
+        system_prompt: str,
+        context_messages: list = None,
+    ) -> tuple:
+        """主请求超过该提供商学习到的延迟分位仍未返回时，向同池另一健康提供商发起对冲请求，取先成功者。
+
+        返回 (response, provider_id, model_name)。
+        """
+        kwargs = {
+            "prompt": prompt,
+            "system_prompt": system_prompt,
+            "context_messages": context_messages,
+            "latency_kind": "command",
+            "breaker_scope": "",
+        }
+        delay_ms = self._hedge_delay_ms(provider_id, model_name) if pool else None
+        if delay_ms is None:
+            response = await self._provider_text_chat(provider, model_name=model_name, provider_id=provider_id, **kwargs)
+            return (response, provider_id, model_name)
+
+        self._hedge_state["calls"] = self._hedge_state.get("calls", 0) + 1
+        primary = asyncio.ensure_future(
+            self._provider_text_chat(provider, model_name=model_name, provider_id=provider_id, **kwargs)
+        )
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay_ms / 1000)
+        except BaseException:
+            primary.cancel()
+            raise
+        if done:
+            return (primary.result(), provider_id, model_name)
+
+        hedge_provider_id, hedge_model = self._get_available_provider_model(pool, exclude_provider_id=provider_id)
+        hedge_provider = self.context.get_provider_by_id(hedge_provider_id) if hedge_provider_id else None
+        if not hedge_provider or not self._hedge_budget_allows():
+            return (await primary, provider_id, model_name)
+
+        self._hedge_state["hedged"] = self._hedge_state.get("hedged", 0) + 1
+        self._stats_inc("cmd_hedge_fired")
+        secondary = asyncio.ensure_future(
+            self._provider_text_chat(hedge_provider, model_name=hedge_model, provider_id=hedge_provider_id, **kwargs)
+        )
+        routes = {primary: (provider_id, model_name), secondary: (hedge_provider_id, hedge_model)}
+        pending = set(routes)
+        fallback = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        fallback = fallback or task
+                        continue
+                    response = task.result()
+                    if str(getattr(response, "role", "") or "") == "err" and pending:
+                        fallback = fallback or task
+                        continue
+                    if task is secondary:
+                        self._stats_inc("cmd_hedge_won")
+                    pid, model = routes[task]
+                    return (response, pid, model)
+            return (fallback.result(), *routes[fallback])
+        finally:
+            for task in pending:
+                task.cancel()
+
     async def _call_model_with_question(
         self,
         event: AstrMessageEvent,
@@ -21,6 +218,8 @@ class JudgeLlmMixin:
         model_type: str,
         system_prompt: str,
         notice: str = "",
+        pool: str = "",
+        desc: dict = None,
     ):
         if not provider_id:
             yield event.plain_result(f"❌ {model_type}未配置,请先在插件设置中配置相应的提供商列表")
@@ -36,13 +235,16 @@ class JudgeLlmMixin:
 
             context_messages = await self._get_command_llm_context(event)
 
-            normalized_q = self._normalize_text(question)
-            if (
+            if desc is None or desc.get("text") != question:
+                desc = self._describe_message(question)
+            use_answer_cache = (
                 self.config.get("enable_answer_cache", False)
                 and not self.config.get("enable_command_context", False)
-                and normalized_q
-            ):
-                cache_key = f"answer:{provider_id}:{model_name}:{self._normalize_text(system_prompt)}:{normalized_q}"
+                and desc["normalized"]
+            )
+            answer_key_suffix = f"{self._text_fingerprint(system_prompt):016x}:{desc['fp']:016x}"
+            if use_answer_cache:
+                cache_key = f"answer:{provider_id}:{model_name}:{answer_key_suffix}"
                 cached_answer = self._cache_get(self._answer_cache, cache_key)
                 if isinstance(cached_answer, str) and cached_answer:
                     await self._append_command_llm_context(event, question, cached_answer)
@@ -58,21 +260,25 @@ class JudgeLlmMixin:
                     )
                     return
 
-            response = await self._provider_text_chat(
+            cache_provider_id, cache_model_name = provider_id, model_name
+            response, provider_id, model_name = await self._hedged_text_chat(
+                pool,
                 provider,
+                provider_id,
+                model_name,
                 prompt=question,
-                context_messages=context_messages,
                 system_prompt=system_prompt,
-                model_name=model_name,
+                context_messages=context_messages,
             )
 
             answer = response.completion_text
-            if (
-                self.config.get("enable_answer_cache", False)
-                and not self.config.get("enable_command_context", False)
-                and normalized_q
-            ):
-                cache_key = f"answer:{provider_id}:{model_name}:{self._normalize_text(system_prompt)}:{normalized_q}"
+            try:
+                self._usage_record(event, pool, provider_id, model_name, response)
+                await self._usage_maybe_persist()
+            except Exception:
+                logger.exception("[JudgePlugin] 用量统计失败")
+            if use_answer_cache:
+                cache_key = f"answer:{cache_provider_id}:{cache_model_name}:{answer_key_suffix}"
                 self._cache_set(
                     self._answer_cache,
                     cache_key,
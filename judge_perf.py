@@ -0,0 +1,273 @@
+import os
+import sys
+import time
+import asyncio
+import datetime
+import threading
+from astrbot.api import logger
+from astrbot.api.event import AstrMessageEvent
+
+
+_PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+_THIS_FILE = os.path.abspath(__file__)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _PerfSpan:
+    """同步代码段计时：进入时登记为当前活跃段（供看门狗归因），退出时累计耗时。"""
+
+    __slots__ = ("owner", "name", "t0", "prev")
+
+    def __init__(self, owner, name: str):
+        self.owner = owner
+        self.name = name
+
+    def __enter__(self):
+        self.prev = self.owner._perf_active
+        self.t0 = time.perf_counter()
+        self.owner._perf_active = self.name
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_ms = (time.perf_counter() - self.t0) * 1000
+        self.owner._perf_active = self.prev
+        self.owner._perf_note_span(self.name, elapsed_ms)
+        return False
+
+
+def _frame_site(frame) -> tuple:
+    """从事件循环线程的当前栈中找出最内层的插件函数与最内层调用。返回 (site, detail)。"""
+    innermost = ""
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.abspath(code.co_filename)
+        if not innermost:
+            innermost = f"{os.path.basename(filename)}:{code.co_name}:{frame.f_lineno}"
+        if filename.startswith(_PLUGIN_DIR) and filename != _THIS_FILE:
+            module = os.path.splitext(os.path.basename(filename))[0]
+            return (f"{module}.{code.co_name}", f"{module}.py:{frame.f_lineno} ← {innermost}")
+        frame = frame.f_back
+    return ("外部代码", innermost)
+
+
+class JudgePerfMixin:
+    def _perf_settings(self) -> tuple:
+        """返回 (探测间隔秒, 阻塞阈值毫秒)。"""
+        try:
+            interval_ms = int(self.config.get("perf_probe_interval_ms", 200))
+        except Exception:
+            interval_ms = 200
+        try:
+            threshold_ms = int(self.config.get("perf_block_threshold_ms", 100))
+        except Exception:
+            threshold_ms = 100
+        return (max(interval_ms, 10) / 1000, max(threshold_ms, 5))
+
+    def _perf_span(self, name: str):
+        if not self._perf_enabled:
+            return _NULL_SPAN
+        return _PerfSpan(self, name)
+
+    def _perf_note_span(self, name: str, elapsed_ms: float):
+        spans = self._perf["spans"]
+        stat = spans.get(name)
+        if stat is None:
+            stat = {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0}
+            spans[name] = stat
+        stat["calls"] += 1
+        stat["total_ms"] += elapsed_ms
+        if elapsed_ms > stat["max_ms"]:
+            stat["max_ms"] = elapsed_ms
+        if elapsed_ms >= self._perf["threshold_ms"]:
+            stat["slow"] += 1
+
+    def _perf_start(self):
+        if not self.config.get("enable_perf_monitor", False) or self._perf.get("task") is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        interval, threshold_ms = self._perf_settings()
+        self._perf.update(
+            {
+                "interval": interval,
+                "threshold_ms": threshold_ms,
+                "heartbeat": time.monotonic(),
+                "loop_thread": threading.get_ident(),
+                "stop": threading.Event(),
+                "pending": None,
+            }
+        )
+        self._perf_enabled = True
+        self._perf["task"] = loop.create_task(self._perf_probe_loop())
+        watchdog = threading.Thread(target=self._perf_watchdog, name="judge-perf-watchdog", daemon=True)
+        self._perf["watchdog"] = watchdog
+        watchdog.start()
+        logger.info(f"[JudgePlugin] 事件循环监控已启动 (探测间隔 {int(interval * 1000)}ms, 阻塞阈值 {threshold_ms}ms)")
+
+    async def _perf_stop(self):
+        self._perf_enabled = False
+        stop = self._perf.get("stop")
+        if stop is not None:
+            stop.set()
+        task = self._perf.get("task")
+        self._perf["task"] = None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        watchdog = self._perf.get("watchdog")
+        self._perf["watchdog"] = None
+        if watchdog is not None:
+            watchdog.join(timeout=1)
+
+    async def _perf_probe_loop(self):
+        interval = self._perf["interval"]
+        while True:
+            t0 = time.perf_counter()
+            heartbeat = time.monotonic()
+            self._perf["heartbeat"] = heartbeat
+            await asyncio.sleep(interval)
+            lag_ms = max((time.perf_counter() - t0 - interval) * 1000, 0.0)
+            self._perf["lag"].append(lag_ms)
+            if lag_ms >= self._perf["threshold_ms"]:
+                self._perf_record_block(lag_ms, heartbeat)
+
+    def _perf_watchdog(self):
+        """独立线程：事件循环心跳停滞超过阈值时，抓取循环线程的栈并记下阻塞位置。"""
+        stop = self._perf["stop"]
+        interval = self._perf["interval"]
+        threshold = self._perf["threshold_ms"] / 1000
+        check_every = max(min(threshold / 2, 0.05), 0.002)
+        reported = None
+        while not stop.wait(check_every):
+            heartbeat = self._perf["heartbeat"]
+            if heartbeat == reported or time.monotonic() - heartbeat - interval < threshold:
+                continue
+            reported = heartbeat
+            frame = sys._current_frames().get(self._perf["loop_thread"])
+            site, detail = _frame_site(frame)
+            active = self._perf_active
+            if active:
+                site = f"{active} @ {site}"
+            self._perf["pending"] = {"heartbeat": heartbeat, "site": site, "detail": detail}
+
+    def _perf_record_block(self, lag_ms: float, heartbeat: float):
+        pending = self._perf.get("pending")
+        self._perf["pending"] = None
+        if pending is not None and pending["heartbeat"] == heartbeat:
+            site, detail = pending["site"], pending["detail"]
+        else:
+            # 阻塞时间短于看门狗采样粒度时无法定位
+            site, detail = ("未定位", "")
+        self._perf["blocks"].append({"ts": time.time(), "lag_ms": lag_ms, "site": site, "detail": detail})
+        stat = self._perf["sites"].get(site)
+        if stat is None:
+            stat = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "detail": detail}
+            self._perf["sites"][site] = stat
+        stat["count"] += 1
+        stat["total_ms"] += lag_ms
+        if lag_ms >= stat["max_ms"]:
+            stat["max_ms"] = lag_ms
+            stat["detail"] = detail
+        self._stats_inc("perf_loop_blocked")
+
+    def _perf_reset(self):
+        self._executor["tasks"].clear()
+        self._executor["max_pending"] = self._executor["pending"]
+        self._executor["saturated"] = 0
+        self._perf["lag"].clear()
+        self._perf["blocks"].clear()
+        self._perf["sites"].clear()
+        self._perf["spans"].clear()
+
+    def _perf_lag_summary(self) -> dict:
+        lag = sorted(self._perf["lag"])
+        if not lag:
+            return {}
+        pick = lambda p: lag[min(len(lag) - 1, int(len(lag) * p / 100))]  # noqa: E731
+        return {"n": len(lag), "p50": pick(50), "p99": pick(99), "max": lag[-1]}
+
+    async def judge_perf(self, event: AstrMessageEvent):
+        if not self._is_command_allowed(event, "judge_perf"):
+            yield event.plain_result("❌ 当前会话无权限使用该指令")
+            return
+
+        arg = self._extract_command_args(event.message_str, ["judge_perf", "性能", "perf"]).strip().lower()
+        if arg in ("reset", "重置"):
+            self._perf_reset()
+            yield event.plain_result("✅ 性能监控数据已清空")
+            return
+
+        executor_lines = self._executor_summary_lines()
+        if not self._perf_enabled:
+            lines = ["⏱️ 事件循环监控未开启，请在配置中启用 `enable_perf_monitor`"]
+            if executor_lines:
+                lines.append("")
+                lines.extend(executor_lines)
+            yield event.plain_result("\n".join(lines))
+            return
+
+        interval, threshold_ms = self._perf["interval"], self._perf["threshold_ms"]
+        lines = [
+            "⏱️ **事件循环监控**",
+            "━━━━━━━━━━━━━━━━━━━━━━━━",
+            f"探测间隔 {int(interval * 1000)}ms | 阻塞阈值 {threshold_ms}ms",
+        ]
+        summary = self._perf_lag_summary()
+        if summary:
+            lines.append(
+                f"📈 **循环延迟**: p50 {summary['p50']:.1f}ms | p99 {summary['p99']:.1f}ms | 最大 {summary['max']:.1f}ms"
+                f" (最近 {summary['n']} 次)"
+            )
+        lines.append(f"🚧 **阻塞次数**: {len(self._perf['blocks'])} (≥{threshold_ms}ms)")
+
+        sites = sorted(self._perf["sites"].items(), key=lambda kv: kv[1]["total_ms"], reverse=True)
+        if sites:
+            lines.append("")
+            lines.append("🔥 **阻塞来源** (按总耗时):")
+            for site, stat in sites[:8]:
+                lines.append(
+                    f"• {site}: {stat['count']} 次 | 共 {stat['total_ms']:.0f}ms | 最长 {stat['max_ms']:.0f}ms"
+                )
+                if stat["detail"]:
+                    lines.append(f"   └─ {stat['detail']}")
+
+        spans = sorted(self._perf["spans"].items(), key=lambda kv: kv[1]["total_ms"], reverse=True)
+        if spans:
+            lines.append("")
+            lines.append("📍 **同步计时点**:")
+            for name, stat in spans:
+                avg = stat["total_ms"] / stat["calls"] if stat["calls"] else 0.0
+                lines.append(
+                    f"• {name}: {stat['calls']} 次 | 平均 {avg:.2f}ms | 最长 {stat['max_ms']:.1f}ms | 超阈值 {stat['slow']}"
+                )
+
+        recent = list(self._perf["blocks"])[-5:]
+        if recent:
+            lines.append("")
+            lines.append("🕒 **最近阻塞**:")
+            for item in reversed(recent):
+                ts = datetime.datetime.fromtimestamp(item["ts"]).strftime("%H:%M:%S")
+                lines.append(f"• {ts} {item['lag_ms']:.0f}ms {item['site']}")
+
+        if executor_lines:
+            lines.append("")
+            lines.extend(executor_lines)
+
+        yield event.plain_result("\n".join(lines))
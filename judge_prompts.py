@@ -0,0 +1,88 @@
+from string import Template
+
+
+# 各档提示词中 $message 之前的部分对所有请求保持不变，便于上游做前缀缓存
+FULL_JUDGE_PROMPT = """你是一个“消息复杂度/成本-收益”分流器。目标是在满足用户需求的前提下尽量节省成本与时延：除非确实需要更强推理/更长上下文/更高准确性，否则优先选择 FAST。
+
+你只做二选一分类：HIGH 或 FAST。不要输出解释、标点、空格或换行。
+
+## 判定目标
+- HIGH：任务对推理深度、正确性、稳定性、长上下文、复杂结构化输出有明显要求，FAST 高概率给出错误/不完整/不可靠结果。
+- FAST：可以用简短直接回答解决；或即使略有不精确也不影响体验；或可用简单规则/常识完成。
+
+## 关键判断维度（满足任意一条通常选 HIGH）
+1) 多步推理：需要严谨推导、证明、复杂逻辑链、反例讨论、细致方案权衡。
+2) 数学/算法/代码：编程实现、调试、复杂算法、SQL/正则、性能分析、边界条件多。
+3) 长文本/多要点：需要总结/对比/归纳长内容，或输出结构化清单且要覆盖全面。
+4) 专业/高风险：医疗/法律/金融/安全等对准确性要求高，或需要谨慎措辞与推断。
+5) 明确要求“详细/深入/步骤/举例/证明/推导/完整代码/测试用例/鲁棒性”等。
+
+## 典型 FAST 场景（满足任意一条通常选 FAST）
+- 问候/闲聊/情绪安抚/短句翻译/简短定义解释。
+- 单一事实或简单是非判断（不要求严谨推导）。
+- 简单改写、润色、生成短回复、轻量总结（文本不长）。
+- 用户问题很短且没有“深入/详细/步骤/代码/推导”等要求。
+
+## 边界处理
+- 不确定时默认 FAST，除非用户明确要求高质量/详细推理/代码/数学等。
+
+用户消息如下：
+$message
+
+最终输出（仅一个词）：HIGH 或 FAST"""
+
+COMPACT_JUDGE_PROMPT = """判断用户消息该交给强模型(HIGH)还是快模型(FAST)，只输出 HIGH 或 FAST。
+HIGH：多步推理/证明、写代码或调试、算法/SQL/正则、长文本总结对比、医疗法律金融等高风险、明确要求详细/深入/步骤/完整代码。
+FAST：问候闲聊、短翻译、简单定义或事实、简单改写润色、短问题且无上述要求。
+不确定时选 FAST。
+
+用户消息：
+$message"""
+
+MINIMAL_JUDGE_PROMPT = """需要深度推理/代码/数学/长文/高风险专业知识输出 HIGH，否则输出 FAST。只输出一个词。
+消息：$message"""
+
+JUDGE_PROMPT_PROFILES = ("full", "compact", "minimal")
+
+_SPLICE_SENTINEL = "\x00__judge_message__\x00"
+
+
+def compile_prompt(template_text: str) -> tuple:
+    """把含 $message 的模板预编译为静态片段元组，按 Template 语义处理 $$ 转义与其他占位符。"""
+    rendered = Template(template_text).safe_substitute(message=_SPLICE_SENTINEL)
+    return tuple(rendered.split(_SPLICE_SENTINEL))
+
+
+def assemble_prompt(parts: tuple, message: str) -> str:
+    if len(parts) == 2:
+        return parts[0] + message + parts[1]
+    return message.join(parts)
+
+
+class JudgePromptsMixin:
+    def _get_judge_prompt_profile(self) -> str:
+        profile = str(self.config.get("judge_prompt_profile", "full") or "full").strip().lower()
+        return profile if profile in JUDGE_PROMPT_PROFILES else "full"
+
+    def _get_judge_prompt_parts(self) -> tuple:
+        """按配置版本缓存编译后的 judge 提示词片段；custom_judge_prompt 含 $message 时优先使用。"""
+        custom_prompt = self.config.get("custom_judge_prompt", "") or ""
+        profile = self._get_judge_prompt_profile()
+        key = (getattr(self, "_config_version", 0), profile, custom_prompt, id(self.judge_prompt_template))
+        compiled = self._judge_prompt_compiled
+        if compiled is not None and compiled[0] == key:
+            return compiled[1]
+
+        if isinstance(custom_prompt, str) and "$message" in custom_prompt:
+            parts = compile_prompt(custom_prompt)
+        elif profile == "compact":
+            parts = compile_prompt(COMPACT_JUDGE_PROMPT)
+        elif profile == "minimal":
+            parts = compile_prompt(MINIMAL_JUDGE_PROMPT)
+        else:
+            parts = compile_prompt(self.judge_prompt_template.template)
+        self._judge_prompt_compiled = (key, parts)
+        return parts
+
+    def _build_judge_prompt(self, message: str) -> str:
+        return assemble_prompt(self._get_judge_prompt_parts(), message)
@@ -1,24 +1,68 @@
+import re
 import random
+import hashlib
+import asyncio
 from astrbot.api import logger
 from astrbot.api.event import AstrMessageEvent
 
 
+_RETRY_HINT_REGEXES = (
+    re.compile(r"retry[-_ ]?after[\"'\s:=]*([0-9]+(?:\.[0-9]+)?)\s*(ms|s|sec|secs|seconds|m|min|minutes)?\b", re.IGNORECASE),
+    re.compile(r"(?:try again|retry) (?:in|after)\s*([0-9]+(?:\.[0-9]+)?)\s*(ms|s|sec|secs|seconds|m|min|minutes)?\b", re.IGNORECASE),
+    re.compile(r"([0-9]+(?:\.[0-9]+)?)\s*(秒|分钟)后重试"),
+)
+_BILLING_ERROR_RE = re.compile(r"insufficient[_ ]quota|billing|余额不足|欠费", re.IGNORECASE)
+_FATAL_ERROR_RE = re.compile(
+    r"invalid[_ ]api[_ ]key|unauthori[sz]ed|permission[_ ]denied|forbidden|\b40[13]\b|鉴权",
+    re.IGNORECASE,
+)
+# 请求本身的问题（超长/被过滤/参数错误）：换个请求即可成功，不应让该 provider:model 退出轮换
+_REQUEST_ERROR_RE = re.compile(r"invalid[_ ]request|bad request|\b400\b", re.IGNORECASE)
+_RATE_LIMIT_RE = re.compile(
+    r"\b429\b|rate[ _-]?limit|too many requests|resource[_ ]exhausted|quota|请求过于频繁|频率|限流",
+    re.IGNORECASE,
+)
+_RETRY_UNIT_SECONDS = {"ms": 0.001, "m": 60, "min": 60, "minutes": 60, "分钟": 60}
+
+
+def _rendezvous_score(key: str, provider_id: str, model_name: str) -> int:
+    raw = f"{key}\x00{provider_id}:{model_name}".encode("utf-8", "ignore")
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big")
+
+
 class JudgeRouterMixin:
-    def _choose_pair(self, pairs: list, enable_polling: bool = True) -> tuple:
+    def _is_sticky_pool(self, pool: str) -> bool:
+        pool = (pool or "").upper()
+        if pool == "HIGH":
+            return bool(self.config.get("enable_high_iq_sticky_routing", False))
+        return bool(self.config.get("enable_fast_sticky_routing", False))
+
+    def _rank_pairs_sticky(self, pairs: list, sticky_key: str) -> list:
+        # rendezvous hash: 每个会话对 provider:model 有稳定排序，移除/熔断某项只影响原本落在该项上的会话
+        return sorted(pairs, key=lambda p: _rendezvous_score(sticky_key, p[0], p[1]), reverse=True)
+
+    def _choose_pair(self, pairs: list, enable_polling: bool = True, sticky_key: str = "") -> tuple:
         if not pairs:
             return ("", "")
         if not enable_polling:
             return pairs[0]
+        if sticky_key:
+            ranked = self._rank_pairs_sticky(pairs, sticky_key)
+            if self.config.get("enable_circuit_breaker", True):
+                for pid, model in ranked:
+                    if not self._is_provider_temporarily_disabled(pid, model):
+                        return (pid, model)
+            return ranked[0]
         return random.choice(pairs)
 
-    def _get_high_iq_provider_model(self) -> tuple:
+    def _get_high_iq_provider_model(self, sticky_key: str = "") -> tuple:
         enable_polling = self.config.get("enable_high_iq_polling", True)
         pairs = self._get_pool_pairs("HIGH")
-        return self._choose_pair(pairs, enable_polling=bool(enable_polling))
+        return self._choose_pair(pairs, enable_polling=bool(enable_polling), sticky_key=sticky_key)
 
-    def _get_fast_provider_model(self) -> tuple:
+    def _get_fast_provider_model(self, sticky_key: str = "") -> tuple:
         pairs = self._get_pool_pairs("FAST")
-        return self._choose_pair(pairs, enable_polling=True)
+        return self._choose_pair(pairs, enable_polling=True, sticky_key=sticky_key)
 
     def _apply_pool_policy(self, event: AstrMessageEvent, desired_pool: str) -> tuple:
         policy = self._get_pool_policy(event)
@@ -46,9 +90,10 @@ class JudgeRouterMixin:
             return (provider_id, model_name)
         return ("", "")
 
-    def _select_pool_and_provider(self, event: AstrMessageEvent, scope: str, desired_pool: str) -> tuple:
+    def _select_pool_and_provider(self, event: AstrMessageEvent, scope: str, desired_pool: str, dry_run: bool = False) -> tuple:
+        """dry_run=True 时只查看锁定而不消耗轮数，也不计统计。"""
         pool, policy = self._apply_pool_policy(event, desired_pool)
-        lock = self._consume_lock(event, scope)
+        lock = self._get_lock(event, scope) if dry_run else self._consume_lock(event, scope)
         if lock and lock.get("pool"):
             lock_pool = str(lock.get("pool") or "").upper()
             if lock_pool in ("HIGH", "FAST"):
@@ -58,6 +103,9 @@ class JudgeRouterMixin:
 
         provider_id = ""
         model_name = ""
+        sticky_key = self._session_key(event) if self._is_sticky_pool(pool) else ""
+        # 只有实际按会话哈希选出的供应商才算粘性：锁定、强制供应商、关闭轮询的 HIGH 池都不算
+        sticky = False
         if lock and lock.get("provider_id"):
             provider_id = str(lock.get("provider_id") or "")
             model_name = str(lock.get("model") or "")
@@ -67,11 +115,14 @@ class JudgeRouterMixin:
                 provider_id = forced_provider_id
                 model_name = forced_model
             elif pool == "HIGH":
-                provider_id, model_name = self._get_high_iq_provider_model()
+                provider_id, model_name = self._get_high_iq_provider_model(sticky_key=sticky_key)
+                sticky = bool(sticky_key) and bool(self.config.get("enable_high_iq_polling", True))
             else:
-                provider_id, model_name = self._get_fast_provider_model()
+                provider_id, model_name = self._get_fast_provider_model(sticky_key=sticky_key)
+                sticky = bool(sticky_key)
 
         meta = {
+            "sticky": sticky,
             "cb_skipped": False,
             "cb_pool_fallback": False,
             "original_provider_id": provider_id,
@@ -81,9 +132,12 @@ class JudgeRouterMixin:
         circuit_breaker_enabled = bool(self.config.get("enable_circuit_breaker", True))
         if circuit_breaker_enabled and provider_id and not (lock and lock.get("provider_id")):
             if self._is_provider_temporarily_disabled(provider_id, model_name):
-                self._stats_inc("router_cb_skip")
+                if not dry_run:
+                    self._stats_inc("router_cb_skip")
                 meta["cb_skipped"] = True
-                fallback_provider_id, fallback_model = self._get_available_provider_model(pool, exclude_provider_id=provider_id)
+                fallback_provider_id, fallback_model = self._get_available_provider_model(
+                    pool, exclude_provider_id=provider_id, sticky_key=sticky_key
+                )
                 if fallback_provider_id:
                     provider_id = fallback_provider_id
                     model_name = fallback_model
@@ -91,7 +145,10 @@ class JudgeRouterMixin:
                     allow_pool_fallback = bool(self.config.get("enable_auto_fallback", True))
                     if allow_pool_fallback and not policy:
                         other_pool = "FAST" if pool == "HIGH" else "HIGH"
-                        other_provider_id, other_model = self._get_available_provider_model(other_pool, exclude_provider_id="")
+                        other_sticky_key = self._session_key(event) if self._is_sticky_pool(other_pool) else ""
+                        other_provider_id, other_model = self._get_available_provider_model(
+                            other_pool, exclude_provider_id="", sticky_key=other_sticky_key
+                        )
                         if other_provider_id:
                             pool = other_pool
                             provider_id = other_provider_id
@@ -125,10 +182,104 @@ class JudgeRouterMixin:
             pairs.append((str(provider_id), str(model_name)))
         return pairs
 
-    def _is_provider_temporarily_disabled(self, provider_id: str, model_name: str = "") -> bool:
+    def _parse_retry_hint_seconds(self, text: str):
+        if not text:
+            return None
+        for regex in _RETRY_HINT_REGEXES:
+            match = regex.search(text)
+            if not match:
+                continue
+            try:
+                value = float(match.group(1))
+            except Exception:
+                continue
+            unit = (match.group(2) or "").lower()
+            return value * _RETRY_UNIT_SECONDS.get(unit, 1)
+        return None
+
+    def _classify_llm_error(self, error) -> tuple:
+        """把错误响应/异常归类为 rate_limited / transient / fatal / request，并尽量解析重试提示（秒）。"""
+        if isinstance(error, asyncio.TimeoutError):
+            return ("transient", None)
+        status = getattr(error, "status_code", None) or getattr(error, "status", None)
+        retry_after = None
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        if headers is not None:
+            try:
+                raw = headers.get("retry-after") or headers.get("Retry-After")
+                retry_after = float(raw) if raw is not None else None
+            except Exception:
+                retry_after = None
+        text = str(error or "")
+        if retry_after is None:
+            retry_after = self._parse_retry_hint_seconds(text)
+        if status is not None:
+            text = f"{status} {text}"
+
+        if _BILLING_ERROR_RE.search(text):
+            return ("fatal", None)
+        if _RATE_LIMIT_RE.search(text):
+            return ("rate_limited", retry_after)
+        if _FATAL_ERROR_RE.search(text):
+            return ("fatal", None)
+        if _REQUEST_ERROR_RE.search(text):
+            return ("request", None)
+        # 无法识别的错误按瞬时错误处理：由断路器按失败次数决定是否回避
+        return ("transient", retry_after)
+
+    def _provider_breaker_key(self, provider_id: str, model_name: str, scope: str = "") -> str:
+        # judge 调用使用独立的命名空间：与路由池共用 provider:model 时互不影响冷却与熔断
+        return f"{scope}:{provider_id}:{model_name}" if scope else f"{provider_id}:{model_name}"
+
+    def _note_provider_failure(self, provider_id: str, model_name: str, error, scope: str = "") -> str:
+        if not provider_id:
+            return ""
+        kind, retry_after = self._classify_llm_error(error)
+        self._stats_inc(f"{scope or 'llm'}_err_{kind}")
+        if kind == "request":
+            # 只影响这一次请求：不冷却，也不计入断路器
+            return kind
+        default_key = {
+            "rate_limited": ("rate_limit_cooldown_seconds", 30),
+            "transient": ("transient_error_cooldown_seconds", 0),
+            "fatal": ("fatal_error_cooldown_seconds", 120),
+        }[kind]
+        try:
+            cooldown = float(self.config.get(default_key[0], default_key[1]))
+        except Exception:
+            cooldown = float(default_key[1])
+        if retry_after is not None and retry_after > 0:
+            cooldown = min(float(retry_after), 3600.0)
+        key = self._provider_breaker_key(provider_id, model_name, scope)
+        if cooldown > 0:
+            self._provider_cooldowns[key] = {"kind": kind, "until": self._now_ts() + cooldown}
+        # 限流只按提示窗口回避，不计入断路器；其余错误照常累计
+        if kind != "rate_limited":
+            self._update_circuit_breaker(provider_id, model_name, False, scope=scope)
+        return kind
+
+    def _note_provider_success(self, provider_id: str, model_name: str, scope: str = ""):
+        if not provider_id:
+            return
+        self._provider_cooldowns.pop(self._provider_breaker_key(provider_id, model_name, scope), None)
+        self._update_circuit_breaker(provider_id, model_name, True, scope=scope)
+
+    def _get_provider_cooldown(self, provider_id: str, model_name: str = "", scope: str = ""):
+        key = self._provider_breaker_key(provider_id, model_name, scope)
+        cooldown = self._provider_cooldowns.get(key)
+        if not cooldown:
+            return None
+        if cooldown.get("until", 0) <= self._now_ts():
+            self._provider_cooldowns.pop(key, None)
+            return None
+        return cooldown
+
+    def _is_provider_temporarily_disabled(self, provider_id: str, model_name: str = "", scope: str = "") -> bool:
         if not provider_id:
             return False
-        key = f"{provider_id}:{model_name}"
+        if self._get_provider_cooldown(provider_id, model_name, scope):
+            return True
+        key = self._provider_breaker_key(provider_id, model_name, scope)
         cb = self._circuit_breakers.get(key)
         if not cb:
             return False
@@ -139,12 +290,15 @@ class JudgeRouterMixin:
             return False
         return True
 
-    def _get_available_provider_model(self, pool: str, exclude_provider_id: str = "") -> tuple:
+    def _get_available_provider_model(self, pool: str, exclude_provider_id: str = "", sticky_key: str = "") -> tuple:
         pairs = self._get_pool_pairs(pool)
         if not pairs:
             return ("", "")
         exclude_provider_id = str(exclude_provider_id or "")
-        random.shuffle(pairs)
+        if sticky_key:
+            pairs = self._rank_pairs_sticky(pairs, sticky_key)
+        else:
+            random.shuffle(pairs)
         for pid, model in pairs:
             if exclude_provider_id and pid == exclude_provider_id:
                 continue
@@ -152,10 +306,10 @@ class JudgeRouterMixin:
                 return (pid, model)
         return ("", "")
 
-    def _update_circuit_breaker(self, provider_id: str, model: str, ok: bool):
+    def _update_circuit_breaker(self, provider_id: str, model: str, ok: bool, scope: str = ""):
         if not provider_id:
             return
-        key = f"{provider_id}:{model}"
+        key = self._provider_breaker_key(provider_id, model, scope)
         if ok:
             if key in self._circuit_breakers:
                 self._circuit_breakers.pop(key, None)
@@ -181,9 +181,12 @@ class JudgeRulesMixin:
         decision, _ = self._rule_prejudge_detail(message)
         return decision
 
-    def _rule_prejudge_detail(self, message: str) -> tuple:
+    def _rule_prejudge_detail(self, message: str, desc: dict = None) -> tuple:
         message_str = message or ""
-        message_lower = message_str.lower()
+        message_lower = desc["lower"] if desc else message_str.lower()
+        has_code = desc["has_code"] if desc else (
+            "```" in message_str or "def " in message_lower or "function " in message_lower
+        )
 
         custom_high = self.config.get("custom_high_keywords", [])
         custom_fast = self.config.get("custom_fast_keywords", [])
@@ -200,7 +203,7 @@ class JudgeRulesMixin:
 
         if len(message_str) > 200:
             return ("HIGH", "len>200")
-        if "```" in message_str or "def " in message_lower or "function " in message_lower:
+        if has_code:
             return ("HIGH", "codeblock")
 
         for regex in META_FAST_REGEXES:
@@ -240,7 +243,7 @@ class JudgeRulesMixin:
 
         return ("UNKNOWN", "")
 
-    def _simple_rule_judge(self, message: str) -> str:
+    def _simple_rule_judge(self, message: str, desc: dict = None) -> str:
         simple_keywords = self._merge_keywords(SIMPLE_KEYWORDS, "simple_keywords_add", "simple_keywords_remove")
         strong_complex_keywords = self._merge_keywords(
             STRONG_COMPLEX_KEYWORDS, "strong_complex_keywords_add", "strong_complex_keywords_remove"
@@ -252,10 +255,10 @@ class JudgeRulesMixin:
             WEAK_NEED_STRONG_TRIGGERS, "weak_need_strong_triggers_add", "weak_need_strong_triggers_remove"
         )
 
-        message_lower = message.lower()
+        message_lower = desc["lower"] if desc else message.lower()
         if len(message) > 200:
             return "HIGH"
-        if "```" in message or "def " in message_lower or "function " in message_lower:
+        if desc["has_code"] if desc else ("```" in message or "def " in message_lower or "function " in message_lower):
             return "HIGH"
 
         for keyword in simple_keywords:
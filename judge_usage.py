@@ -0,0 +1,216 @@
+import os
+import json
+import time
+from astrbot.api import logger
+from astrbot.api.event import AstrMessageEvent
+
+
+PLUGIN_NAME = "astrbot_plugin_judge"
+USAGE_STORE_FILE = "judge_usage.json"
+_USAGE_WINDOWS = ("minute", "day", "month")
+
+
+def _pick_number(obj, names: tuple) -> int:
+    for name in names:
+        value = obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+        if value is None:
+            continue
+        try:
+            return int(value)
+        except Exception:
+            continue
+    return 0
+
+
+class JudgeUsageMixin:
+    def _extract_token_usage(self, resp) -> tuple:
+        raw = getattr(resp, "raw_completion", None)
+        candidates = [getattr(resp, "usage", None)]
+        if raw is not None:
+            if isinstance(raw, dict):
+                candidates.append(raw.get("usage"))
+            else:
+                candidates.append(getattr(raw, "usage", None))
+                candidates.append(getattr(raw, "usage_metadata", None))
+        for usage in candidates:
+            if usage is None:
+                continue
+            prompt = _pick_number(usage, ("prompt_tokens", "input_tokens", "input", "prompt_token_count"))
+            completion = _pick_number(usage, ("completion_tokens", "output_tokens", "output", "candidates_token_count"))
+            if prompt or completion:
+                return (prompt, completion)
+        return (0, 0)
+
+    def _usage_window_ids(self, now: float = None) -> dict:
+        t = time.localtime(now if now is not None else time.time())
+        return {
+            "minute": time.strftime("%Y%m%d%H%M", t),
+            "day": time.strftime("%Y%m%d", t),
+            "month": time.strftime("%Y%m", t),
+        }
+
+    def _usage_scope_keys(self, event: AstrMessageEvent) -> list:
+        keys = ["scope:global"]
+        group_id = event.get_group_id() if hasattr(event, "get_group_id") else ""
+        if group_id:
+            keys.append(f"scope:group:{group_id}")
+        session_id = getattr(event, "unified_msg_origin", "") or ""
+        if session_id:
+            keys.append(f"scope:session:{session_id}")
+        return keys
+
+    def _usage_price_per_1k(self, pool: str) -> float:
+        key = "high_cost_per_1k_tokens" if (pool or "").upper() == "HIGH" else "fast_cost_per_1k_tokens"
+        try:
+            return max(float(self.config.get(key, 0) or 0), 0.0)
+        except Exception:
+            return 0.0
+
+    def _usage_add(self, key: str, prompt: int, completion: int, cost: float, window_ids: dict):
+        counter = self._usage_counters.get(key)
+        if counter is None:
+            counter = {}
+            self._usage_counters[key] = counter
+            # 按会话/群的计数器按 LRU 淘汰；池/提供商/全局计数器数量有限，始终保留
+            while len(self._usage_counters) > 3000:
+                oldest = next(iter(self._usage_counters))
+                if oldest == key:
+                    break
+                if oldest == "scope:global" or not oldest.startswith(("scope:", "high:")):
+                    self._usage_counters.move_to_end(oldest)
+                    continue
+                self._usage_counters.pop(oldest, None)
+        else:
+            self._usage_counters.move_to_end(key)
+        # 每个窗口只保留当前桶：窗口 id 变化时直接换新桶，更新与查询都是 O(1)
+        for window in _USAGE_WINDOWS:
+            bucket = counter.get(window)
+            if not bucket or bucket.get("id") != window_ids[window]:
+                bucket = {"id": window_ids[window], "prompt": 0, "completion": 0, "cost": 0.0}
+                counter[window] = bucket
+            bucket["prompt"] += prompt
+            bucket["completion"] += completion
+            bucket["cost"] += cost
+
+    def _usage_get(self, key: str, window: str, window_ids: dict = None) -> dict:
+        window_ids = window_ids or self._usage_window_ids()
+        bucket = (self._usage_counters.get(key) or {}).get(window)
+        if not bucket or bucket.get("id") != window_ids[window]:
+            return {"tokens": 0, "cost": 0.0}
+        return {"tokens": int(bucket.get("prompt", 0)) + int(bucket.get("completion", 0)), "cost": float(bucket.get("cost", 0.0))}
+
+    def _usage_record(self, event: AstrMessageEvent, pool: str, provider_id: str, model_name: str, resp):
+        prompt, completion = self._extract_token_usage(resp)
+        if not prompt and not completion:
+            return
+        cost = (prompt + completion) / 1000 * self._usage_price_per_1k(pool)
+        window_ids = self._usage_window_ids()
+        keys = [f"pool:{(pool or 'FAST').upper()}"]
+        if provider_id:
+            keys.append(f"provider:{provider_id}:{model_name}")
+        keys.extend(self._usage_scope_keys(event))
+        for key in keys:
+            self._usage_add(key, prompt, completion, cost, window_ids)
+        if (pool or "").upper() == "HIGH":
+            for key in self._usage_scope_keys(event)[1:]:
+                self._usage_add(f"high:{key}", prompt, completion, cost, window_ids)
+        self._usage_dirty = True
+        self._stats_inc("usage_prompt_tokens", prompt)
+        self._stats_inc("usage_completion_tokens", completion)
+
+    def _usage_limit(self, key: str, cast=int):
+        try:
+            value = cast(self.config.get(key, 0) or 0)
+        except Exception:
+            return 0
+        return value if value > 0 else 0
+
+    def _usage_blocks_high(self, event: AstrMessageEvent) -> str:
+        """接近配置的 token/费用上限时返回拦截原因（空字符串表示放行）。"""
+        try:
+            soft_percent = float(self.config.get("budget_soft_limit_percent", 90))
+        except Exception:
+            soft_percent = 90.0
+        soft = min(max(soft_percent, 1.0), 100.0) / 100
+        window_ids = self._usage_window_ids()
+
+        checks = [
+            ("pool:HIGH", "day", "tokens", self._usage_limit("high_daily_token_limit")),
+            ("pool:HIGH", "month", "tokens", self._usage_limit("high_monthly_token_limit")),
+            ("scope:global", "day", "cost", self._usage_limit("daily_cost_limit", float)),
+            ("scope:global", "month", "cost", self._usage_limit("monthly_cost_limit", float)),
+        ]
+        scope_limit = self._usage_limit("scope_daily_token_limit")
+        if scope_limit:
+            for key in self._usage_scope_keys(event)[1:]:
+                checks.append((f"high:{key}", "day", "tokens", scope_limit))
+
+        for key, window, field, limit in checks:
+            if not limit:
+                continue
+            used = self._usage_get(key, window, window_ids)[field]
+            if used >= limit * soft:
+                return f"{key}:{window}:{field}"
+        return ""
+
+    def _usage_store_path(self) -> str:
+        base = ""
+        try:
+            from astrbot.api.star import StarTools
+
+            base = str(StarTools.get_data_dir(PLUGIN_NAME))
+        except Exception:
+            base = os.path.join("data", "plugin_data", PLUGIN_NAME)
+        return os.path.join(base, USAGE_STORE_FILE)
+
+    def _usage_snapshot(self) -> dict:
+        # 分钟桶只用于实时视图，重启后无意义，不落盘
+        return {
+            key: {w: dict(counter[w]) for w in ("day", "month") if w in counter}
+            for key, counter in self._usage_counters.items()
+        }
+
+    def _usage_write_file(self, path: str, payload: dict):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _usage_load(self):
+        path = self._usage_store_path()
+        if not os.path.isfile(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            logger.warning("[JudgePlugin] 用量记录读取失败，将从零开始统计")
+            return
+        if not isinstance(data, dict):
+            return
+        window_ids = self._usage_window_ids()
+        for key, counter in data.items():
+            if not isinstance(counter, dict):
+                continue
+            kept = {w: b for w, b in counter.items() if isinstance(b, dict) and b.get("id") == window_ids.get(w)}
+            if kept:
+                self._usage_counters[str(key)] = kept
+
+    async def _usage_maybe_persist(self, force: bool = False):
+        if not self._usage_dirty:
+            return
+        now = self._now_ts()
+        try:
+            interval = int(self.config.get("usage_persist_interval_seconds", 60))
+        except Exception:
+            interval = 60
+        if not force and now - self._usage_last_persist_ts < interval:
+            return
+        self._usage_dirty = False
+        self._usage_last_persist_ts = now
+        try:
+            await self._run_blocking("usage_write", self._usage_write_file, self._usage_store_path(), self._usage_snapshot())
+        except Exception:
+            self._usage_dirty = True
+            logger.warning("[JudgePlugin] 用量记录保存失败")
@@ -1,16 +1,37 @@
 import re
 import time
 import asyncio
+import hashlib
 from collections import OrderedDict
 from functools import lru_cache
 from astrbot.api.event import AstrMessageEvent
+from .judge_compact import _estimate_tokens
+
+
+_NORMALIZE_STRIP_RE = re.compile(r"[^\w\s\u4e00-\u9fff]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _normalize_lower(lower: str) -> str:
+    return _WHITESPACE_RE.sub(" ", _NORMALIZE_STRIP_RE.sub("", lower)).strip()
+
+
+def _fingerprint64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8", "ignore"), digest_size=8).digest(), "big")
+
+
+@lru_cache(maxsize=64)
+def _normalized_fingerprint(text: str) -> int:
+    # 系统提示词等少量重复出现的长文本：按原文记忆其归一化指纹
+    return _fingerprint64(_normalize_lower(text.strip().lower()))
 
 
 @lru_cache(maxsize=256)
 def _compile_command_regexes(command_patterns: tuple) -> tuple:
     compiled = []
     for pattern in command_patterns:
-        compiled.append(re.compile(r"^[^\w\s]*%s\s*(.*)$" % re.escape(pattern), re.IGNORECASE))
+        # DOTALL：多行参数（如批量模拟）整体作为参数
+        compiled.append(re.compile(r"^[^\w\s]*%s\s*(.*)$" % re.escape(pattern), re.IGNORECASE | re.DOTALL))
     return tuple(compiled)
 
 
@@ -36,10 +57,25 @@ class JudgeUtilsMixin:
     def _normalize_text(self, text: str) -> str:
         if not isinstance(text, str):
             return ""
-        normalized = text.strip().lower()
-        normalized = re.sub(r"[^\w\s\u4e00-\u9fff]+", "", normalized)
-        normalized = re.sub(r"\s+", " ", normalized).strip()
-        return normalized
+        return _normalize_lower(text.strip().lower())
+
+    def _describe_message(self, text: str) -> dict:
+        """每条消息只计算一次的描述：归一化文本、64 位指纹、长度、token 估算与代码特征，沿判定/缓存/统计链路传递。"""
+        text = text if isinstance(text, str) else ""
+        lower = text.lower()
+        normalized = _normalize_lower(lower.strip())
+        return {
+            "text": text,
+            "lower": lower,
+            "normalized": normalized,
+            "fp": _fingerprint64(normalized) if normalized else 0,
+            "length": len(text),
+            "tokens": _estimate_tokens(text),
+            "has_code": "```" in text or "def " in lower or "function " in lower,
+        }
+
+    def _text_fingerprint(self, text: str) -> int:
+        return _normalized_fingerprint(text) if isinstance(text, str) else 0
 
     def _cache_get(self, cache, key: str):
         item = cache.get(key)
@@ -59,6 +95,16 @@ class JudgeUtilsMixin:
                 pass
         return value
 
+    def _cache_peek(self, cache, key: str):
+        """只读版本的 _cache_get：不清理过期项、不调整 LRU 顺序。"""
+        item = cache.get(key)
+        if not item:
+            return None
+        expires_at, value = item
+        if expires_at and expires_at < self._now_ts():
+            return None
+        return value
+
     def _cache_set(self, cache, key: str, value, ttl_seconds: int, max_entries: int):
         try:
             ttl_seconds = int(ttl_seconds)
@@ -3,7 +3,7 @@ AstrBot 智能LLM判断插件
 根据用户消息复杂度,智能选择高智商模型或快速模型进行回答
 """
 
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from string import Template
 
 from astrbot.api.event import filter, AstrMessageEvent
@@ -13,61 +13,52 @@ from astrbot.api import logger, AstrBotConfig
 
 from .judge_utils import JudgeUtilsMixin
 from .judge_config import JudgeConfigMixin
+from .judge_compiled import JudgeCompiledConfigMixin
 from .judge_rules import JudgeRulesMixin
 from .judge_router import JudgeRouterMixin
 from .judge_stats import JudgeStatsMixin
 from .judge_commands import JudgeCommandsMixin
 from .judge_acl import JudgeAclMixin
 from .judge_budget import JudgeBudgetMixin
+from .judge_usage import JudgeUsageMixin
 from .judge_lock import JudgeLockMixin
 from .judge_context import JudgeContextMixin
 from .judge_llm import JudgeLlmMixin
+from .judge_inertia import JudgeInertiaMixin
+from .judge_classifier import JudgeClassifierMixin
+from .judge_judge_pool import JudgeJudgePoolMixin
+from .judge_compact import JudgeCompactMixin
+from .judge_prompts import JudgePromptsMixin, FULL_JUDGE_PROMPT
+from .judge_perf import JudgePerfMixin
+from .judge_executor import JudgeExecutorMixin
 from .judge_decider import JudgeDeciderMixin
 from .judge_hooks import JudgeHooksMixin
 
 
-DEFAULT_JUDGE_PROMPT_TEMPLATE = Template("""你是一个“消息复杂度/成本-收益”分流器。目标是在满足用户需求的前提下尽量节省成本与时延：除非确实需要更强推理/更长上下文/更高准确性，否则优先选择 FAST。
-
-你只做二选一分类：HIGH 或 FAST。不要输出解释、标点、空格或换行。
-
-## 判定目标
-- HIGH：任务对推理深度、正确性、稳定性、长上下文、复杂结构化输出有明显要求，FAST 高概率给出错误/不完整/不可靠结果。
-- FAST：可以用简短直接回答解决；或即使略有不精确也不影响体验；或可用简单规则/常识完成。
-
-## 关键判断维度（满足任意一条通常选 HIGH）
-1) 多步推理：需要严谨推导、证明、复杂逻辑链、反例讨论、细致方案权衡。
-2) 数学/算法/代码：编程实现、调试、复杂算法、SQL/正则、性能分析、边界条件多。
-3) 长文本/多要点：需要总结/对比/归纳长内容，或输出结构化清单且要覆盖全面。
-4) 专业/高风险：医疗/法律/金融/安全等对准确性要求高，或需要谨慎措辞与推断。
-5) 明确要求“详细/深入/步骤/举例/证明/推导/完整代码/测试用例/鲁棒性”等。
-
-## 典型 FAST 场景（满足任意一条通常选 FAST）
-- 问候/闲聊/情绪安抚/短句翻译/简短定义解释。
-- 单一事实或简单是非判断（不要求严谨推导）。
-- 简单改写、润色、生成短回复、轻量总结（文本不长）。
-- 用户问题很短且没有“深入/详细/步骤/代码/推导”等要求。
-
-## 边界处理
-- 不确定时默认 FAST，除非用户明确要求高质量/详细推理/代码/数学等。
-
-用户消息如下：
-$message
-
-最终输出（仅一个词）：HIGH 或 FAST""")
+DEFAULT_JUDGE_PROMPT_TEMPLATE = Template(FULL_JUDGE_PROMPT)
 
 
 class JudgePlugin(
     JudgeCommandsMixin,
     JudgeUtilsMixin,
     JudgeConfigMixin,
+    JudgeCompiledConfigMixin,
     JudgeRulesMixin,
     JudgeAclMixin,
     JudgeBudgetMixin,
+    JudgeUsageMixin,
     JudgeLockMixin,
     JudgeContextMixin,
     JudgeRouterMixin,
     JudgeStatsMixin,
     JudgeLlmMixin,
+    JudgeInertiaMixin,
+    JudgeClassifierMixin,
+    JudgeJudgePoolMixin,
+    JudgeCompactMixin,
+    JudgePromptsMixin,
+    JudgePerfMixin,
+    JudgeExecutorMixin,
     JudgeDeciderMixin,
     JudgeHooksMixin,
     Star,
@@ -79,16 +70,70 @@ class JudgePlugin(
         self.config = config
         self._decision_cache = OrderedDict()
         self._answer_cache = OrderedDict()
+        self._command_history_cache = OrderedDict()
+        self._command_history_sessions = {}
+        self._command_history_writes = set()
         self._session_locks = {}
+        self._config_version = 0
+        self._acl_index = None
+        self._acl_resolution_cache = OrderedDict()
+        self._compiled_config = {}
+        self._budget_ratio_state = OrderedDict()
+        self._usage_counters = OrderedDict()
+        self._usage_dirty = False
+        self._usage_last_persist_ts = 0
         self._stats_records = []
         self._stats_counters = {}
         self._llm_pending = {}
         self._provider_health = {}
         self._circuit_breakers = {}
+        self._provider_cooldowns = {}
+        self._provider_latency = {}
+        self._hedge_state = {"calls": 0, "hedged": 0}
         self._last_route = {}
         self._internal_llm_tasks = set()
+        self._prejudge_futures = OrderedDict()
+        self._route_inertia = OrderedDict()
+        self._decider_stage_stats = {}
+        self._judge_route_stats = {}
+        self._judge_stream_unsupported = set()
+        self._judge_latency = {
+            "race_calls": 0,
+            "race_fired": 0,
+            "primary_direct": deque(maxlen=500),
+            "primary_shadow": deque(maxlen=100),
+            "effective": deque(maxlen=500),
+        }
+        self._perf_enabled = False
+        self._perf_active = None
+        self._perf = {
+            "lag": deque(maxlen=600),
+            "blocks": deque(maxlen=50),
+            "sites": {},
+            "spans": {},
+            "task": None,
+            "watchdog": None,
+            "threshold_ms": 100,
+        }
+        self._executor = {
+            "threads": None,
+            "processes": None,
+            "slots": None,
+            "pending": 0,
+            "max_pending": 0,
+            "saturated": 0,
+            "tasks": {},
+        }
+        self._fuzzy_decision_index = OrderedDict()
+        self._classifier_model = {
+            "docs": {"HIGH": 0, "FAST": 0},
+            "totals": {"HIGH": 0, "FAST": 0},
+            "counts": {"HIGH": {}, "FAST": {}},
+            "vocab": set(),
+        }
         
         self.judge_prompt_template = DEFAULT_JUDGE_PROMPT_TEMPLATE
+        self._judge_prompt_compiled = None
 
     async def initialize(self):
         """插件初始化"""
@@ -98,6 +143,16 @@ class JudgePlugin(
         except Exception:
             logger.exception("[JudgePlugin] 配置归一化失败，将使用原始配置继续运行")
 
+        try:
+            self._perf_start()
+        except Exception:
+            logger.exception("[JudgePlugin] 事件循环监控启动失败")
+
+        try:
+            self._executor_start()
+        except Exception:
+            logger.exception("[JudgePlugin] 后台执行器启动失败")
+
         try:
             validate = getattr(self, "_validate_config", None)
             if callable(validate):
@@ -112,6 +167,12 @@ class JudgePlugin(
                         logger.warning(f"[JudgePlugin] 配置警告: {item}")
         except Exception:
             pass
+
+        try:
+            with self._perf_span("usage_load"):
+                self._usage_load()
+        except Exception:
+            logger.exception("[JudgePlugin] 用量记录加载失败")
         
         # 验证配置
         judge_provider = self.config.get("judge_provider_id", "")
@@ -140,7 +201,11 @@ class JudgePlugin(
                 if not (isinstance(routes_value, list) and routes_value):
                     logger.warning(f"[JudgePlugin] {pool_label} 建议改用 {routes_key} 以避免索引对齐配置脆弱问题")
 
-        if not judge_provider:
+        judge_provider_ids = self.config.get("judge_provider_ids", [])
+        if judge_provider_ids:
+            logger.info(f"[JudgePlugin] 判断模型池: {judge_provider_ids}")
+            _warn_pairing("判断模型池", judge_provider_ids, self.config.get("judge_models", []), "judge_routes")
+        elif not judge_provider:
             logger.error("[JudgePlugin] 【必填】未配置判断模型提供商ID,插件无法正常工作!")
         if not high_iq_provider_ids:
             logger.warning("[JudgePlugin] 未配置高智商模型提供商列表")
@@ -163,8 +228,33 @@ class JudgePlugin(
 
     async def terminate(self):
         """插件销毁"""
+        try:
+            self._cleanup_prejudge_futures(0, force_all=True)
+        except Exception:
+            pass
+        try:
+            await self._usage_maybe_persist(force=True)
+        except Exception:
+            logger.exception("[JudgePlugin] 用量记录保存失败")
+        try:
+            await self._flush_all_command_history()
+        except Exception:
+            logger.exception("[JudgePlugin] 命令上下文写回失败")
+        try:
+            await self._perf_stop()
+        except Exception:
+            pass
+        try:
+            self._executor_stop()
+        except Exception:
+            pass
         logger.info("[JudgePlugin] 智能LLM判断插件已停止")
 
+    @filter.event_message_type(filter.EventMessageType.ALL)
+    async def on_message_prejudge(self, event: AstrMessageEvent):
+        """消息到达时：提前启动复杂度判定，与框架自身的预处理流水线并行"""
+        await JudgeHooksMixin.on_message_prejudge(self, event)
+
     @filter.on_llm_request()
     async def on_llm_request(self, event: AstrMessageEvent, req: ProviderRequest):
         """LLM 请求前：按复杂度/策略/预算选择模型提供商与模型"""
@@ -247,9 +337,15 @@ class JudgePlugin(
         async for item in JudgeCommandsMixin.judge_rule(self, event):
             yield item
 
+    @filter.command("judge_perf", alias={"性能", "perf"})
+    async def judge_perf(self, event: AstrMessageEvent, args=None, kwargs=None, rest=None, kwrest=None):
+        """查看事件循环延迟、阻塞来源（需启用 enable_perf_monitor）与后台执行器排队情况"""
+        async for item in JudgePerfMixin.judge_perf(self, event):
+            yield item
+
     @filter.command("judge_dryrun", alias={"模拟", "dryrun", "模拟路由"})
     async def judge_dryrun(self, event: AstrMessageEvent, args=None, kwargs=None, rest=None, kwrest=None):
-        """模拟路由过程（不消耗 Token）"""
+        """模拟路由过程（不调用模型，不改动锁定/缓存/统计；支持批量）"""
         async for item in JudgeCommandsMixin.judge_dryrun(self, event):
             yield item
 
@@ -0,0 +1,110 @@
+"""在没有安装 AstrBot 的环境中加载插件：注入最小的 astrbot.api 替身模块，供 tools/ 下的离线脚本使用。
+
+只覆盖插件实际用到的名字（logger / AstrBotConfig / filter / AstrMessageEvent / Star / Context / ProviderRequest），
+装饰器均为原样返回的空实现；不要在真实 AstrBot 进程里调用 install()。
+"""
+
+import os
+import sys
+import types
+import logging
+import importlib
+import importlib.util
+
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGIN_PACKAGE = "astrbot_plugin_judge"
+
+
+class _Filter:
+    class EventMessageType:
+        ALL = "ALL"
+
+    def __getattr__(self, name):
+        def _decorator_factory(*args, **kwargs):
+            return lambda func: func
+
+        return _decorator_factory
+
+
+class StubStar:
+    def __init__(self, context=None):
+        self.context = context
+
+
+class StubProviderRequest:
+    def __init__(self, prompt: str = ""):
+        self.prompt = prompt
+        self.system_prompt = ""
+        self.provider_id = ""
+        self.model = ""
+
+
+class _MessageObj:
+    def __init__(self, message_id: str):
+        self.message_id = message_id
+
+
+class StubEvent:
+    """最小的消息事件替身。"""
+
+    def __init__(self, message: str, session: str = "replay:FriendMessage:0", group_id: str = "", sender_id: str = "0", message_id: str = ""):
+        self.message_str = message
+        self.unified_msg_origin = session
+        self.message_obj = _MessageObj(message_id)
+        self._group_id = group_id
+        self._sender_id = sender_id
+
+    def get_group_id(self):
+        return self._group_id
+
+    def get_sender_id(self):
+        return self._sender_id
+
+    def plain_result(self, text: str):
+        return text
+
+
+def install():
+    if "astrbot.api" in sys.modules:
+        return
+    astrbot = types.ModuleType("astrbot")
+    api = types.ModuleType("astrbot.api")
+    event = types.ModuleType("astrbot.api.event")
+    star = types.ModuleType("astrbot.api.star")
+    provider = types.ModuleType("astrbot.api.provider")
+
+    api.logger = logging.getLogger("astrbot")
+    api.AstrBotConfig = dict
+    event.filter = _Filter()
+    event.AstrMessageEvent = object
+    star.Star = StubStar
+    star.Context = object
+    provider.ProviderRequest = StubProviderRequest
+
+    api.event = event
+    api.star = star
+    api.provider = provider
+    astrbot.api = api
+    sys.modules.update(
+        {
+            "astrbot": astrbot,
+            "astrbot.api": api,
+            "astrbot.api.event": event,
+            "astrbot.api.star": star,
+            "astrbot.api.provider": provider,
+        }
+    )
+
+
+def load_plugin_module():
+    """安装替身并以包名 astrbot_plugin_judge 加载插件，返回其 main 模块。"""
+    install()
+    if PLUGIN_PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            PLUGIN_PACKAGE, os.path.join(PLUGIN_DIR, "__init__.py"), submodule_search_locations=[PLUGIN_DIR]
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[PLUGIN_PACKAGE] = module
+        spec.loader.exec_module(module)
+    return importlib.import_module(f"{PLUGIN_PACKAGE}.main")
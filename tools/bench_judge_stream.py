@@ -0,0 +1,85 @@
+"""对比流式与非流式 judge 调用的耗时，并核对两条路径给出的判定一致。
+
+    python tools/bench_judge_stream.py
+    python tools/bench_judge_stream.py --ttfb-ms 150 --chunk-delay-ms 30 --rounds 10
+
+假 judge 先输出结论再输出一段解释（啰嗦的 judge 模型）。两条路径都取最先出现的 HIGH/FAST，
+流式路径在首个标签出现时即可关闭流；结论在末尾的答复不会因流式而变快。
+两条路径判定不一致或与预期不符时退出码为 1。
+不依赖 AstrBot：通过 _astrbot_stubs 加载插件。
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _astrbot_stubs import load_plugin_module  # noqa: E402
+from fake_provider import FakeProvider, FakeContext  # noqa: E402
+
+
+EXPLANATION = "理由：这个问题涉及多个步骤的推理与权衡，需要结合上下文逐条分析各个方案的优缺点，" * 4
+
+# 名称 -> (答复, 预期判定)
+REPLIES = {
+    "high_first": ("HIGH\n" + EXPLANATION, "HIGH"),
+    "fast_first": ("FAST\n" + EXPLANATION, "FAST"),
+    "fast_then_high": ("FAST? 不，应为 HIGH。" + EXPLANATION, "FAST"),
+    "high_late": (EXPLANATION + "结论：HIGH", "HIGH"),
+}
+
+
+def make_plugin(reply: str, streaming: bool, args):
+    main = load_plugin_module()
+    provider = FakeProvider(
+        reply, ttfb=args.ttfb_ms / 1000, chunk_size=args.chunk_size, chunk_delay=args.chunk_delay_ms / 1000
+    )
+    config = {"judge_provider_id": "judge", "enable_judge_streaming": streaming}
+    plugin = main.JudgePlugin(FakeContext({"judge": provider}), config)
+    plugin._normalize_config()
+    return plugin, provider
+
+
+async def measure(reply: str, streaming: bool, args) -> tuple:
+    plugin, provider = make_plugin(reply, streaming, args)
+    elapsed = []
+    decision = ""
+    for _ in range(args.rounds):
+        t0 = time.perf_counter()
+        decision, _ = await plugin._judge_call_one("judge", "", "帮我分析一下", "")
+        elapsed.append((time.perf_counter() - t0) * 1000)
+    return decision, statistics.median(elapsed), provider.stream_closed_early
+
+
+async def run(args) -> bool:
+    consistent = True
+    print(f"{'答复':<16} {'非流式':>14} {'流式':>14}  提前关闭  判定")
+    for name, (reply, expected) in REPLIES.items():
+        plain_decision, plain_ms, _ = await measure(reply, False, args)
+        stream_decision, stream_ms, closed = await measure(reply, True, args)
+        same = plain_decision == stream_decision == expected
+        consistent = consistent and same
+        print(
+            f"{name:<16} {plain_ms:>11.0f} ms {stream_ms:>11.0f} ms  {closed:>8}  "
+            f"{plain_decision}/{stream_decision}{'' if same else f'  ← 不一致（预期 {expected}）'}"
+        )
+    return consistent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ttfb-ms", type=float, default=100, help="首包延迟（毫秒）")
+    parser.add_argument("--chunk-size", type=int, default=4, help="每块字符数")
+    parser.add_argument("--chunk-delay-ms", type=float, default=20, help="块间隔（毫秒）")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
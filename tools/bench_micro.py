@@ -0,0 +1,304 @@
+"""插件热点函数的微基准：规则预判、文本归一化、缓存读写、池选择、ACL、统计记录与对话历史解析。
+
+    python tools/bench_micro.py                          # 打印结果
+    python tools/bench_micro.py --output base.json       # 保存 JSON，便于跨提交对比
+    python tools/bench_micro.py --compare base.json      # 与基线对比，任一用例变慢超过阈值时退出码为 1
+    python tools/bench_micro.py --filter rules --quick
+
+每个用例先自动确定循环次数（单轮约 --min-time 秒），再重复 --repeat 轮，报告每次调用的中位数与最小耗时（µs）；
+对比基线时使用最小耗时，--quick 的结果波动较大，不宜用于判定退化。
+不依赖 AstrBot：通过 _astrbot_stubs 加载插件，所有数据都是确定性生成的。
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import platform
+import argparse
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _astrbot_stubs import PLUGIN_PACKAGE, load_plugin_module, StubEvent  # noqa: E402
+from fake_provider import FakeProvider, FakeContext  # noqa: E402
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KEYWORD_SET_SIZES = (10, 100, 1000, 10000)
+POOL_SIZES = (2, 20, 200)
+ACL_LIST_SIZE = 10000
+HISTORY_MESSAGE_COUNTS = (100, 2000, 20000)
+HISTORY_KEEP = 20
+
+SAMPLE_MESSAGES = (
+    "你好呀",
+    "帮我润色一下：今天的会议很成功，大家都很满意",
+    "我们的服务 p99 延迟从 80ms 涨到 900ms，CPU 不高但线程池排队很多，帮我系统地分析可能原因和排查步骤",
+    "Rust 里生命周期标注 'a 到底在约束什么？结合借用检查器的工作方式深入讲讲",
+)
+
+
+def measure(fn, min_time: float, repeat: int) -> dict:
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time or number >= 1 << 24:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - t0) / number * 1e6)
+    return {"us_per_op": round(statistics.median(samples), 4), "min_us": round(min(samples), 4), "loops": number}
+
+
+def make_plugin(config: dict = None):
+    main = load_plugin_module()
+    providers = {"judge": FakeProvider("FAST")}
+    plugin = main.JudgePlugin(FakeContext(providers), dict({"judge_provider_id": "judge"}, **(config or {})))
+    plugin._normalize_config()
+    return plugin
+
+
+def _keywords(n: int, prefix: str) -> list:
+    rnd = random.Random(n)
+    return [f"{prefix}{rnd.randrange(16 ** 8):08x}" for _ in range(n)]
+
+
+def cases_rules():
+    for size in KEYWORD_SET_SIZES:
+        plugin = make_plugin({"custom_high_keywords": _keywords(size, "h"), "custom_fast_keywords": _keywords(size, "f")})
+        messages = [(m, plugin._describe_message(m)) for m in SAMPLE_MESSAGES]
+        # 未命中任何自定义关键词：最坏情况，需扫完两张表后才进入内置规则
+        yield (
+            f"rules.prejudge.custom_kw_{size}",
+            lambda plugin=plugin, messages=messages: [plugin._rule_prejudge_detail(m, d) for m, d in messages],
+        )
+    plugin = make_plugin()
+    yield ("rules.prejudge.no_desc", lambda: [plugin._rule_prejudge_detail(m) for m in SAMPLE_MESSAGES])
+
+
+def cases_normalize():
+    plugin = make_plugin()
+    long_text = "".join(SAMPLE_MESSAGES) * 20
+    yield ("normalize.short", lambda: [plugin._normalize_text(m) for m in SAMPLE_MESSAGES])
+    yield ("normalize.long_2k_chars", lambda: plugin._normalize_text(long_text))
+    yield ("describe_message.short", lambda: [plugin._describe_message(m) for m in SAMPLE_MESSAGES])
+
+
+def cases_cache():
+    from collections import OrderedDict
+
+    plugin = make_plugin()
+    capacity = 500
+    cache = OrderedDict()
+    for i in range(capacity):
+        plugin._cache_set(cache, f"k{i}", "HIGH", 600, capacity)
+    keys = [f"k{i}" for i in range(capacity)]
+    state = {"i": 0}
+
+    def get_hit():
+        state["i"] = (state["i"] + 1) % capacity
+        return plugin._cache_get(cache, keys[state["i"]])
+
+    def set_evict():
+        # 缓存已满：每次写入新键都会先扫描过期项再淘汰最旧项
+        state["i"] += 1
+        plugin._cache_set(cache, f"n{state['i']}", "FAST", 600, capacity)
+
+    yield (f"cache.get_hit_full_{capacity}", get_hit)
+    yield ("cache.get_miss", lambda: plugin._cache_get(cache, "missing"))
+    yield (f"cache.set_evict_full_{capacity}", set_evict)
+
+
+def cases_pool():
+    for size in POOL_SIZES:
+        plugin = make_plugin(
+            {
+                "high_iq_provider_ids": [f"high{i}" for i in range(size)],
+                "high_iq_models": [f"model-h{i}" for i in range(size)],
+                "fast_provider_ids": [f"fast{i}" for i in range(size)],
+                "fast_models": [f"model-f{i}" for i in range(size)],
+                "enable_high_iq_sticky_routing": True,
+            }
+        )
+        event = StubEvent("hi", session="bench:GroupMessage:1", group_id="1", sender_id="2")
+        yield (f"pool.get_pool_pairs_{size}", lambda plugin=plugin: plugin._get_pool_pairs("HIGH"))
+        yield (
+            f"pool.select_fast_{size}",
+            lambda plugin=plugin, event=event: plugin._select_pool_and_provider(event, "router", "FAST"),
+        )
+        yield (
+            f"pool.select_high_sticky_{size}",
+            lambda plugin=plugin, event=event: plugin._select_pool_and_provider(event, "router", "HIGH"),
+        )
+
+
+def cases_acl():
+    rnd = random.Random(7)
+    ids = [str(rnd.randrange(10 ** 9, 10 ** 10)) for _ in range(ACL_LIST_SIZE)]
+    config = {
+        "whitelist": ids + [f"prefix{i}*" for i in range(100)] + [f"grp?{i}" for i in range(10)],
+        "blacklist": ids[: ACL_LIST_SIZE // 2],
+        "router_blacklist": ids[ACL_LIST_SIZE // 2 :],
+    }
+    plugin = make_plugin(config)
+    event = StubEvent("hi", session="bench:GroupMessage:999", group_id="999", sender_id=ids[-1])
+
+    def cold():
+        plugin._acl_resolution_cache.clear()
+        return plugin._is_router_allowed(event)
+
+    def rebuild():
+        plugin._bump_config_version()
+        return plugin._is_router_allowed(event)
+
+    yield (f"acl.router_allowed_warm_{ACL_LIST_SIZE}", lambda: plugin._is_router_allowed(event))
+    yield (f"acl.router_allowed_cold_{ACL_LIST_SIZE}", cold)
+    yield (f"acl.command_allowed_warm_{ACL_LIST_SIZE}", lambda: plugin._is_command_allowed(event, "judge_status"))
+    yield (f"acl.index_rebuild_{ACL_LIST_SIZE}", rebuild)
+
+
+def cases_stats():
+    plugin = make_plugin({"stats_max_records": 200})
+    record = {"ts": 0, "pool": "FAST", "provider_id": "p", "model": "m", "source": "rule", "elapsed_ms": 12.0}
+    for _ in range(200):
+        plugin._stats_add_record(dict(record))
+    yield ("stats.add_record_full_200", lambda: plugin._stats_add_record(record))
+    yield ("stats.inc", lambda: plugin._stats_inc("bench_counter"))
+
+
+def cases_decider():
+    plugin = make_plugin({"custom_high_keywords": _keywords(100, "h")})
+    loop = asyncio.new_event_loop()
+    message = SAMPLE_MESSAGES[2]
+    desc = plugin._describe_message(message)
+    yield (
+        "decider.rules_hit",
+        lambda: loop.run_until_complete(plugin._judge_message_complexity_with_meta(message, desc=desc)),
+    )
+
+
+def _history_text(count: int) -> str:
+    rnd = random.Random(count)
+    history = []
+    for i in range(count):
+        role = "user" if i % 2 == 0 else "assistant"
+        # 混入花括号与引号，接近真实的代码/JSON 回答
+        content = rnd.choice(SAMPLE_MESSAGES) + ' {"k": [1, 2]} ' * rnd.randrange(0, 4) + str(i)
+        history.append({"role": role, "content": content})
+        if i % 50 == 49:
+            history.append({"role": "tool", "content": [{"type": "text", "text": "{}"}]})
+    return json.dumps(history, ensure_ascii=False)
+
+
+def cases_history():
+    import importlib
+
+    load_plugin_module()
+    _loads_history_tail = importlib.import_module(f"{PLUGIN_PACKAGE}.judge_context")._loads_history_tail
+    loop = asyncio.new_event_loop()
+    for count in HISTORY_MESSAGE_COUNTS:
+        text = _history_text(count)
+        label = f"{count}msg_{len(text) // 1024}kb"
+        # 原先的做法：完整 json.loads（大于 20000 字符时放进默认线程池）
+        yield (
+            f"history.full_parse_executor_{label}",
+            lambda text=text: loop.run_until_complete(loop.run_in_executor(None, json.loads, text)),
+        )
+        yield (f"history.full_parse_{label}", lambda text=text: json.loads(text))
+        yield (f"history.tail_parse_{HISTORY_KEEP}_{label}", lambda text=text: _loads_history_tail(text, HISTORY_KEEP))
+
+
+SUITES = (cases_rules, cases_normalize, cases_cache, cases_pool, cases_acl, cases_stats, cases_decider, cases_history)
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5)
+        return out.stdout.strip()
+    except Exception:
+        return ""
+
+
+def run(args) -> dict:
+    results = {}
+    for suite in SUITES:
+        for name, fn in suite():
+            if args.filter and not any(f in name for f in args.filter):
+                continue
+            results[name] = measure(fn, args.min_time, args.repeat)
+            if not args.json:
+                r = results[name]
+                print(f"{name:<44} {r['us_per_op']:>12.3f} µs  (min {r['min_us']:.3f}, loops {r['loops']})", flush=True)
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": int(time.time()),
+        },
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    base_results = baseline.get("results", {})
+    for name, cur in report["results"].items():
+        base = base_results.get(name)
+        if not base or not base.get("min_us"):
+            continue
+        # 用各轮最小值比较：受调度与其他进程干扰最小
+        ratio = cur["min_us"] / base["min_us"]
+        if ratio > 1 + threshold:
+            regressions.append((name, base["min_us"], cur["min_us"], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", nargs="*", default=[], help="只运行名称包含任一子串的用例")
+    parser.add_argument("--min-time", type=float, default=0.2, help="单轮最短时长（秒）")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="等价于 --min-time 0.02 --repeat 3")
+    parser.add_argument("--output", default="", help="把结果写入 JSON 文件")
+    parser.add_argument("--compare", default="", help="与之前保存的 JSON 基线对比")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定为退化的变慢比例（默认 20%%）")
+    parser.add_argument("--json", action="store_true", help="向标准输出打印 JSON")
+    args = parser.parse_args()
+    if args.quick:
+        args.min_time, args.repeat = 0.02, 3
+
+    report = run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        out = sys.stderr if args.json else sys.stdout
+        label = baseline.get("meta", {}).get("commit") or args.compare
+        if regressions:
+            print(f"相对 {label} 变慢超过 {args.threshold:.0%} 的用例:", file=out)
+            for name, base, cur, ratio in regressions:
+                print(f"  {name}: {base:.3f} → {cur:.3f} µs (x{ratio:.2f})", file=out)
+            sys.exit(1)
+        print(f"相对 {label} 无超过 {args.threshold:.0%} 的退化", file=out)
+
+
+if __name__ == "__main__":
+    main()
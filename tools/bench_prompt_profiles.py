@@ -0,0 +1,212 @@
+"""对比 judge 提示词档位（full / compact / minimal）的 token 数、拼装开销，以及（可选）真实 judge 的延迟与一致率。
+
+离线（不调用模型）：
+
+    python tools/bench_prompt_profiles.py
+
+对接任意 OpenAI 兼容接口，测量延迟、真实 token 用量（含前缀缓存命中）与判定一致率：
+
+    python tools/bench_prompt_profiles.py --endpoint https://api.openai.com/v1 --model gpt-4o-mini
+
+语料为 JSONL，每行 {"message": "...", "label": "HIGH|FAST"}；label 可省略（省略时只统计与 full 档的一致率）。
+API Key 从 --api-key 或环境变量 OPENAI_API_KEY 读取。
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import importlib.util
+import urllib.request
+from string import Template
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "judge_corpus_sample.jsonl")
+
+
+def _load_module(name: str):
+    # 这些模块不依赖 AstrBot，可直接按文件加载
+    spec = importlib.util.spec_from_file_location(f"_bench_{name}", os.path.join(ROOT, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+prompts = _load_module("judge_prompts")
+compact = _load_module("judge_compact")
+decider = _load_module("judge_decider")
+
+PROFILE_TEXTS = {
+    "full": prompts.FULL_JUDGE_PROMPT,
+    "compact": prompts.COMPACT_JUDGE_PROMPT,
+    "minimal": prompts.MINIMAL_JUDGE_PROMPT,
+}
+
+
+def parse_decision(text: str) -> str:
+    # 与 judge_judge_pool._parse_judge_decision 保持一致
+    text = (text or "").strip().upper()
+    high = text.find("HIGH")
+    fast = text.find("FAST")
+    if high < 0 and fast < 0:
+        return ""
+    if fast < 0 or 0 <= high < fast:
+        return "HIGH"
+    return "FAST"
+
+
+def load_corpus(path: str) -> list:
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            rows.append({"message": str(item.get("message", "")), "label": str(item.get("label", "") or "").upper()})
+    return rows
+
+
+def percentile(values: list, p: int):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def bench_assembly(text: str, messages: list, rounds: int) -> tuple:
+    """返回 (预编译拼装 µs/次, Template.safe_substitute µs/次)。"""
+    parts = prompts.compile_prompt(text)
+    template = Template(text)
+    n = len(messages) * rounds
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for m in messages:
+            prompts.assemble_prompt(parts, m)
+    spliced = (time.perf_counter() - t0) / n * 1e6
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for m in messages:
+            template.safe_substitute(message=m)
+    substituted = (time.perf_counter() - t0) / n * 1e6
+    return spliced, substituted
+
+
+def call_openai_compatible(endpoint: str, api_key: str, model: str, system_prompt: str, prompt: str, timeout: float) -> dict:
+    body = json.dumps(
+        {
+            "model": model,
+            "messages": [{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}],
+            "max_tokens": 4,
+            "temperature": 0,
+        }
+    ).encode("utf-8")
+    req = urllib.request.Request(
+        endpoint.rstrip("/") + "/chat/completions",
+        data=body,
+        headers={"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"},
+    )
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        data = json.loads(resp.read().decode("utf-8"))
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    usage = data.get("usage") or {}
+    details = usage.get("prompt_tokens_details") or {}
+    return {
+        "elapsed_ms": elapsed_ms,
+        "text": ((data.get("choices") or [{}])[0].get("message") or {}).get("content") or "",
+        "prompt_tokens": int(usage.get("prompt_tokens") or 0),
+        "cached_tokens": int(details.get("cached_tokens") or 0),
+    }
+
+
+def run(args) -> dict:
+    corpus = load_corpus(args.corpus)
+    messages = [row["message"] for row in corpus]
+    system_prompt = decider.DEFAULT_JUDGE_SYSTEM_PROMPT
+    api_key = args.api_key or os.environ.get("OPENAI_API_KEY", "")
+    report = {"corpus": args.corpus, "size": len(corpus), "profiles": {}}
+    decisions = {}
+
+    for profile in args.profiles:
+        text = PROFILE_TEXTS[profile]
+        parts = prompts.compile_prompt(text)
+        prompt_tokens = [compact._estimate_tokens(prompts.assemble_prompt(parts, m)) for m in messages]
+        spliced_us, substituted_us = bench_assembly(text, messages, args.rounds)
+        result = {
+            "est_prompt_tokens_avg": round(sum(prompt_tokens) / max(len(prompt_tokens), 1), 1),
+            "est_static_prefix_tokens": compact._estimate_tokens(parts[0]),
+            "assemble_us": round(spliced_us, 3),
+            "template_substitute_us": round(substituted_us, 3),
+        }
+
+        if args.endpoint:
+            latencies, real_tokens, cached, outs = [], [], [], []
+            for m in messages:
+                try:
+                    r = call_openai_compatible(
+                        args.endpoint, api_key, args.model, system_prompt, prompts.assemble_prompt(parts, m), args.timeout
+                    )
+                except Exception as e:
+                    print(f"[{profile}] 调用失败: {e}", file=sys.stderr)
+                    outs.append("")
+                    continue
+                latencies.append(r["elapsed_ms"])
+                real_tokens.append(r["prompt_tokens"])
+                cached.append(r["cached_tokens"])
+                outs.append(parse_decision(r["text"]))
+            decisions[profile] = outs
+            labelled = [(o, row["label"]) for o, row in zip(outs, corpus) if row["label"] in ("HIGH", "FAST")]
+            result.update(
+                {
+                    "latency_p50_ms": round(percentile(latencies, 50) or 0, 1),
+                    "latency_p95_ms": round(percentile(latencies, 95) or 0, 1),
+                    "prompt_tokens_avg": round(sum(real_tokens) / max(len(real_tokens), 1), 1),
+                    "cached_tokens_avg": round(sum(cached) / max(len(cached), 1), 1),
+                    "unparseable": sum(1 for o in outs if not o),
+                    "label_agreement": round(sum(1 for o, lb in labelled if o == lb) / len(labelled), 3) if labelled else None,
+                }
+            )
+        report["profiles"][profile] = result
+
+    if "full" in decisions:
+        for profile, outs in decisions.items():
+            same = sum(1 for a, b in zip(outs, decisions["full"]) if a and a == b)
+            report["profiles"][profile]["agreement_with_full"] = round(same / max(len(outs), 1), 3)
+    return report
+
+
+def print_table(report: dict):
+    print(f"语料: {report['corpus']} ({report['size']} 条)")
+    keys = []
+    for result in report["profiles"].values():
+        keys.extend(k for k in result if k not in keys)
+    header = ["profile"] + keys
+    print(" | ".join(header))
+    for profile, result in report["profiles"].items():
+        print(" | ".join([profile] + [str(result.get(k, "-")) for k in keys]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILE_TEXTS), choices=list(PROFILE_TEXTS))
+    parser.add_argument("--rounds", type=int, default=200, help="拼装微基准的轮数")
+    parser.add_argument("--endpoint", default="", help="OpenAI 兼容接口地址（如 https://api.openai.com/v1）；留空则只做离线对比")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--api-key", default="")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--json", action="store_true", help="输出 JSON 而不是表格")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_table(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""本地假提供商：用于在没有真实上游的情况下验证 judge 路径（流式/非流式、延迟、错误）。
+
+不依赖 AstrBot，可直接放进 `context.get_provider_by_id` 的返回值中使用。例如：
+
+    provider = FakeProvider("好的，这个问题属于 HIGH 复杂度，因为……", chunk_size=2, chunk_delay=0.05)
+    streaming_only = FakeProvider("FAST", stream=True, ttfb=0.2)
+    no_stream = FakeProvider("HIGH", stream=False)
+    flaky = FakeProvider("FAST", latency=latency_sampler("lognormal:80:0.6"), error_rate=0.02, rate_limit=50)
+"""
+
+import math
+import time
+import random
+import asyncio
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+def latency_sampler(spec: str, seed: int = None):
+    """把延迟分布描述解析为返回秒数的函数（参数单位为毫秒）：
+
+    - const:50
+    - uniform:20:200
+    - lognormal:80:0.5   （中位数 80ms，sigma 0.5）
+    - exp:100            （均值 100ms）
+    """
+    rnd = random.Random(seed)
+    parts = str(spec or "const:0").split(":")
+    kind, args = parts[0].strip().lower(), [float(x) for x in parts[1:]]
+    if kind == "const":
+        value = (args[0] if args else 0.0) / 1000
+        return lambda: value
+    if kind == "uniform":
+        return lambda: rnd.uniform(args[0], args[1]) / 1000
+    if kind == "lognormal":
+        mu, sigma = math.log(max(args[0], 1e-3)), args[1] if len(args) > 1 else 0.5
+        return lambda: rnd.lognormvariate(mu, sigma) / 1000
+    if kind == "exp":
+        return lambda: rnd.expovariate(1000 / max(args[0], 1e-3))
+    raise ValueError(f"未知的延迟分布: {spec}")
+
+
+class FakeResponse:
+    def __init__(self, completion_text: str, role: str = "assistant", is_chunk: bool = False, usage: dict = None):
+        self.completion_text = completion_text
+        self.role = role
+        self.is_chunk = is_chunk
+        self.usage = usage
+
+
+class FakeProvider:
+    """按配置返回固定文本的提供商。
+
+    - ttfb: 首个 token 前的等待（秒）
+    - chunk_size / chunk_delay: 流式时每块字符数与块间隔（秒）
+    - stream: False 时不提供 text_chat_stream（模拟不支持流式的提供商）
+    - error: 非空时调用抛出该异常
+    - latency: 返回秒数的函数，设置后代替 ttfb 作为每次调用的首包等待（见 latency_sampler）
+    - error_rate: 按该概率抛出瞬时错误（503）
+    - rate_limit: 每秒最多受理的调用数（令牌桶），超出时抛出 429
+    """
+
+    def __init__(
+        self,
+        text: str = "HIGH",
+        ttfb: float = 0.0,
+        chunk_size: int = 4,
+        chunk_delay: float = 0.0,
+        stream: bool = True,
+        error: Exception = None,
+        latency=None,
+        error_rate: float = 0.0,
+        rate_limit: float = 0.0,
+        seed: int = None,
+    ):
+        self.text = text
+        self.ttfb = ttfb
+        self.latency = latency
+        self.error_rate = float(error_rate or 0.0)
+        self.rate_limit = float(rate_limit or 0.0)
+        self._random = random.Random(seed)
+        self._bucket = (self.rate_limit, time.monotonic())
+        self.chunk_size = max(int(chunk_size), 1)
+        self.chunk_delay = chunk_delay
+        self.error = error
+        self.calls = 0
+        self.stream_calls = 0
+        self.chunks_sent = 0
+        self.stream_closed_early = 0
+        self.errors = 0
+        self.rate_limited = 0
+        if not stream:
+            self.text_chat_stream = None
+
+    def _admit(self):
+        """令牌桶限流与随机错误；返回应抛出的异常或 None。"""
+        if self.rate_limit > 0:
+            tokens, last = self._bucket
+            now = time.monotonic()
+            tokens = min(self.rate_limit, tokens + (now - last) * self.rate_limit)
+            if tokens < 1:
+                self._bucket = (tokens, now)
+                self.rate_limited += 1
+                return FakeRateLimitError("429 Too Many Requests: rate limit exceeded, retry after 1s")
+            self._bucket = (tokens - 1, now)
+        if self.error_rate > 0 and self._random.random() < self.error_rate:
+            self.errors += 1
+            return RuntimeError("503 upstream temporarily unavailable")
+        return self.error
+
+    def _first_byte_delay(self) -> float:
+        return self.latency() if self.latency is not None else self.ttfb
+
+    def _usage(self, prompt: str) -> dict:
+        return {"prompt_tokens": max(len(prompt or "") // 2, 1), "completion_tokens": max(len(self.text) // 2, 1)}
+
+    async def text_chat(self, prompt: str = "", system_prompt: str = "", model=None, **kwargs):
+        self.calls += 1
+        error = self._admit()
+        await asyncio.sleep(self._first_byte_delay() + self.chunk_delay * (len(self.text) // self.chunk_size))
+        if error is not None:
+            raise error
+        return FakeResponse(self.text, usage=self._usage(prompt))
+
+    async def text_chat_stream(self, prompt: str = "", system_prompt: str = "", model=None, **kwargs):
+        self.stream_calls += 1
+        error = self._admit()
+        await asyncio.sleep(self._first_byte_delay())
+        if error is not None:
+            raise error
+        finished = False
+        try:
+            for i in range(0, len(self.text), self.chunk_size):
+                if i:
+                    await asyncio.sleep(self.chunk_delay)
+                self.chunks_sent += 1
+                yield FakeResponse(self.text[i : i + self.chunk_size], is_chunk=True)
+            finished = True
+            yield FakeResponse(self.text, usage=self._usage(prompt))
+        finally:
+            if not finished:
+                self.stream_closed_early += 1
+
+
+class FakeContext:
+    """最小的 Context 替身：只实现 get_provider_by_id。"""
+
+    def __init__(self, providers: dict):
+        self.providers = dict(providers)
+
+    def get_provider_by_id(self, provider_id: str):
+        return self.providers.get(provider_id)
@@ -0,0 +1,353 @@
+"""宏观压测：用大量模拟会话并发驱动 on_llm_request / on_llm_response，观察钩子开销、judge 调用速率、
+断路器行为、事件循环延迟以及长时间运行下的内存与内部结构增长。
+
+    python tools/load_test.py --sessions 2000 --duration 30
+    python tools/load_test.py --sessions 5000 --duration 600 --llm-error-rate 0.05 --llm-rate-limit 200 --json
+
+judge 与 HIGH/FAST 池中的每个提供商都是本地假提供商（见 fake_provider.py），延迟分布写法：
+const:50 / uniform:20:200 / lognormal:80:0.5 / exp:100（单位毫秒）。
+主模型调用由本脚本按插件选出的 provider_id 模拟，失败时以 role="err" 的响应回调 on_llm_response。
+用量记录写入临时目录，不会触碰插件数据目录。
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _astrbot_stubs import load_plugin_module, StubEvent, StubProviderRequest  # noqa: E402
+from fake_provider import FakeProvider, FakeContext, FakeResponse, latency_sampler  # noqa: E402
+
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "judge_corpus_sample.jsonl")
+JUDGE_ID = "load_judge"
+TRACKED_STRUCTURES = (
+    "_llm_pending",
+    "_last_route",
+    "_session_locks",
+    "_decision_cache",
+    "_answer_cache",
+    "_prejudge_futures",
+    "_route_inertia",
+    "_stats_records",
+    "_circuit_breakers",
+    "_provider_cooldowns",
+)
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"n": 0}
+    ordered = sorted(values)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]  # noqa: E731
+    return {
+        "n": len(ordered),
+        "p50": round(pick(50), 3),
+        "p95": round(pick(95), 3),
+        "p99": round(pick(99), 3),
+        "max": round(ordered[-1], 3),
+        "mean": round(statistics.fmean(ordered), 3),
+    }
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 1048576, 1)
+    except Exception:
+        try:
+            import resource
+
+            return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        except Exception:
+            return 0.0
+
+
+def load_messages(path: str) -> list:
+    messages = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                messages.append(str(json.loads(line).get("message", "")))
+    return [m for m in messages if m.strip()]
+
+
+class LoadRun:
+    def __init__(self, args):
+        self.args = args
+        self.rnd = random.Random(args.seed)
+        self.messages = load_messages(args.corpus)
+        self.tmpdir = tempfile.mkdtemp(prefix="judge_load_")
+
+        judge = FakeProvider(
+            "FAST",
+            stream=False,
+            latency=latency_sampler(args.judge_latency, args.seed),
+            error_rate=args.judge_error_rate,
+            rate_limit=args.judge_rate_limit,
+            seed=args.seed,
+        )
+        self.judge = judge
+        self.upstreams = {}
+        for pool in ("high", "fast"):
+            for i in range(args.providers_per_pool):
+                self.upstreams[f"{pool}{i}"] = FakeProvider(
+                    "好的",
+                    stream=False,
+                    latency=latency_sampler(args.llm_latency, args.seed + i),
+                    error_rate=args.llm_error_rate,
+                    rate_limit=args.llm_rate_limit,
+                    seed=args.seed + i,
+                )
+
+        config = {
+            "judge_provider_id": JUDGE_ID,
+            "high_iq_provider_ids": [f"high{i}" for i in range(args.providers_per_pool)],
+            "fast_provider_ids": [f"fast{i}" for i in range(args.providers_per_pool)],
+            "enable_stats": True,
+        }
+        if args.config:
+            with open(args.config, "r", encoding="utf-8") as f:
+                config.update(json.load(f))
+        main = load_plugin_module()
+        self.plugin = main.JudgePlugin(FakeContext(dict(self.upstreams, **{JUDGE_ID: judge})), config)
+        self.plugin._normalize_config()
+        # 用量持久化写到临时目录
+        self.plugin._usage_store_path = lambda: os.path.join(self.tmpdir, "usage.json")
+
+        self.request_ms = {"rule": [], "cache": [], "inertia": [], "llm": [], "fallback": [], "other": []}
+        self.response_ms = []
+        self.loop_lag_ms = []
+        self.timeline = []
+        self.sent = 0
+        self.responses = 0
+        self.dropped = 0
+        self.upstream_errors = 0
+        self.msg_seq = 0
+        self.stop_at = 0.0
+
+    def _next_message(self) -> str:
+        message = self.rnd.choice(self.messages)
+        if self.rnd.random() < self.args.unique_ratio:
+            message = f"{message} #{self.rnd.randrange(1 << 30)}"
+        return message
+
+    async def _session(self, index: int):
+        args = self.args
+        umo = f"load:GroupMessage:{index}"
+        group_id = str(index % max(args.groups, 1))
+        await asyncio.sleep(self.rnd.uniform(0, args.think_ms / 1000))
+        while time.monotonic() < self.stop_at:
+            self.msg_seq += 1
+            event = StubEvent(
+                self._next_message(), session=umo, group_id=group_id, sender_id=str(index), message_id=f"m{self.msg_seq}"
+            )
+            if args.lock_rate and self.rnd.random() < args.lock_rate:
+                self.plugin._set_lock(event, "router", self.rnd.choice(("HIGH", "FAST")), 3, "", "")
+            req = StubProviderRequest(event.message_str)
+
+            t0 = time.perf_counter()
+            await self.plugin.on_llm_request(event, req)
+            elapsed = (time.perf_counter() - t0) * 1000
+            self.sent += 1
+            route = self.plugin._last_route.get(umo) or {}
+            source = route.get("judge_source", "other")
+            self.request_ms[source if source in self.request_ms else "other"].append(elapsed)
+
+            provider = self.upstreams.get(getattr(req, "provider_id", "") or "")
+            if provider is None:
+                resp = FakeResponse("no provider", role="err")
+            else:
+                try:
+                    resp = await provider.text_chat(prompt=req.prompt)
+                except Exception as e:
+                    self.upstream_errors += 1
+                    resp = FakeResponse(str(e), role="err")
+
+            # 模拟上游结果从未回调的情况（连接中断等），检验 _llm_pending 的 TTL 清理
+            if args.drop_rate and self.rnd.random() < args.drop_rate:
+                self.dropped += 1
+            else:
+                t0 = time.perf_counter()
+                await self.plugin.on_llm_response(event, resp)
+                self.response_ms.append((time.perf_counter() - t0) * 1000)
+                self.responses += 1
+            think = self.rnd.expovariate(1000 / max(args.think_ms, 1))
+            await asyncio.sleep(min(think, max(self.stop_at - time.monotonic(), 0)))
+
+    async def _lag_monitor(self, interval: float = 0.05):
+        while time.monotonic() < self.stop_at:
+            t0 = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag_ms.append(max((time.perf_counter() - t0 - interval) * 1000, 0.0))
+
+    def _sample(self, t0: float, last: dict) -> dict:
+        now = time.monotonic()
+        judge_calls = self.judge.calls
+        span = max(now - last["ts"], 1e-9)
+        breakers = getattr(self.plugin, "_circuit_breakers", {})
+        sample = {
+            "t": round(now - t0, 1),
+            "sent_per_s": round((self.sent - last["sent"]) / span, 1),
+            "judge_calls_per_s": round((judge_calls - last["judge_calls"]) / span, 1),
+            # judge 的断路器以 "judge:" 为前缀，与路由池分开统计
+            "breakers_open": sum(1 for k, cb in breakers.items() if cb.get("state") == "open" and not k.startswith("judge:")),
+            "judge_breakers_open": sum(1 for k, cb in breakers.items() if cb.get("state") == "open" and k.startswith("judge:")),
+            "rss_mb": rss_mb(),
+        }
+        for name in TRACKED_STRUCTURES:
+            value = getattr(self.plugin, name, None)
+            if value is not None:
+                sample[name] = len(value)
+        last.update({"ts": now, "sent": self.sent, "judge_calls": judge_calls})
+        return sample
+
+    async def _reporter(self, t0: float):
+        last = {"ts": t0, "sent": 0, "judge_calls": 0}
+        while time.monotonic() < self.stop_at:
+            await asyncio.sleep(min(self.args.report_interval, max(self.stop_at - time.monotonic(), 0.01)))
+            sample = self._sample(t0, last)
+            self.timeline.append(sample)
+            if not self.args.json:
+                tracked = " ".join(f"{k.strip('_')}={sample[k]}" for k in TRACKED_STRUCTURES if k in sample)
+                print(
+                    f"[{sample['t']:>6}s] {sample['sent_per_s']} msg/s | judge {sample['judge_calls_per_s']}/s | "
+                    f"breakers_open={sample['breakers_open']} | rss={sample['rss_mb']}MB | {tracked}",
+                    flush=True,
+                )
+
+    async def run(self) -> dict:
+        gc.collect()
+        rss_start = rss_mb()
+        t0 = time.monotonic()
+        self.stop_at = t0 + self.args.duration
+        tasks = [asyncio.ensure_future(self._session(i)) for i in range(self.args.sessions)]
+        tasks.append(asyncio.ensure_future(self._lag_monitor()))
+        tasks.append(asyncio.ensure_future(self._reporter(t0)))
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - t0
+        # 停止后只等待在途请求收尾，速率按发送窗口计算
+        window = min(self.args.duration, elapsed)
+        gc.collect()
+
+        stats = dict(getattr(self.plugin, "_stats_counters", {}))
+        all_request = [v for values in self.request_ms.values() for v in values]
+        upstream_rate_limited = sum(p.rate_limited for p in self.upstreams.values())
+        upstream_transient = sum(p.errors for p in self.upstreams.values())
+        return {
+            "config": {
+                "sessions": self.args.sessions,
+                "duration_s": self.args.duration,
+                "judge_latency": self.args.judge_latency,
+                "llm_latency": self.args.llm_latency,
+                "think_ms": self.args.think_ms,
+                "unique_ratio": self.args.unique_ratio,
+            },
+            "elapsed_s": round(elapsed, 2),
+            "messages": self.sent,
+            "messages_per_s": round(self.sent / window, 1),
+            "responses": self.responses,
+            "dropped_responses": self.dropped,
+            "on_llm_request_ms": {"all": percentiles(all_request), **{k: percentiles(v) for k, v in self.request_ms.items() if v}},
+            "on_llm_response_ms": percentiles(self.response_ms),
+            "event_loop_lag_ms": percentiles(self.loop_lag_ms),
+            "judge": {
+                "calls": self.judge.calls,
+                "calls_per_s": round(self.judge.calls / window, 1),
+                "errors": self.judge.errors,
+                "rate_limited": self.judge.rate_limited,
+                "failover": stats.get("judge_failover", 0),
+                "breakers_open_max": max((s["judge_breakers_open"] for s in self.timeline), default=0),
+                "err_rate_limited": stats.get("judge_err_rate_limited", 0),
+                "err_transient": stats.get("judge_err_transient", 0),
+            },
+            # 上游（主模型）错误只按本脚本模拟调用的结果与假提供商计数统计，不含 judge 失败
+            "upstream": {"errors": self.upstream_errors, "transient": upstream_transient, "rate_limited": upstream_rate_limited},
+            "breaker": {
+                "open_max": max((s["breakers_open"] for s in self.timeline), default=0),
+                "open_end": self.timeline[-1]["breakers_open"] if self.timeline else 0,
+                "router_cb_skip": stats.get("router_cb_skip", 0),
+                "router_cb_pool_fallback": stats.get("router_cb_pool_fallback", 0),
+            },
+            "memory": {
+                "rss_start_mb": rss_start,
+                "rss_end_mb": rss_mb(),
+                "structures_end": {k: v for k, v in (self.timeline[-1] if self.timeline else {}).items() if k in TRACKED_STRUCTURES},
+            },
+            "timeline": self.timeline,
+        }
+
+
+def print_summary(report: dict):
+    print("")
+    print(
+        f"共 {report['messages']} 条消息 / {report['elapsed_s']}s（{report['messages_per_s']} msg/s），"
+        f"响应回调 {report['responses']}，丢弃 {report['dropped_responses']}"
+    )
+    for source, p in report["on_llm_request_ms"].items():
+        if p.get("n"):
+            print(f"on_llm_request[{source}] ms: p50 {p['p50']} | p95 {p['p95']} | p99 {p['p99']} | max {p['max']} (n={p['n']})")
+    p = report["on_llm_response_ms"]
+    if p.get("n"):
+        print(f"on_llm_response ms: p50 {p['p50']} | p95 {p['p95']} | p99 {p['p99']} | max {p['max']}")
+    p = report["event_loop_lag_ms"]
+    if p.get("n"):
+        print(f"事件循环延迟 ms: p50 {p['p50']} | p95 {p['p95']} | p99 {p['p99']} | max {p['max']}")
+    j = report["judge"]
+    print(
+        f"judge: {j['calls']} 次（{j['calls_per_s']}/s）| 错误 {j['errors']} | 限流 {j['rate_limited']} | 切换 {j['failover']} | "
+        f"插件记录 限流 {j['err_rate_limited']} / 瞬时 {j['err_transient']} | 断路器最多打开 {j['breakers_open_max']}"
+    )
+    u = report["upstream"]
+    print(f"上游: 失败 {u['errors']} | 限流 {u['rate_limited']} | 瞬时错误 {u['transient']}")
+    b = report["breaker"]
+    print(
+        f"断路器: 最多同时打开 {b['open_max']}，结束时 {b['open_end']} | 跳过 {b['router_cb_skip']} | "
+        f"跨池降级 {b['router_cb_pool_fallback']}"
+    )
+    m = report["memory"]
+    print(f"内存: RSS {m['rss_start_mb']} → {m['rss_end_mb']} MB | 结构大小: {m['structures_end']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=20.0, help="压测时长（秒）")
+    parser.add_argument("--think-ms", type=float, default=2000.0, help="同一会话两条消息之间的平均间隔")
+    parser.add_argument("--groups", type=int, default=50, help="会话分布在多少个群里")
+    parser.add_argument("--unique-ratio", type=float, default=0.5, help="带随机后缀（不会命中判定缓存）的消息比例")
+    parser.add_argument("--lock-rate", type=float, default=0.01, help="每条消息前为该会话设置锁定的概率")
+    parser.add_argument("--drop-rate", type=float, default=0.01, help="上游结果不回调 on_llm_response 的比例")
+    parser.add_argument("--providers-per-pool", type=int, default=3)
+    parser.add_argument("--judge-latency", default="lognormal:80:0.5")
+    parser.add_argument("--judge-error-rate", type=float, default=0.0)
+    parser.add_argument("--judge-rate-limit", type=float, default=0.0, help="judge 每秒可受理的调用数，0 为不限")
+    parser.add_argument("--llm-latency", default="lognormal:800:0.6")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-rate-limit", type=float, default=0.0, help="每个上游每秒可受理的调用数，0 为不限")
+    parser.add_argument("--config", default="", help="覆盖插件配置的 JSON 文件")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    report = asyncio.run(LoadRun(args).run())
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_summary(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""离线回放：把 JSONL 语料逐条送入插件的判定流水线（规则 / 缓存 / 分类器 / judge），统计吞吐、各阶段命中率、
+与标注的一致率以及省下的 judge 调用。
+
+    python tools/replay.py corpus.jsonl
+    python tools/replay.py corpus.jsonl --config judge_config.json --judge label --workers 4 --json
+
+语料每行一个 JSON：{"message": "...", "label": "HIGH|FAST", "session": "..."}，label 与 session 可省略。
+--config 可直接使用 AstrBot 导出的插件配置（data/config/astrbot_plugin_judge_config.json）。
+
+回放在独立的插件实例中进行，judge 由本地假提供商代替，不会调用任何上游，也不会写入插件数据目录。
+--judge 决定假 judge 的回答：label（按标注回答，无标注时退回 rules）、rules（内置兜底规则）、high、fast。
+多进程模式下每个进程各自维护缓存与会话惯性，缓存命中率会低于单进程回放。
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import itertools
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _astrbot_stubs import load_plugin_module  # noqa: E402
+from fake_provider import FakeProvider, FakeContext  # noqa: E402
+
+
+FAKE_JUDGE_ID = "__replay_judge__"
+
+_worker = {}
+
+
+def iter_corpus(path: str):
+    """逐行读取语料（生成器），跳过空行与无法解析的行。"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except Exception:
+                print(f"跳过第 {line_no} 行：不是合法 JSON", file=sys.stderr)
+                continue
+            if isinstance(item, str):
+                item = {"message": item}
+            message = str(item.get("message", "") or "")
+            if not message.strip():
+                continue
+            yield {
+                "message": message,
+                "label": str(item.get("label", "") or "").upper(),
+                "session": str(item.get("session", "") or ""),
+            }
+
+
+def iter_chunks(rows, size: int):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _build_config(config_path: str) -> dict:
+    config = {}
+    if config_path:
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    # judge 始终指向本地假提供商
+    config["judge_provider_id"] = FAKE_JUDGE_ID
+    config["judge_model"] = ""
+    config["judge_routes"] = []
+    config["enable_judge_race"] = False
+    config["enable_judge_streaming"] = False
+    return config
+
+
+def _worker_init(config_path: str, judge_mode: str, judge_latency_ms: float):
+    main = load_plugin_module()
+    judge = FakeProvider("FAST", ttfb=judge_latency_ms / 1000, stream=False)
+    plugin = main.JudgePlugin(FakeContext({FAKE_JUDGE_ID: judge}), _build_config(config_path))
+    plugin._normalize_config()
+    _worker.update({"plugin": plugin, "judge": judge, "mode": judge_mode, "loop": asyncio.new_event_loop()})
+
+
+def _fake_judge_answer(plugin, mode: str, row: dict) -> str:
+    if mode == "high":
+        return "HIGH"
+    if mode == "fast":
+        return "FAST"
+    if mode == "label" and row["label"] in ("HIGH", "FAST"):
+        return row["label"]
+    return plugin._simple_rule_judge(row["message"])
+
+
+async def _evaluate(rows: list) -> dict:
+    plugin = _worker["plugin"]
+    judge = _worker["judge"]
+    result = {"messages": 0, "labelled": 0, "agree": 0, "judge_calls": 0, "sources": {}, "source_agree": {}, "stages": {}}
+    stages_before = {k: dict(v) for k, v in plugin._decider_stage_stats.items()}
+    calls_before = judge.calls
+    for row in rows:
+        judge.text = _fake_judge_answer(plugin, _worker["mode"], row)
+        decision, source, _ = await plugin._judge_message_complexity_with_meta(row["message"], session_key=row["session"])
+        result["messages"] += 1
+        result["sources"][source] = result["sources"].get(source, 0) + 1
+        if row["label"] in ("HIGH", "FAST"):
+            result["labelled"] += 1
+            agree = 1 if decision == row["label"] else 0
+            result["agree"] += agree
+            hit = result["source_agree"].setdefault(source, [0, 0])
+            hit[0] += agree
+            hit[1] += 1
+    result["judge_calls"] = judge.calls - calls_before
+    for name, stat in plugin._decider_stage_stats.items():
+        before = stages_before.get(name, {"calls": 0, "hits": 0, "total_ms": 0.0})
+        result["stages"][name] = {k: stat[k] - before[k] for k in ("calls", "hits", "total_ms")}
+    return result
+
+
+def _process_chunk(rows: list) -> dict:
+    return _worker["loop"].run_until_complete(_evaluate(rows))
+
+
+def _merge(total: dict, part: dict):
+    for key in ("messages", "labelled", "agree", "judge_calls"):
+        total[key] = total.get(key, 0) + part[key]
+    for source, n in part["sources"].items():
+        total.setdefault("sources", {})[source] = total.get("sources", {}).get(source, 0) + n
+    for source, (a, n) in part["source_agree"].items():
+        hit = total.setdefault("source_agree", {}).setdefault(source, [0, 0])
+        hit[0] += a
+        hit[1] += n
+    for name, stat in part["stages"].items():
+        acc = total.setdefault("stages", {}).setdefault(name, {"calls": 0, "hits": 0, "total_ms": 0.0})
+        for k in ("calls", "hits", "total_ms"):
+            acc[k] += stat[k]
+
+
+def replay(args) -> dict:
+    total = {"messages": 0, "labelled": 0, "agree": 0, "judge_calls": 0, "sources": {}, "source_agree": {}, "stages": {}}
+    chunks = iter_chunks(iter_corpus(args.corpus), args.chunk_size)
+    t0 = time.perf_counter()
+    if args.workers > 1:
+        with multiprocessing.Pool(
+            args.workers, initializer=_worker_init, initargs=(args.config, args.judge, args.judge_latency_ms)
+        ) as pool:
+            for part in pool.imap_unordered(_process_chunk, chunks):
+                _merge(total, part)
+    else:
+        _worker_init(args.config, args.judge, args.judge_latency_ms)
+        for chunk in chunks:
+            _merge(total, _process_chunk(chunk))
+    elapsed = time.perf_counter() - t0
+
+    n = max(total["messages"], 1)
+    report = {
+        "corpus": args.corpus,
+        "messages": total["messages"],
+        "elapsed_s": round(elapsed, 3),
+        "throughput_msg_per_s": round(total["messages"] / elapsed, 1) if elapsed > 0 else None,
+        "judge_calls": total["judge_calls"],
+        "judge_calls_avoided": total["messages"] - total["judge_calls"],
+        "judge_call_rate": round(total["judge_calls"] / n, 4),
+        "label_agreement": round(total["agree"] / total["labelled"], 4) if total["labelled"] else None,
+        "labelled": total["labelled"],
+        "sources": {k: {"count": v, "rate": round(v / n, 4)} for k, v in sorted(total["sources"].items(), key=lambda kv: -kv[1])},
+        "source_agreement": {k: round(a / c, 4) for k, (a, c) in total["source_agree"].items() if c},
+        "stages": {
+            name: {
+                "calls": st["calls"],
+                "hits": st["hits"],
+                "hit_rate": round(st["hits"] / st["calls"], 4) if st["calls"] else 0.0,
+                "avg_us": round(st["total_ms"] * 1000 / st["calls"], 2) if st["calls"] else 0.0,
+            }
+            for name, st in total["stages"].items()
+        },
+        "workers": args.workers,
+        "judge_mode": args.judge,
+    }
+    return report
+
+
+def print_report(report: dict):
+    print(f"语料: {report['corpus']} | 消息 {report['messages']} 条 | 耗时 {report['elapsed_s']}s | 吞吐 {report['throughput_msg_per_s']} 条/秒")
+    print(
+        f"judge 调用 {report['judge_calls']} 次（占比 {report['judge_call_rate']:.1%}）| 省下 {report['judge_calls_avoided']} 次"
+    )
+    if report["label_agreement"] is not None:
+        print(f"与标注一致率: {report['label_agreement']:.1%}（{report['labelled']} 条有标注）")
+    print("判定来源:")
+    for source, item in report["sources"].items():
+        agree = report["source_agreement"].get(source)
+        agree_text = f" | 一致率 {agree:.1%}" if agree is not None else ""
+        print(f"  {source or '-'}: {item['count']} ({item['rate']:.1%}){agree_text}")
+    print("流水线阶段:")
+    for name, st in report["stages"].items():
+        print(f"  {name}: 调用 {st['calls']} | 命中 {st['hits']} ({st['hit_rate']:.1%}) | 平均 {st['avg_us']}µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus")
+    parser.add_argument("--config", default="", help="插件配置 JSON（可选）")
+    parser.add_argument("--judge", default="label", choices=["label", "rules", "high", "fast"])
+    parser.add_argument("--judge-latency-ms", type=float, default=0.0, help="假 judge 的模拟延迟")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    report = replay(args)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
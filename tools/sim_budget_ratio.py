@@ -0,0 +1,99 @@
+"""模拟预算比例控制：大量短会话交错触发 HIGH 判定，核对全局/群/会话的实际 HIGH 占比与配置比例的偏差。
+
+    python tools/sim_budget_ratio.py
+    python tools/sim_budget_ratio.py --sessions 5000 --groups 20 --ratios 20,60 --per-session 1,2,3,20
+
+全局占比须与配置比例相差不超过 --tolerance 个百分点，单个会话放行次数不得超过其应得份额加一次，否则退出码为 1。
+会话数加群数超过插件保留的范围数（_RATIO_MAX_SCOPES）时，被淘汰的会话会重新起步，此时不检查单会话上限。
+不依赖 AstrBot：通过 _astrbot_stubs 加载插件，直接调用 _budget_allows_high_iq。
+"""
+
+import os
+import sys
+import math
+import random
+import argparse
+import importlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _astrbot_stubs import load_plugin_module, StubEvent  # noqa: E402
+from fake_provider import FakeContext  # noqa: E402
+
+
+def make_plugin(ratio: int):
+    main = load_plugin_module()
+    config = {"enable_budget_control": True, "budget_mode": "ECONOMY", "economy_high_iq_ratio": ratio}
+    plugin = main.JudgePlugin(FakeContext({}), config)
+    plugin._normalize_config()
+    return plugin
+
+
+def simulate(ratio: int, per_session: int, args) -> dict:
+    plugin = make_plugin(ratio)
+    rng = random.Random(args.seed)
+    events = []
+    for i in range(args.sessions):
+        group_id = f"g{i % args.groups}" if args.groups else ""
+        kind = "GroupMessage" if group_id else "FriendMessage"
+        event = StubEvent("", session=f"sim:{kind}:{i}", group_id=group_id, sender_id=str(i))
+        events.extend([event] * per_session)
+    if not args.sequential:
+        rng.shuffle(events)
+
+    allowed = {}
+    for event in events:
+        if plugin._budget_allows_high_iq(event):
+            allowed[event.unified_msg_origin] = allowed.get(event.unified_msg_origin, 0) + 1
+    total_allowed = sum(allowed.values())
+    # 会话应得份额向上取整，再允许透支一次
+    session_cap = math.ceil(per_session * ratio / 100) + 1
+    return {
+        "share": total_allowed * 100 / len(events) if events else 0.0,
+        "over_cap": sum(1 for n in allowed.values() if n > session_cap),
+        "max_session": max(allowed.values(), default=0),
+        "session_cap": session_cap,
+    }
+
+
+def run(args) -> bool:
+    ok = True
+    load_plugin_module()
+    max_scopes = importlib.import_module("astrbot_plugin_judge.judge_budget")._RATIO_MAX_SCOPES
+    check_sessions = args.sessions + args.groups + 1 <= max_scopes
+    if not check_sessions:
+        print(f"会话数超过保留的范围数 {max_scopes}，不检查单会话上限")
+    print(f"{'比例':>4} {'每会话':>6} {'实际占比':>9} {'偏差':>7} {'单会话最多':>10} {'超额会话':>8}")
+    for ratio in args.ratios:
+        for per_session in args.per_session:
+            r = simulate(ratio, per_session, args)
+            deviation = r["share"] - ratio
+            good = abs(deviation) <= args.tolerance and (r["over_cap"] == 0 or not check_sessions)
+            ok = ok and good
+            print(
+                f"{ratio:>4} {per_session:>6} {r['share']:>8.1f}% {deviation:>+6.1f} "
+                f"{r['max_session']:>6}/{r['session_cap']:<3} {r['over_cap']:>8}{'' if good else '  ← 超出范围'}"
+            )
+    return ok
+
+
+def int_list(text: str) -> list:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1500)
+    parser.add_argument("--groups", type=int, default=0, help="会话分到的群数；0 表示全部为私聊")
+    parser.add_argument("--ratios", type=int_list, default=[20, 30, 60, 95], help="逗号分隔的 HIGH 比例")
+    parser.add_argument("--per-session", type=int_list, default=[1, 2, 3, 20], help="逗号分隔的每会话 HIGH 判定数")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="全局占比允许偏差（百分点）")
+    parser.add_argument("--sequential", action="store_true", help="按会话依次触发而非随机交错")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if not run(args):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()